@@ -1,27 +1,34 @@
 """Alerts API Endpoints"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from app.db.database import get_db
 from app.db.models import Alert, User, SecurityLog
 from app.schemas.schemas import Alert as AlertSchema, AlertCreate, AlertUpdate
 from app.api.auth import get_current_user
+from app.core.pagination import paginate
+from app.core.response_cache import response_cache
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[AlertSchema])
 async def get_alerts(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: str = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all alerts"""
+    """Get all alerts
+    
+    The next page's cursor comes back in the X-Next-Cursor header (the body
+    stays a plain list for existing clients).
+    """
     # Build query
     query = db.query(Alert)
     
@@ -29,8 +36,11 @@ async def get_alerts(
     if status:
         query = query.filter(Alert.status == status)
     
-    # Get results - probably could optimize this query later
-    alerts = query.order_by(desc(Alert.created_at)).offset(skip).limit(limit).all()
+    alerts, next_cursor = paginate(
+        query, Alert.created_at, Alert.id, limit, skip=skip, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return alerts
 
 
@@ -68,6 +78,7 @@ async def create_alert(
     
     db.add(db_alert)
     db.commit()
+    response_cache.bump("alerts")
     db.refresh(db_alert)
     
     return db_alert
@@ -98,6 +109,7 @@ async def update_alert(
     alert.updated_at = datetime.utcnow()
     
     db.commit()
+    response_cache.bump("alerts")
     db.refresh(alert)
     
     return alert
@@ -119,5 +131,6 @@ async def delete_alert(
     
     db.delete(alert)
     db.commit()
+    response_cache.bump("alerts")
     
     return {"message": "Alert deleted successfully"}
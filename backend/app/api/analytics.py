@@ -1,64 +1,112 @@
 """
 Analytics API Endpoints
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, and_
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
 
 from app.db.database import get_db
-from app.db.models import SecurityLog, Alert, User
-from app.schemas.schemas import ThreatStatistics, DashboardSummary
+from app.db.models import SecurityLog, Alert, User, SeverityLevel, EventType
+from app.db.time_buckets import BUCKET_WIDTHS, bucket_counts, floor_local, parse_tz, is_utc
+from app.schemas.schemas import (
+    ThreatStatistics, DashboardSummary, SecurityLog as SecurityLogSchema, Alert as AlertSchema
+)
 from app.api.auth import get_current_user
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.services.rollup_service import RollupService
+from app.services.sketch_service import (
+    sketch_store, score_digest_name, TOP_SOURCE_IPS, DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES, SCORE_FIELDS
+)
+from app.services.sketches import TDigest
 
 router = APIRouter()
 
 
+# Each dashboard query returns plain data, so results can be shared between
+# requests and computed in sessions that are closed straight afterwards
+
+def _log_counters(db: Session):
+    """Total logs, threats and average score in one pass over security_logs"""
+    return tuple(db.query(
+        func.count(SecurityLog.id),
+        func.coalesce(func.sum(case((SecurityLog.is_threat == True, 1), else_=0)), 0),
+        func.avg(SecurityLog.threat_score)
+    ).one())
+
+
+def _alert_counters(db: Session):
+    """Total alerts and open critical alerts in one pass over alerts"""
+    return tuple(db.query(
+        func.count(Alert.id),
+        func.coalesce(func.sum(case(
+            (and_(Alert.severity == SeverityLevel.CRITICAL, Alert.status == "open"), 1), else_=0
+        )), 0)
+    ).one())
+
+
+def _recent_logs(db: Session):
+    logs = db.query(SecurityLog).order_by(desc(SecurityLog.timestamp)).limit(10).all()
+    return [SecurityLogSchema.model_validate(log) for log in logs]
+
+
+def _recent_alerts(db: Session):
+    alerts = db.query(Alert).order_by(desc(Alert.created_at)).limit(10).all()
+    return [AlertSchema.model_validate(alert) for alert in alerts]
+
+
+def _in_own_session(bind, query):
+    session = Session(bind=bind)
+    try:
+        return query(session)
+    finally:
+        session.close()
+
+
+async def _compute_dashboard_summary(db: Session) -> dict:
+    queries = (_log_counters, _alert_counters, _recent_logs, _recent_alerts)
+    bind = db.get_bind()
+    
+    if bind.dialect.name == 'sqlite':
+        # SQLite serializes connections anyway - run them one after another
+        results = [query(db) for query in queries]
+    else:
+        results = await asyncio.gather(*(
+            asyncio.to_thread(_in_own_session, bind, query) for query in queries
+        ))
+    
+    (total_logs, threats, avg_threat_score), (total_alerts, critical_alerts), recent_logs, recent_alerts = results
+    
+    return DashboardSummary(
+        total_logs=total_logs,
+        total_alerts=total_alerts,
+        critical_alerts=critical_alerts,
+        threats_detected=threats,  # keeping old key for backward compat
+        avg_threat_score=round(avg_threat_score or 0.0, 2),
+        recent_logs=recent_logs,
+        recent_alerts=recent_alerts
+    ).model_dump()
+
+
 @router.get("/dashboard", response_model=DashboardSummary)
 async def get_dashboard_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Total logs
-    total_logs = db.query(SecurityLog).count()
-    
-    # Total alerts
-    total_alerts = db.query(Alert).count()
-    
-    # Critical alerts
-    critical_alerts = db.query(Alert).filter(
-        Alert.severity == "critical",
-        Alert.status == "open"
-    ).count()
-    
-    # Threats detected - changed var name for consistency but meh
-    threats = db.query(SecurityLog).filter(
-        SecurityLog.is_threat == True
-    ).count()
-    
-    # Average threat score
-    avg_threat_score = db.query(func.avg(SecurityLog.threat_score)).scalar() or 0.0
+    """Dashboard counters and recent activity.
     
-    # Recent logs (last 10)
-    recent_logs = db.query(SecurityLog).order_by(
-        desc(SecurityLog.timestamp)
-    ).limit(10).all()
-    
-    # Recent alerts (last 10)
-    recent_alerts = db.query(Alert).order_by(
-        desc(Alert.created_at)
-    ).limit(10).all()
-    
-    return {
-        "total_logs": total_logs,
-        "total_alerts": total_alerts,
-        "critical_alerts": critical_alerts,
-        "threats_detected": threats,  # keeping old key for backward compat
-        "avg_threat_score": round(avg_threat_score, 2),
-        "recent_logs": recent_logs,
-        "recent_alerts": recent_alerts
-    }
+    Every viewer polls this, so the result is a shared snapshot: viewers within
+    DASHBOARD_SNAPSHOT_TTL_SECONDS of each other (or arriving while it is being
+    computed) get the same one, until a log or alert is written.
+    """
+    return await response_cache.get_or_compute(
+        "dashboard", {}, ("logs", "alerts"),
+        settings.DASHBOARD_SNAPSHOT_TTL_SECONDS,
+        _compute_dashboard_summary, db
+    )
 
 
 @router.get("/statistics", response_model=ThreatStatistics)
@@ -67,46 +115,36 @@ async def get_threat_statistics(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    return await response_cache.get_or_compute(
+        "statistics", {"days": days}, ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        lambda session: _compute_statistics(session, days), db
+    )
+
+
+def _compute_statistics(db: Session, days: int) -> dict:
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    # Total events
-    total_events = db.query(SecurityLog).filter(
-        SecurityLog.timestamp >= start_date
-    ).count()
+    # Counts come from the rollup tables (plus a raw scan of the partial first hour)
+    segments = RollupService.segments(db, start_date)
     
-    # Total threats
-    total_threats = db.query(SecurityLog).filter(
-        SecurityLog.timestamp >= start_date,
-        SecurityLog.is_threat == True
-    ).count()
-    
-    # Threats by severity
+    total_events = 0
+    total_threats = 0
     threat_by_severity = {}
-    severity_data = db.query(
-        SecurityLog.severity,
-        func.count(SecurityLog.id)
-    ).filter(
-        SecurityLog.timestamp >= start_date,
-        SecurityLog.is_threat == True
-    ).group_by(SecurityLog.severity).all()
-    
-    for severity, count in severity_data:
-        threat_by_severity[severity.value] = count
-    
-    # Threats by type
     threat_by_type = {}
-    type_data = db.query(
-        SecurityLog.event_type,
-        func.count(SecurityLog.id)
-    ).filter(
-        SecurityLog.timestamp >= start_date,
-        SecurityLog.is_threat == True
-    ).group_by(SecurityLog.event_type).all()
+    date_counts = {}
     
-    for event_type, count in type_data:
-        threat_by_type[event_type.value] = count
+    for bucket, event_type, severity, is_threat, count, _ in segments:
+        total_events += count
+        date_str = bucket.strftime("%Y-%m-%d")
+        date_counts[date_str] = date_counts.get(date_str, 0) + count
+        if is_threat:
+            total_threats += count
+            threat_by_severity[severity.value] = threat_by_severity.get(severity.value, 0) + count
+            threat_by_type[event_type.value] = threat_by_type.get(event_type.value, 0) + count
     
-    # Top source IPs
+    # Top source IPs - exact, from the (source_ip, timestamp) index; /top-sources
+    # serves the approximate, hour-aligned version from the sketches
     top_source_ips = []
     ip_data = db.query(
         SecurityLog.source_ip,
@@ -119,17 +157,8 @@ async def get_threat_statistics(
     for ip, count in ip_data:
         top_source_ips.append({"ip": ip, "count": count})
     
-    # Timeline (events per day) - optimized with single query
+    # Timeline (events per day)
     timeline = []
-    timeline_data = db.query(
-        func.date(SecurityLog.timestamp).label('date'),
-        func.count(SecurityLog.id).label('count')
-    ).filter(
-        SecurityLog.timestamp >= start_date
-    ).group_by(func.date(SecurityLog.timestamp)).all()
-    
-    # Create map for quick lookup
-    date_counts = {str(date): count for date, count in timeline_data}
     
     # Fill in all days including zeros
     for i in range(days):
@@ -150,26 +179,251 @@ async def get_threat_statistics(
     }
 
 
+@router.get("/top-sources")
+async def get_top_sources(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Busiest source IPs and how many usernames each used, from the ingest sketches
+    
+    Windows are aligned to whole hours. A count is never too high and is low
+    by at most error_bound (so the true count is between count and
+    max_count); distinct_users is a HyperLogLog estimate.
+    """
+    return await response_cache.get_or_compute(
+        "top_sources", {"hours": hours, "limit": limit}, ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        lambda session: _compute_top_sources(session, hours, limit), db
+    )
+
+
+def _compute_top_sources(db: Session, hours: int, limit: int) -> dict:
+    start_time = datetime.utcnow() - timedelta(hours=hours)
+    top_ips = sketch_store.merged(db, start_time, [TOP_SOURCE_IPS])[TOP_SOURCE_IPS]
+    error_bound = int(top_ips.error_bound)
+    
+    return {
+        "hours": hours,
+        "total": top_ips.total,
+        "error_bound": error_bound,
+        "sources": [
+            {
+                "ip": ip,
+                "count": count,
+                "max_count": count + error_bound,
+                "distinct_users": top_ips.distinct_count(ip) or 0
+            }
+            for ip, count in top_ips.top(limit)
+        ]
+    }
+
+
+@router.get("/cardinality")
+async def get_cardinality(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Distinct source IPs and usernames seen, estimated from the ingest sketches
+    
+    Windows are aligned to whole hours; relative_error is the standard error
+    of the HyperLogLog estimate.
+    """
+    return await response_cache.get_or_compute(
+        "cardinality", {"hours": hours}, ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        lambda session: _compute_cardinality(session, hours), db
+    )
+
+
+def _compute_cardinality(db: Session, hours: int) -> dict:
+    start_time = datetime.utcnow() - timedelta(hours=hours)
+    sketches = sketch_store.merged(db, start_time, [DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES])
+    
+    result = {"hours": hours}
+    for name in (DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES):
+        sketch = sketches[name]
+        result[name] = {"estimate": sketch.count(), "relative_error": round(sketch.relative_error, 4)}
+    return result
+
+
+@router.get("/score-distribution")
+async def get_score_distribution(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    event_type: Optional[EventType] = None,
+    bins: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Percentiles and histograms of threat and confidence scores, from the ingest digests
+    
+    Windows are aligned to whole hours. Percentiles are t-digest estimates,
+    most accurate in the tails; histogram counts come from the digest's CDF
+    over [0, 1], so they are approximate but add up to count. Without an
+    event_type, threat-score percentiles per event type are included too.
+    """
+    return await response_cache.get_or_compute(
+        "score_distribution",
+        {"hours": hours, "event_type": event_type.value if event_type else None, "bins": bins},
+        ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        lambda session: _compute_score_distribution(session, hours, event_type, bins), db
+    )
+
+
+def _percentiles(digest: TDigest) -> dict:
+    return {
+        f"p{round(q * 100)}": round(value, 4) if value is not None else None
+        for q, value in ((q, digest.quantile(q)) for q in (0.5, 0.9, 0.99))
+    }
+
+
+def _describe_digest(digest: TDigest, bins: int) -> dict:
+    summary = {"count": digest.count}
+    for key, value in (("mean", digest.mean()), ("min", digest.min), ("max", digest.max)):
+        summary[key] = round(value, 4) if digest.count else None
+    summary.update(_percentiles(digest))
+    
+    # Cumulative counts at each edge, so rounding never loses or adds events
+    edges = [i / bins for i in range(bins + 1)]
+    cumulative = [0] + [round(digest.count * digest.cdf(edge)) for edge in edges[1:-1]] + [digest.count]
+    summary["histogram"] = [
+        {"start": round(edges[i], 4), "end": round(edges[i + 1], 4), "count": cumulative[i + 1] - cumulative[i]}
+        for i in range(bins)
+    ]
+    return summary
+
+
+def _compute_score_distribution(db: Session, hours: int, event_type: Optional[EventType], bins: int) -> dict:
+    start_time = datetime.utcnow() - timedelta(hours=hours)
+    result = {"hours": hours, "event_type": event_type.value if event_type else None}
+    
+    for field in SCORE_FIELDS:
+        if event_type:
+            digests = sketch_store.merged(db, start_time, [score_digest_name(field, event_type)])
+        else:
+            digests = sketch_store.merged(db, start_time, prefix=f"{field}:")
+        combined = TDigest(settings.SKETCH_TDIGEST_COMPRESSION)
+        for digest in digests.values():
+            combined.merge(digest)
+        result[field] = _describe_digest(combined, bins)
+        
+        if field == "threat_score" and not event_type:
+            result["threat_score_by_event_type"] = {
+                name.split(":", 1)[1]: dict(count=digest.count, **_percentiles(digest))
+                for name, digest in sorted(digests.items()) if digest.count
+            }
+    return result
+
+
+@router.get("/geo")
+async def get_geo_breakdown(
+    days: int = Query(7, ge=1, le=90),
+    level: str = Query("country", pattern="^(country|city)$"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Events and threats per source country (or city), busiest first
+    
+    Locations come from GeoIP enrichment of source_ip at ingest; logs without
+    one are counted under unknown.
+    """
+    return await response_cache.get_or_compute(
+        "geo", {"days": days, "level": level, "limit": limit}, ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        lambda session: _compute_geo(session, days, level, limit), db
+    )
+
+
+def _compute_geo(db: Session, days: int, level: str, limit: int) -> dict:
+    start_date = datetime.utcnow() - timedelta(days=days)
+    columns = [SecurityLog.country] + ([SecurityLog.city] if level == "city" else [])
+    threats = func.sum(case((SecurityLog.is_threat == True, 1), else_=0))
+    
+    rows = db.query(*columns, func.count(SecurityLog.id).label('count'), threats).filter(
+        SecurityLog.timestamp >= start_date,
+        SecurityLog.country.isnot(None)
+    ).group_by(*columns).order_by(desc('count')).limit(limit).all()
+    
+    unknown = db.query(func.count(SecurityLog.id)).filter(
+        SecurityLog.timestamp >= start_date,
+        SecurityLog.country.is_(None)
+    ).scalar()
+    
+    locations = []
+    for row in rows:
+        entry = {"country": row[0]}
+        if level == "city":
+            entry["city"] = row[1]
+        entry["count"] = row[-2]
+        entry["threats"] = row[-1] or 0
+        locations.append(entry)
+    
+    return {"days": days, "level": level, "locations": locations, "unknown": unknown}
+
+
 @router.get("/trends")
 async def get_trends(
     hours: int = Query(24, ge=1, le=168),
+    interval: str = Query("1h", pattern="^(1m|5m|15m|1h|1d)$"),
+    tz: str = "UTC",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get hourly trends - optimized"""
-    start_time = datetime.utcnow() - timedelta(hours=hours)
+    """Get trends per time bucket - hourly in UTC unless interval/tz say otherwise"""
+    try:
+        parse_tz(tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Get all data in single query
-    hourly_counts = db.query(
-        func.strftime('%Y-%m-%d %H:00', SecurityLog.timestamp).label('hour'),
-        func.count(SecurityLog.id).label('total'),
-        func.sum(func.cast(SecurityLog.is_threat, func.INTEGER())).label('threats')
-    ).filter(
-        SecurityLog.timestamp >= start_time
-    ).group_by(func.strftime('%Y-%m-%d %H:00', SecurityLog.timestamp)).all()
+    if interval == "1h" and is_utc(tz):
+        # Served from the hourly rollups
+        compute = lambda session: _compute_trends(session, hours)
+    else:
+        compute = lambda session: _compute_bucketed_trends(session, hours, interval, tz)
+    
+    return await response_cache.get_or_compute(
+        "trends", {"hours": hours, "interval": interval, "tz": tz}, ("logs",),
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        compute, db
+    )
+
+
+def _compute_bucketed_trends(db: Session, hours: int, interval: str, tz: str) -> dict:
+    now = datetime.utcnow()
+    start_time = now - timedelta(hours=hours)
+    width, zone = BUCKET_WIDTHS[interval], parse_tz(tz)
+    counts = bucket_counts(db, start_time, interval, tz)
+    
+    # Fill in every bucket (local wall-clock time) including zeros
+    trends = []
+    bucket = floor_local(start_time, width, zone)
+    last = floor_local(now, width, zone)
+    while bucket <= last:
+        total, threats = counts.get(bucket, (0, 0))
+        trends.append({
+            "hour": bucket.strftime("%Y-%m-%d %H:%M"),
+            "total": total,
+            "threats": threats
+        })
+        bucket += timedelta(seconds=width)
+    
+    return {"interval": interval, "tz": tz, "hourly_trends": trends}
+
+
+def _compute_trends(db: Session, hours: int) -> dict:
+    start_time = datetime.utcnow() - timedelta(hours=hours)
     
-    # Create map
-    hour_map = {hour: {'total': total, 'threats': threats or 0} for hour, total, threats in hourly_counts}
+    # Hourly rollups (plus a raw scan of the partial first hour)
+    hour_map = {}
+    for bucket, _, _, is_threat, count, _ in RollupService.segments(db, start_time, granularity='hour'):
+        data = hour_map.setdefault(bucket.strftime("%Y-%m-%d %H:00"), {'total': 0, 'threats': 0})
+        data['total'] += count
+        if is_threat:
+            data['threats'] += count
     
     # Fill in all hours
     hourly_data = []
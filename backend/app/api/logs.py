@@ -1,21 +1,56 @@
 """
 Security Logs API Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
-from typing import Optional, List
-from datetime import datetime, timedelta
+from pydantic import ValidationError
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+import logging
 
 from app.db.database import get_db
+from app.db.search import apply_search
 from app.db.models import SecurityLog, User
-from app.schemas.schemas import SecurityLog as SecurityLogSchema, SecurityLogCreate, SecurityLogList
+from app.schemas.schemas import (
+    SecurityLog as SecurityLogSchema, SecurityLogCreate, SecurityLogList, SecurityLogBulkResult,
+    LogStreamSummary, IngestQueueStats
+)
 from app.api.auth import get_current_user
 from app.services.threat_detector import ThreatDetector
+from app.services.ingest_service import IngestService, StreamIngestor, format_validation_errors
+from app.services.ingest_queue import IngestQueue
+from app.services.count_service import count_logs, log_count_cache
+from app.services.rollup_service import RollupService
+from app.services.archive_service import segment_store
+from app.services.geoip import geo_resolver
+from app.services.baselines import BaselineJournal
+from app.services.correlation import CorrelationJournal, create_alerts
+from app.services.sketch_service import sketch_store
+from app.services.export_service import (
+    iter_log_chunks, csv_stream, columnar_stream, COLUMNAR_CHUNK_ROWS
+)
 from app.core.websocket_manager import manager
+from app.core.config import settings
+from app.core.pagination import paginate, apply_cursor, decode_cursor, encode_cursor
+from app.core.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 threat_detector = ThreatDetector()
+ingest_service = IngestService(threat_detector)
+ingest_queue = IngestQueue(ingest_service)
+
+
+def _count_fields(log: SecurityLog) -> dict:
+    """Fields the listing count cache and the analytics rollups need"""
+    return {
+        "severity": log.severity,
+        "event_type": log.event_type,
+        "is_threat": log.is_threat,
+        "timestamp": log.timestamp,
+        "threat_score": log.threat_score,
+    }
 
 
 @router.get("/", response_model=SecurityLogList)
@@ -27,10 +62,28 @@ async def get_logs(
     is_threat: Optional[bool] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    total_mode: str = Query("exact", pattern="^(exact|estimate|none)$"),
+    q: Optional[str] = Query(None, min_length=1, max_length=500),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get security logs with filtering"""
+    """Get security logs with filtering
+    
+    Pass the returned next_cursor as ?cursor= to get the next page - unlike
+    skip, deep pages cost the same as the first one.
+    
+    total_mode=estimate|none avoids a full COUNT(*) per request; total_exact
+    in the response says whether total is exact.
+    
+    Logs moved to the cold archive are included whenever the date range
+    reaches back to them.
+    
+    q= searches description and raw_log (full-text index): "quoted phrases",
+    -excluded terms and OR are supported, and results come best match first.
+    It combines with the other filters, pages with skip, and covers the
+    database only, not the archive.
+    """
     # if DEBUG_MODE: print(f"Fetching logs: skip={skip}, limit={limit}")  # debug line
     query = db.query(SecurityLog)
     
@@ -45,21 +98,139 @@ async def get_logs(
         query = query.filter(SecurityLog.timestamp >= start_date)
     if end_date:
         query = query.filter(SecurityLog.timestamp <= end_date)
+    rank_order = None
+    if q:
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor can't be combined with q - page with skip")
+        try:
+            query, rank_order = apply_search(query, q, db.get_bind().dialect.name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     # Get total count
-    total = query.count()
+    filters = {
+        "severity": severity,
+        "event_type": event_type,
+        "is_threat": is_threat,
+        "start_date": start_date,
+        "end_date": end_date,
+        "q": q,
+    }
+    total, total_exact = count_logs(db, query, filters, total_mode)
     
     # Get paginated results
-    logs = query.order_by(desc(SecurityLog.timestamp)).offset(skip).limit(limit).all()
+    if rank_order is not None:
+        logs = query.order_by(
+            rank_order, SecurityLog.timestamp.desc(), SecurityLog.id.desc()
+        ).offset(skip).limit(limit).all()
+        next_cursor = None
+    elif segment_store.reaches(start_date):
+        archive_filters = {"severity": severity, "event_type": event_type, "is_threat": is_threat}
+        if total is not None:
+            total += segment_store.count(start_date, end_date, **archive_filters)
+        logs, next_cursor = _paginate_with_archive(
+            query, limit, skip, cursor, start_date, end_date, archive_filters
+        )
+    else:
+        logs, next_cursor = paginate(
+            query, SecurityLog.timestamp, SecurityLog.id, limit, skip=skip, cursor=cursor
+        )
     
     return {
         "logs": logs,
         "total": total,
-        "page": skip // limit + 1,
-        "page_size": limit
+        "page": 1 if cursor else skip // limit + 1,
+        "page_size": limit,
+        "next_cursor": next_cursor,
+        "total_exact": total_exact
     }
 
 
+def _paginate_with_archive(query, limit, skip, cursor, start_date, end_date, archive_filters):
+    """paginate() over the database and the cold archive together.
+    
+    Takes the first skip+limit+1 rows from each side and merges them. When the
+    database fills that on its own, archived rows older than its last row can't
+    make the page, so only segments reaching past it are opened.
+    """
+    needed = limit + 1 if cursor else skip + limit + 1
+    query = query.order_by(SecurityLog.timestamp.desc(), SecurityLog.id.desc())
+    before = None
+    if cursor:
+        before = decode_cursor(cursor)
+        query = apply_cursor(query, SecurityLog.timestamp, SecurityLog.id, cursor)
+    hot = query.limit(needed).all()
+    
+    archive_start = start_date
+    if len(hot) == needed:
+        archive_start = max(start_date, hot[-1].timestamp) if start_date else hot[-1].timestamp
+    cold = segment_store.read_logs(archive_start, end_date, limit=needed, before=before, **archive_filters)
+    
+    rows = sorted(hot + cold, key=lambda log: (log.timestamp, log.id), reverse=True)
+    rows = rows[:needed] if cursor else rows[skip:needed]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
+
+
+@router.get("/queue/stats", response_model=IngestQueueStats)
+async def get_ingest_queue_stats(current_user: User = Depends(get_current_user)):
+    """Depth and counters of the write-behind ingest queue"""
+    return ingest_queue.stats()
+
+
+EXPORT_FORMATS = {
+    # format: (media type, file name)
+    "csv": ("text/csv", "security_logs.csv"),
+    "parquet": ("application/vnd.apache.parquet", "security_logs.parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "security_logs.arrows"),
+}
+
+
+@router.get("/export")
+async def export_logs(
+    format: str = Query("csv", pattern="^(csv|parquet|arrow)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    compress: Optional[str] = Query(None, pattern="^gzip$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export logs as CSV, Apache Parquet or an Arrow IPC stream
+    
+    Parquet/Arrow keep types (timestamps, floats, bools) and dictionary-encode
+    event_type/severity/source_ip, so they load straight into pandas.
+    Parquet is zstd-compressed; ?compress=gzip only applies to CSV.
+    """
+    from fastapi.responses import StreamingResponse
+    
+    if format == "csv":
+        return await export_logs_csv(
+            start_date=start_date, end_date=end_date, compress=compress, db=db, current_user=current_user
+        )
+    
+    try:
+        import pyarrow  # noqa: F401 - optional dependency
+    except ImportError:
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+    
+    def generate():
+        try:
+            chunks = iter_log_chunks(db, start_date, end_date, chunk_size=COLUMNAR_CHUNK_ROWS)
+            yield from columnar_stream(chunks, format)
+        finally:
+            db.close()
+    
+    media_type, filename = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @router.get("/{log_id}", response_model=SecurityLogSchema)
 async def get_log(
     log_id: int,
@@ -90,11 +261,37 @@ async def create_log(
     db_log.is_threat = is_threat
     db_log.confidence_score = confidence
     db_log.threat_score = threat_score
-    db_log.is_anomaly = threat_score > 0.7
+    db_log.timestamp = datetime.utcnow()
+    journal = BaselineJournal()
+    db_log.is_anomaly = ingest_service.baselines.is_anomaly(
+        db_log.timestamp, db_log.username, db_log.source_ip, journal
+    )
+    db_log.country, db_log.city = geo_resolver.lookup(db_log.source_ip)
+    correlation_journal = CorrelationJournal()
     
-    db.add(db_log)
-    db.commit()
+    try:
+        db.add(db_log)
+        db.flush()
+        fields = _count_fields(db_log)
+        RollupService.apply(db, [fields])
+        row = dict(fields, id=db_log.id, source_ip=db_log.source_ip, username=db_log.username,
+                   confidence_score=db_log.confidence_score)
+        alerts = 0
+        if ingest_service.correlator is not None:
+            alerts = create_alerts(db, ingest_service.correlator.process_rows([row], correlation_journal))
+        db.commit()
+    except Exception:
+        # Not stored - the baselines and correlation windows shouldn't have learned it either
+        ingest_service.baselines.restore(journal)
+        if ingest_service.correlator is not None:
+            ingest_service.correlator.restore(correlation_journal)
+        raise
     db.refresh(db_log)
+    log_count_cache.record_inserts([fields])
+    sketch_store.record([row])
+    response_cache.bump("logs")
+    if alerts:
+        response_cache.bump("alerts")
     
     # Broadcast to WebSocket clients
     await manager.broadcast_json({
@@ -111,6 +308,103 @@ async def create_log(
     return db_log
 
 
+@router.post("/enqueue", status_code=202)
+async def enqueue_log(
+    log: SecurityLogCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue a log for write-behind ingestion
+    
+    Returns as soon as the event is queued - scoring and the insert happen in
+    the background. Answers 503 + Retry-After when the queue is full.
+    """
+    if not ingest_queue.put([log]):
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue is full",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
+        )
+    
+    return {"queued": 1, "depth": ingest_queue.stats()["depth"]}
+
+
+@router.post("/bulk", response_model=SecurityLogBulkResult)
+async def create_logs_bulk(
+    items: List[Dict[str, Any]] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create many security log entries in one request
+    
+    Items are validated one by one - invalid items are reported back by index
+    and don't block the rest of the batch. Valid items are stored in batches
+    of INGEST_BATCH_SIZE, each committed on its own; if one fails, its items
+    are reported as rejected (safe to resend) and the other batches still go in.
+    """
+    if len(items) > settings.INGEST_MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many items (max {settings.INGEST_MAX_BULK_ITEMS})"
+        )
+    
+    valid = []
+    valid_indexes = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(SecurityLogCreate.model_validate(item))
+            valid_indexes.append(index)
+            results.append({"index": index})
+        except ValidationError as e:
+            results.append({"index": index, "errors": format_validation_errors(e)})
+    
+    rows = []
+    batch_size = ingest_service.batch_size
+    for start in range(0, len(valid), batch_size):
+        indexes = valid_indexes[start:start + batch_size]
+        try:
+            stored = ingest_service.ingest(db, valid[start:start + batch_size])
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Bulk ingest failed to store {len(indexes)} items: {e}")
+            for index in indexes:
+                results[index]["errors"] = [{"loc": [], "msg": "Not stored, the batch failed - retry this item"}]
+            continue
+        for index, row in zip(indexes, stored):
+            results[index]["id"] = row["id"]
+        rows.extend(stored)
+    
+    # One broadcast for the whole request instead of one per log
+    if rows:
+        await manager.broadcast_json(IngestService.broadcast_payload(rows))
+    
+    return {
+        "accepted": len(rows),
+        "rejected": len(items) - len(rows),
+        "results": results
+    }
+
+
+@router.post("/stream", response_model=LogStreamSummary)
+async def ingest_log_stream(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Ingest newline-delimited JSON (one SecurityLogCreate per line)
+    
+    Meant for shippers holding a connection open - auth happens once for the
+    whole stream and events are flushed in micro-batches as the body arrives,
+    or after INGEST_FLUSH_INTERVAL_SECONDS when the connection goes quiet.
+    """
+    ingestor = StreamIngestor(ingest_service, db)
+    
+    async for rows in ingestor.run(request.stream()):
+        await manager.broadcast_json(IngestService.broadcast_payload(rows))
+    
+    return ingestor.summary()
+
+
 @router.delete("/{log_id}")
 async def delete_log(
     log_id: int,
@@ -125,8 +419,12 @@ async def delete_log(
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     
+    fields = _count_fields(log)
     db.delete(log)
+    RollupService.apply(db, [fields], sign=-1)
     db.commit()
+    log_count_cache.record_delete(fields)
+    response_cache.bump("logs")
     
     return {"message": "Log deleted successfully"}
 
@@ -135,45 +433,33 @@ async def delete_log(
 async def export_logs_csv(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    compress: Optional[str] = Query(None, pattern="^gzip$"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Export logs to CSV format"""
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
+    """Export logs to CSV format
     
-    query = db.query(SecurityLog)
-    if start_date:
-        query = query.filter(SecurityLog.timestamp >= start_date)
-    if end_date:
-        query = query.filter(SecurityLog.timestamp <= end_date)
-    
-    logs = query.order_by(desc(SecurityLog.timestamp)).all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'ID', 'Timestamp', 'Event Type', 'Severity', 'Source IP',
-        'Destination IP', 'Username', 'Description', 'Threat Score',
-        'Is Threat', 'Is Anomaly'
-    ])
+    Rows are streamed from a server-side cursor and written out chunk by chunk,
+    so memory use doesn't grow with the export size. ?compress=gzip returns a
+    .csv.gz compressed on the fly.
+    """
+    from fastapi.responses import StreamingResponse
     
-    # Write data
-    for log in logs:
-        writer.writerow([
-            log.id, log.timestamp, log.event_type.value, log.severity.value,
-            log.source_ip, log.destination_ip, log.username, log.description,
-            log.threat_score, log.is_threat, log.is_anomaly
-        ])
+    def generate():
+        # The request's session is already closed by the time the body streams;
+        # it reconnects for the export and we close it again when done
+        try:
+            yield from csv_stream(iter_log_chunks(db, start_date, end_date), compress=bool(compress))
+        finally:
+            db.close()
     
-    output.seek(0)
+    if compress:
+        media_type, filename = "application/gzip", "security_logs.csv.gz"
+    else:
+        media_type, filename = "text/csv", "security_logs.csv"
     
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode()),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=security_logs.csv"}
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
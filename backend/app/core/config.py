@@ -45,6 +45,79 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     
+    # Log ingestion
+    # Collectors push in bulk - keep batches small enough for one INSERT statement
+    INGEST_BATCH_SIZE: int = 1000
+    INGEST_MAX_BULK_ITEMS: int = 10000
+    INGEST_FLUSH_INTERVAL_SECONDS: float = 1.0
+    INGEST_MAX_LINE_BYTES: int = 65536
+    INGEST_QUEUE_MAX_SIZE: int = 50000
+    INGEST_RETRY_AFTER_SECONDS: int = 1
+    
+    # Listing totals (?total_mode=estimate)
+    LOG_COUNT_CACHE_TTL_SECONDS: int = 30
+    
+    # Shared dashboard summary snapshot (0 = only coalesce concurrent requests)
+    DASHBOARD_SNAPSHOT_TTL_SECONDS: float = 2.0
+    
+    # Analytics response cache (Redis when available, else in-process LRU)
+    RESPONSE_CACHE_TTL_SECONDS: int = 30
+    RESPONSE_CACHE_STALE_SECONDS: int = 0  # > 0 enables stale-while-revalidate
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+    
+    # security_logs partitions (PostgreSQL, see migrations/versions/0002) and retention
+    LOG_PARTITION_INTERVAL: str = "day"  # day or week
+    LOG_PARTITIONS_AHEAD: int = 7
+    LOG_RETENTION_DAYS: int = 0  # 0 = keep everything
+    LOG_RETENTION_BATCH_SIZE: int = 5000  # rows per DELETE where partitions aren't available
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    
+    # Cold archive: logs older than ARCHIVE_AFTER_DAYS move to Parquet segments in ARCHIVE_DIR
+    ARCHIVE_DIR: str = "data/archive"
+    ARCHIVE_AFTER_DAYS: int = 0  # 0 = never archive
+    ARCHIVE_SEGMENT_ROWS: int = 100000
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    
+    # Threat indicator (IOC) matcher - how often to pick up indicator changes
+    IOC_REFRESH_INTERVAL_SECONDS: int = 60
+    
+    # IP classification - CIDRs always treated as trusted (allow) or hostile (deny),
+    # e.g. IP_DENYLIST='["203.0.113.0/24"]'
+    IP_ALLOWLIST: List[str] = []
+    IP_DENYLIST: List[str] = []
+    IP_CLASSIFIER_CACHE_SIZE: int = 65536
+    
+    # GeoIP enrichment - range database built by scripts/build_geoip_db.py (missing file = off)
+    GEOIP_DB_PATH: str = "data/geoip.bin"
+    GEOIP_CACHE_SIZE: int = 65536
+    
+    # Event correlation (services/correlation.py) - alerts from bursts and attack chains
+    CORRELATION_ENABLED: bool = True
+    CORRELATION_MAX_KEYS: int = 200000  # (source_ip, username) pairs tracked per process
+    CORRELATION_IDLE_SECONDS: int = 3600
+    BRUTE_FORCE_THRESHOLD: int = 10
+    BRUTE_FORCE_WINDOW_SECONDS: int = 60
+    ATTACK_CHAIN_MIN_FAILURES: int = 3
+    ATTACK_CHAIN_WINDOW_SECONDS: int = 3600
+    
+    # Streaming sketches (services/sketch_service.py) - top source IPs, distinct IPs/users, score digests
+    SKETCH_TOP_K: int = 256  # counts are within total / (SKETCH_TOP_K + 1)
+    SKETCH_HLL_PRECISION: int = 12  # 2**12 registers, ~1.6% error on distinct counts
+    SKETCH_TDIGEST_COMPRESSION: int = 100  # ~100 centroids, p99 within a fraction of a percent
+    SKETCH_FLUSH_INTERVAL_SECONDS: int = 10
+    SKETCH_RETENTION_DAYS: int = 90  # 0 = keep everything
+    
+    # Behavioural baselines (services/baselines.py) - per user / source IP activity behind is_anomaly
+    BASELINE_MEMORY_MB: int = 256  # fixed budget, 140 bytes per entity (~1.9M entities)
+    BASELINE_SNAPSHOT_PATH: str = "data/baselines.npz"  # empty = don't persist
+    BASELINE_SNAPSHOT_INTERVAL_SECONDS: int = 300
+    BASELINE_SHORT_WINDOW_SECONDS: int = 300
+    BASELINE_LONG_WINDOW_SECONDS: int = 86400
+    BASELINE_PROFILE_WINDOW_SECONDS: int = 604800  # hour-of-day profile decay
+    BASELINE_MIN_EVENTS: int = 20  # events before an entity's baseline is used
+    BASELINE_RATE_Z: float = 4.0  # short-window burst, in Poisson standard deviations
+    BASELINE_HOUR_MIN_SHARE: float = 0.01  # hours under this share of activity are unusual
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
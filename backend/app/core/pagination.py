@@ -0,0 +1,55 @@
+"""Keyset (cursor) pagination helpers."""
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from datetime import datetime
+from typing import Tuple
+import base64
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor for the (timestamp, id) position of the last row on a page."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_cursor(query, timestamp_column, id_column, cursor: str):
+    """Restrict a (timestamp DESC, id DESC) ordered query to rows after the cursor.
+    
+    Uses a range predicate instead of OFFSET, so the index seek costs the same
+    for every page.
+    """
+    timestamp, row_id = decode_cursor(cursor)
+    return query.filter(or_(
+        timestamp_column < timestamp,
+        and_(timestamp_column == timestamp, id_column < row_id)
+    ))
+
+
+def paginate(query, timestamp_column, id_column, limit: int, skip: int = 0, cursor: str = None):
+    """Fetch one page ordered newest first.
+    
+    Returns (rows, next_cursor) - next_cursor is None on the last page.
+    """
+    query = query.order_by(timestamp_column.desc(), id_column.desc())
+    if cursor:
+        query = apply_cursor(query, timestamp_column, id_column, cursor)
+    elif skip:
+        query = query.offset(skip)
+    
+    # One extra row tells us whether there is a next page
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
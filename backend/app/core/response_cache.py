@@ -0,0 +1,193 @@
+"""
+Response cache for read-heavy endpoints (Redis, or in-process when Redis is down)
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.redis_client import redis_client, RedisClient
+from app.core.snapshot import snapshot_store
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, expire: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + expire, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    """Caches JSON-ready endpoint results, invalidated by data versions.
+
+    Each cached endpoint depends on one or more scopes ("logs", "alerts").
+    Writes call bump() on the scopes they change, and an entry only counts as
+    fresh while the versions it was computed at are current and it is younger
+    than its TTL. Versions live in Redis when it is up, so every worker sees
+    the same invalidations; otherwise everything stays in this process.
+
+    With stale_seconds > 0 (stale-while-revalidate), an outdated entry is still
+    served for up to stale_seconds past its TTL while a background task
+    recomputes it, so a busy ingest stream doesn't make every viewer wait for
+    the queries.
+    """
+
+    KEY_PREFIX = "response_cache"
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        session_factory=SessionLocal,
+        max_entries: int = None,
+        stale_seconds: float = None
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.local = LocalLRU(max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES)
+        self.stale_seconds = stale_seconds if stale_seconds is not None else settings.RESPONSE_CACHE_STALE_SECONDS
+        self._versions: Dict[str, int] = {}
+        self._versions_lock = threading.Lock()  # ingest queue bumps from a worker thread
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @property
+    def use_redis(self) -> bool:
+        return bool(self.redis and self.redis.enabled)
+
+    @classmethod
+    def make_key(cls, name: str, params: Dict[str, Any]) -> str:
+        normalized = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+        return f"{cls.KEY_PREFIX}:{name}:{normalized}"
+
+    def versions(self, scopes: Iterable[str]) -> list:
+        if self.use_redis:
+            return [int(self.redis.get(f"{self.KEY_PREFIX}:version:{scope}") or 0) for scope in scopes]
+        return [self._versions.get(scope, 0) for scope in scopes]
+
+    def bump(self, *scopes: str):
+        """Invalidate every entry that depends on any of scopes."""
+        for scope in scopes:
+            with self._versions_lock:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+            if self.use_redis:
+                self.redis.increment(f"{self.KEY_PREFIX}:version:{scope}")
+
+    def clear(self):
+        self.local.clear()
+        self._refreshing.clear()
+        if self.use_redis:
+            # Orphan whatever is in Redis rather than scanning for keys
+            self.bump("logs", "alerts")
+
+    def _load(self, key: str) -> Optional[dict]:
+        if self.use_redis:
+            return self.redis.get_json(key)
+        return self.local.get(key)
+
+    def _store(self, key: str, versions: list, value: Any, ttl: float):
+        entry = {"versions": versions, "stored_at": time.time(), "value": value}
+        expire = ttl + self.stale_seconds
+        if self.use_redis:
+            self.redis.set_json(key, entry, expire=max(1, int(expire + 0.999)))
+        else:
+            self.local.set(key, entry, expire)
+
+    async def get_or_compute(
+        self,
+        name: str,
+        params: Dict[str, Any],
+        scopes: Tuple[str, ...],
+        ttl: float,
+        compute: Callable,
+        db
+    ) -> Any:
+        """Cached result of compute(db) for this endpoint + params.
+
+        compute may be a plain function or a coroutine function; its result
+        must be JSON-encodable (it is passed through jsonable_encoder).
+        """
+        key = self.make_key(name, params)
+        versions = self.versions(scopes)
+        entry = self._load(key)
+
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            if entry["versions"] == versions and age < ttl:
+                self.hits += 1
+                return entry["value"]
+            if self.stale_seconds > 0 and age < ttl + self.stale_seconds:
+                self.stale_hits += 1
+                self._schedule_refresh(key, versions, ttl, compute)
+                return entry["value"]
+
+        self.misses += 1
+        # Identical requests arriving together share one computation
+        return await snapshot_store.get_or_compute(
+            key, 0, lambda: self._compute_and_store(key, versions, ttl, compute, db)
+        )
+
+    async def _compute_and_store(self, key: str, versions: list, ttl: float, compute: Callable, db) -> Any:
+        value = compute(db)
+        if inspect.isawaitable(value):
+            value = await value
+        value = jsonable_encoder(value)
+        self._store(key, versions, value, ttl)
+        return value
+
+    def _schedule_refresh(self, key: str, versions: list, ttl: float, compute: Callable):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        asyncio.get_running_loop().create_task(self._refresh(key, versions, ttl, compute))
+
+    async def _refresh(self, key: str, versions: list, ttl: float, compute: Callable):
+        # The request that triggered the refresh has its own session, which
+        # will be closed before this runs - use a fresh one
+        db = self.session_factory()
+        try:
+            await snapshot_store.get_or_compute(
+                key, 0, lambda: self._compute_and_store(key, versions, ttl, compute, db)
+            )
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {e}")
+        finally:
+            db.close()
+            self._refreshing.discard(key)
+
+
+response_cache = ResponseCache()
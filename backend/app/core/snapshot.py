@@ -0,0 +1,66 @@
+"""
+Short-lived shared snapshots of expensive read endpoints
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SnapshotStore:
+    """Per-process store of recently computed results.
+
+    get_or_compute() returns a fresh snapshot if there is one. Otherwise it
+    computes one, and concurrent callers asking for the same key while that
+    computation is running await it too, so N simultaneous viewers cost one
+    computation. Values should be plain JSON-ready data, not ORM objects, since
+    they outlive the session that produced them.
+    """
+
+    def __init__(self):
+        self._values: Dict[Hashable, Tuple[float, Any]] = {}  # key -> (expires_at, value)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(self, key: Hashable, ttl: float, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._values.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield - one cancelled waiter mustn't cancel the others
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting - don't warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            if ttl > 0:
+                self._values[key] = (time.monotonic() + ttl, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                # The computing request was cancelled
+                future.cancel()
+
+    def invalidate(self, key: Hashable = None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+
+snapshot_store = SnapshotStore()
@@ -1,12 +1,16 @@
 """
 Database Models
 """
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import (
+    Column, Integer, String, DateTime, Float, Boolean, Text, LargeBinary, ForeignKey, Index, DDL, event, text,
+    Enum as SQLEnum
+)
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 
 from app.db.database import Base
+from app.db.search import FTS_TABLE, SQLITE_FTS_DDL, search_document
 
 
 class SeverityLevel(str, enum.Enum):
@@ -96,6 +100,65 @@ class SecurityLog(Base):
     
     # Relationships
     alerts = relationship("Alert", back_populates="log")
+    
+    # Shaped after the dashboard queries - keep in sync with migrations/versions
+    __table_args__ = (
+        # time window + threat flag (statistics, trends)
+        Index("ix_security_logs_timestamp_is_threat", "timestamp", "is_threat"),
+        # top source IPs in a time window
+        Index("ix_security_logs_source_ip_timestamp", "source_ip", "timestamp"),
+        # keyset pagination (ORDER BY timestamp DESC, id DESC)
+        Index("ix_security_logs_timestamp_id", "timestamp", "id"),
+        # threat rows only - a small fraction of the table
+        Index(
+            "ix_security_logs_threats_timestamp", "timestamp", "event_type", "severity",
+            postgresql_where=text("is_threat"),
+            sqlite_where=text("is_threat = 1")
+        ),
+    )
+
+
+# Full-text search over description/raw_log (app/db/search.py) - a GIN index on
+# PostgreSQL, an FTS5 table maintained by triggers on SQLite
+Index(
+    "ix_security_logs_search",
+    search_document(SecurityLog.description, SecurityLog.raw_log),
+    postgresql_using="gin"
+).ddl_if(dialect="postgresql")
+for _statement in SQLITE_FTS_DDL:
+    event.listen(SecurityLog.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(SecurityLog.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"))
+
+
+class RollupMixin:
+    """Pre-aggregated log counts per time bucket (see services/rollup_service.py)"""
+    bucket = Column(DateTime, primary_key=True)
+    event_type = Column(SQLEnum(EventType), primary_key=True)
+    severity = Column(SQLEnum(SeverityLevel), primary_key=True)
+    is_threat = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    threat_score_sum = Column(Float, nullable=False, default=0.0)
+
+
+class LogRollupHourly(RollupMixin, Base):
+    """Hourly log rollups"""
+    __tablename__ = "log_rollups_hourly"
+
+
+class LogRollupDaily(RollupMixin, Base):
+    """Daily log rollups"""
+    __tablename__ = "log_rollups_daily"
+
+
+class LogSketch(Base):
+    """Mergeable sketches of log attributes per hour/day bucket (see services/sketch_service.py)"""
+    __tablename__ = "log_sketches"
+    
+    granularity = Column(String(8), primary_key=True)  # hour, day
+    bucket = Column(DateTime, primary_key=True)
+    name = Column(String(100), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class Alert(Base):
@@ -118,6 +181,11 @@ class Alert(Base):
     # Relationships
     log = relationship("SecurityLog", back_populates="alerts")
     user = relationship("User", back_populates="alerts")
+    
+    __table_args__ = (
+        # open/critical counters and status-filtered listings
+        Index("ix_alerts_status_severity_created_at", "status", "severity", "created_at"),
+    )
 
 
 class ThreatIndicator(Base):
@@ -0,0 +1,131 @@
+"""
+Full-text search over security log descriptions and raw_log
+
+SQLite: an external-content FTS5 table (security_logs_fts) kept in step with
+security_logs by triggers, ranked with bm25.
+PostgreSQL: a GIN index on a to_tsvector expression, ranked with ts_rank_cd.
+Both are maintained by the database on every insert/update/delete.
+"""
+import re
+from typing import List
+
+from sqlalchemy import func, literal_column, table, column, inspect, text
+from sqlalchemy.orm import Session
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "security_logs_fts"
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "description, raw_log, content='security_logs', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description, raw_log) VALUES (new.id, new.description, new.raw_log); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, raw_log) "
+    "VALUES ('delete', old.id, old.description, old.raw_log); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, raw_log ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, raw_log) "
+    "VALUES ('delete', old.id, old.description, old.raw_log); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description, raw_log) VALUES (new.id, new.description, new.raw_log); "
+    "END",
+]
+
+_fts = table(FTS_TABLE, column("rowid"))
+_REGCONFIG = text(f"'{SEARCH_CONFIG}'::regconfig")
+
+# websearch-style input: "quoted phrases", -excluded, OR, bare words
+_TOKEN = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+
+def search_document(description, raw_log):
+    """The tsvector the PostgreSQL GIN index is built on.
+
+    Queries have to use this exact expression for the index to apply, so the
+    constants are inlined as SQL rather than bound parameters.
+    """
+    text_value = func.coalesce(description, text("''")).op("||")(text("' '")) \
+        .op("||")(func.coalesce(raw_log, text("''")))
+    return func.to_tsvector(_REGCONFIG, text_value)
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def to_fts5_query(q: str) -> str:
+    """Translate websearch-style input into an FTS5 MATCH expression.
+
+    Every term becomes an FTS5 string, so punctuation in IPs, paths and the
+    like is just tokenized instead of being parsed as query syntax.
+    """
+    included: List[str] = []
+    excluded: List[str] = []
+    pending_or = False
+    for match in _TOKEN.finditer(q):
+        negated, phrase, word = match.groups()
+        if word is not None:
+            if word == "OR":
+                pending_or = bool(included)
+                continue
+            negated, word = word.startswith("-"), word.lstrip("-")
+            phrase = word
+        if not phrase.strip():
+            continue
+        if negated:
+            excluded.append(_quote(phrase))
+        elif pending_or:
+            included[-1] = f"{included[-1]} OR {_quote(phrase)}"
+        else:
+            included.append(_quote(phrase))
+        pending_or = False
+
+    if not included:
+        raise ValueError("Search needs at least one term that isn't excluded")
+    expression = " AND ".join(f"({term})" for term in included)
+    for term in excluded:
+        expression = f"({expression}) NOT {term}"
+    return expression
+
+
+def apply_search(query, q: str, dialect: str):
+    """Restrict a SecurityLog query to logs matching q.
+
+    Returns (query, rank_order) - order by rank_order for best matches first.
+    Raises ValueError for queries that can't be run.
+    """
+    from app.db.models import SecurityLog
+
+    if dialect == "postgresql":
+        document = search_document(SecurityLog.description, SecurityLog.raw_log)
+        tsquery = func.websearch_to_tsquery(_REGCONFIG, q)
+        query = query.filter(document.op("@@")(tsquery))
+        return query, func.ts_rank_cd(document, tsquery).desc()
+
+    if dialect == "sqlite":
+        query = query.join(_fts, _fts.c.rowid == SecurityLog.id).filter(
+            literal_column(FTS_TABLE).op("MATCH")(to_fts5_query(q))
+        )
+        # bm25 is lower for better matches
+        return query, func.bm25(literal_column(FTS_TABLE)).asc()
+
+    raise ValueError(f"Full-text search is not implemented for {dialect}")
+
+
+def ensure_search_index(db: Session) -> bool:
+    """Create (and fill) the SQLite FTS table for a database that predates it.
+
+    Returns True when the index had to be built.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    tables = inspect(db.get_bind()).get_table_names()
+    if FTS_TABLE in tables or "security_logs" not in tables:
+        return False
+    for statement in SQLITE_FTS_DDL:
+        db.execute(text(statement))
+    db.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    db.commit()
+    return True
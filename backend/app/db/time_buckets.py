@@ -0,0 +1,124 @@
+"""
+Dialect-portable time bucketing for security log timelines
+"""
+from sqlalchemy import func, case, cast, Integer
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from math import gcd
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.db.models import SecurityLog
+
+# Supported bucket widths, in seconds
+BUCKET_WIDTHS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+# date_trunc units for widths PostgreSQL can truncate to directly
+_PG_TRUNC_UNITS = {60: "minute", 3600: "hour", 86400: "day"}
+
+# Every real UTC offset is a multiple of 15 minutes, so UTC buckets of this
+# width never straddle an offset change and can be regrouped in local time
+_OFFSET_GRANULARITY = 900
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_width(interval: str) -> int:
+    try:
+        return BUCKET_WIDTHS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported interval '{interval}' (use one of {', '.join(BUCKET_WIDTHS)})")
+
+
+def parse_tz(tz: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone '{tz}'")
+
+
+def is_utc(tz: str) -> bool:
+    return tz.upper() in ("UTC", "ETC/UTC", "Z")
+
+
+def floor_local(ts: datetime, width: int, tz: ZoneInfo) -> datetime:
+    """Local (wall-clock, naive) start of the bucket holding naive-UTC ts"""
+    local = ts.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+    seconds = int((local - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % width)
+
+
+def bucket_expression(column, width: int, dialect: str, tz: str = "UTC"):
+    """SQL expression for the bucket of column as integer epoch seconds.
+
+    PostgreSQL: date_trunc (or epoch division for other widths) on the local
+    wall-clock time, so tz boundaries, DST included, are exact.
+    SQLite: integer division of the unix epoch. tz must be UTC - other zones
+    are handled by bucket_counts regrouping finer UTC buckets.
+
+    Timestamps are stored as naive UTC. Either way the grouping expression
+    sits on top of a plain range filter on the column, so the timestamp index
+    still drives the scan.
+    """
+    if dialect == "postgresql":
+        local = func.timezone(tz, func.timezone("UTC", column))
+        if width in _PG_TRUNC_UNITS:
+            local = func.date_trunc(_PG_TRUNC_UNITS[width], local)
+            return cast(func.extract("epoch", local), Integer)
+        return cast(func.floor(func.extract("epoch", local) / width), Integer) * width
+
+    if dialect == "sqlite":
+        if not is_utc(tz):
+            raise ValueError("SQLite buckets are computed in UTC")
+        epoch = cast(func.strftime("%s", column), Integer)
+        # Floor division renders as plain integer / in SQLite
+        return (epoch // width) * width
+
+    raise ValueError(f"Time bucketing is not implemented for {dialect}")
+
+
+def bucket_counts(
+    db: Session,
+    start: datetime,
+    interval: str = "1h",
+    tz: str = "UTC",
+    end: Optional[datetime] = None
+) -> Dict[datetime, Tuple[int, int]]:
+    """Log totals and threat counts per bucket for start <= timestamp (< end).
+
+    Keys are bucket starts as naive local wall-clock datetimes in tz.
+    """
+    width = parse_width(interval)
+    zone = parse_tz(tz)
+    dialect = db.get_bind().dialect.name
+
+    # SQLite can't convert time zones - group finer UTC buckets, regroup below
+    regroup = dialect != "postgresql" and not is_utc(tz)
+    if regroup:
+        bucket = bucket_expression(SecurityLog.timestamp, gcd(width, _OFFSET_GRANULARITY), dialect)
+    else:
+        bucket = bucket_expression(SecurityLog.timestamp, width, dialect, tz)
+    bucket = bucket.label("bucket")
+    query = db.query(
+        bucket,
+        func.count(SecurityLog.id),
+        func.sum(case((SecurityLog.is_threat == True, 1), else_=0))
+    ).filter(SecurityLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(SecurityLog.timestamp < end)
+    rows = query.group_by(bucket).all()
+
+    counts: Dict[datetime, Tuple[int, int]] = {}
+    for epoch, total, threats in rows:
+        ts = _EPOCH + timedelta(seconds=int(epoch))
+        if regroup:
+            ts = floor_local(ts, width, zone)
+        previous_total, previous_threats = counts.get(ts, (0, 0))
+        counts[ts] = (previous_total + total, previous_threats + (threats or 0))
+    return counts
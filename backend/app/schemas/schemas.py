@@ -90,9 +90,43 @@ class SecurityLog(SecurityLogBase):
 
 class SecurityLogList(BaseModel):
     logs: List[SecurityLog]
-    total: int
+    total: Optional[int]
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+    total_exact: bool = True
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    errors: Optional[List[dict]] = None
+
+
+class SecurityLogBulkResult(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BulkItemResult]
+
+
+class LogStreamSummary(BaseModel):
+    lines: int
+    accepted: int
+    rejected: int
+    batches: int
+    errors: List[dict]
+    errors_truncated: bool
+
+
+class IngestQueueStats(BaseModel):
+    running: bool
+    depth: int
+    capacity: int
+    enqueued: int
+    written: int
+    rejected: int
+    dropped: int
+    batches: int
 
 
 # Alert Schemas
@@ -0,0 +1,418 @@
+"""Cold-tier archive: old security logs moved out of the database into
+immutable, compressed columnar segment files."""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.db.database import SessionLocal
+from app.db.models import SecurityLog, Alert, EventType, SeverityLevel, LogRollupHourly, LogRollupDaily
+from app.services.count_service import log_count_cache
+from app.services.rollup_service import RollupService, floor_day
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".parquet"
+# Row groups carry their own min/max statistics, so date filters skip most of
+# a segment without decompressing it
+SEGMENT_ROW_GROUP_ROWS = 10000
+# Rows per DELETE once a segment is safely on disk
+ARCHIVE_DELETE_BATCH = 1000
+
+ARCHIVE_COLUMNS = [
+    SecurityLog.id, SecurityLog.timestamp, SecurityLog.event_type, SecurityLog.severity,
+    SecurityLog.source_ip, SecurityLog.destination_ip, SecurityLog.user_agent,
+    SecurityLog.username, SecurityLog.description, SecurityLog.raw_log,
+    SecurityLog.threat_score, SecurityLog.is_anomaly, SecurityLog.country,
+    SecurityLog.city, SecurityLog.is_threat, SecurityLog.confidence_score,
+]
+
+# What the rollups need back when a segment is dropped
+ROLLUP_FIELDS = ["timestamp", "event_type", "severity", "is_threat", "threat_score"]
+
+
+class SegmentInfo(NamedTuple):
+    path: str
+    min_timestamp: datetime
+    max_timestamp: datetime
+    rows: int
+
+
+def segment_schema():
+    """Arrow schema of a segment - low-cardinality strings are dictionary encoded."""
+    import pyarrow as pa
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('us')),
+        ('event_type', dictionary),
+        ('severity', dictionary),
+        ('source_ip', dictionary),
+        ('destination_ip', pa.string()),
+        ('user_agent', pa.string()),
+        ('username', pa.string()),
+        ('description', pa.string()),
+        ('raw_log', pa.string()),
+        ('threat_score', pa.float64()),
+        ('is_anomaly', pa.bool_()),
+        ('country', pa.string()),
+        ('city', pa.string()),
+        ('is_threat', pa.bool_()),
+        ('confidence_score', pa.float64()),
+    ])
+
+
+def _to_log(row: Dict[str, Any]) -> SecurityLog:
+    """Detached SecurityLog for an archived row (never added to a session)"""
+    row["event_type"] = EventType(row["event_type"])
+    if row["severity"] is not None:
+        row["severity"] = SeverityLevel(row["severity"])
+    return SecurityLog(**row)
+
+
+class SegmentStore:
+    """Read/write access to the archive directory.
+
+    Each segment is a zstd-compressed Parquet file of logs sorted by
+    (timestamp, id). Its footer carries min_timestamp/max_timestamp/rows, so
+    listing the archive only reads footers, and a query opens just the
+    segments that overlap its date range. Segments are memory-mapped when read.
+    Files are written under a temporary name and renamed into place - readers
+    never see a partial segment.
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or settings.ARCHIVE_DIR
+        # path -> (mtime_ns, SegmentInfo)
+        self._footers: Dict[str, Tuple[int, SegmentInfo]] = {}
+
+    # --- Segment index --------------------------------------------------------
+
+    def segments(self) -> List[SegmentInfo]:
+        """Every segment, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(SEGMENT_SUFFIX) or entry.name.startswith("."):
+                continue
+            mtime = entry.stat().st_mtime_ns
+            cached = self._footers.get(entry.path)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, self._read_footer(entry.path))
+                self._footers[entry.path] = cached
+            segments.append(cached[1])
+        return sorted(segments, key=lambda s: (s.min_timestamp, s.path))
+
+    @staticmethod
+    def _read_footer(path: str) -> SegmentInfo:
+        import pyarrow.parquet as pq
+        footer = pq.read_metadata(path, memory_map=True).metadata
+        return SegmentInfo(
+            path=path,
+            min_timestamp=datetime.fromisoformat(footer[b"min_timestamp"].decode()),
+            max_timestamp=datetime.fromisoformat(footer[b"max_timestamp"].decode()),
+            rows=int(footer[b"rows"]),
+        )
+
+    def newest_timestamp(self) -> Optional[datetime]:
+        segments = self.segments()
+        return max(s.max_timestamp for s in segments) if segments else None
+
+    def reaches(self, start_date: Optional[datetime]) -> bool:
+        """Whether a range starting at start_date (None = unbounded) includes archived logs"""
+        newest = self.newest_timestamp()
+        return newest is not None and (start_date is None or start_date <= newest)
+
+    def overlapping(self, start: Optional[datetime], end: Optional[datetime]) -> List[SegmentInfo]:
+        return [
+            s for s in self.segments()
+            if (start is None or s.max_timestamp >= start) and (end is None or s.min_timestamp <= end)
+        ]
+
+    # --- Writing ----------------------------------------------------------------
+
+    def write_segment(self, rows: List[Dict[str, Any]]) -> SegmentInfo:
+        """Write rows (dicts keyed by column name) as one new segment."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = sorted(rows, key=lambda r: (r["timestamp"], r["id"]))
+        schema = segment_schema()
+        arrays = []
+        for field in schema:
+            values = [row[field.name] for row in rows]
+            if field.name in ("event_type", "severity"):
+                values = [v.value if v is not None else None for v in values]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+
+        min_ts, max_ts = rows[0]["timestamp"], rows[-1]["timestamp"]
+        schema = schema.with_metadata({
+            "min_timestamp": min_ts.isoformat(),
+            "max_timestamp": max_ts.isoformat(),
+            "rows": str(len(rows)),
+        })
+        table = pa.Table.from_arrays(arrays, schema=schema)
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"logs-{min_ts:%Y%m%dT%H%M%S}-{max_ts:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        tmp_path = os.path.join(self.directory, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd", row_group_size=SEGMENT_ROW_GROUP_ROWS)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return SegmentInfo(path, min_ts, max_ts, len(rows))
+
+    def remove(self, segment: SegmentInfo):
+        os.remove(segment.path)
+        self._footers.pop(segment.path, None)
+
+    # --- Reading ------------------------------------------------------------------
+
+    @staticmethod
+    def _filters(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        severity: Optional[str] = None,
+        event_type: Optional[str] = None,
+        is_threat: Optional[bool] = None,
+        before: Optional[Tuple[datetime, int]] = None
+    ):
+        """Parquet filters (DNF) for the listing filters, plus an optional
+        (timestamp, id) keyset position to read strictly before"""
+        base = []
+        if start is not None:
+            base.append(("timestamp", ">=", start))
+        if end is not None:
+            base.append(("timestamp", "<=", end))
+        if severity:
+            base.append(("severity", "=", severity))
+        if event_type:
+            base.append(("event_type", "=", event_type))
+        if is_threat is not None:
+            base.append(("is_threat", "=", is_threat))
+        if before is not None:
+            timestamp, row_id = before
+            return [
+                base + [("timestamp", "<", timestamp)],
+                base + [("timestamp", "=", timestamp), ("id", "<", row_id)],
+            ]
+        return base or None
+
+    def _read(self, segment: SegmentInfo, filters, columns: List[str] = None):
+        import pyarrow.parquet as pq
+        return pq.read_table(segment.path, columns=columns, filters=filters, memory_map=True)
+
+    def count(self, start: Optional[datetime] = None, end: Optional[datetime] = None, **filters) -> int:
+        """Archived logs matching the listing filters"""
+        segments = self.overlapping(start, end)
+        if not segments:
+            return 0
+        parquet_filters = self._filters(start, end, **filters)
+        if parquet_filters is None:
+            return sum(s.rows for s in segments)
+        return sum(self._read(s, parquet_filters, columns=["id"]).num_rows for s in segments)
+
+    def read_logs(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 100,
+        before: Optional[Tuple[datetime, int]] = None,
+        **filters
+    ) -> List[SecurityLog]:
+        """Newest `limit` archived logs in the range, as detached SecurityLog objects,
+        ordered (timestamp DESC, id DESC)"""
+        parquet_filters = self._filters(start, end, before=before, **filters)
+        logs: List[SecurityLog] = []
+        # Newest segments first - stop once the rest can't beat what we have
+        for segment in sorted(self.overlapping(start, end), key=lambda s: s.max_timestamp, reverse=True):
+            if len(logs) >= limit and segment.max_timestamp < logs[limit - 1].timestamp:
+                break
+            # Segments are sorted, so the newest matches are the last rows - only those become objects
+            table = self._read(segment, parquet_filters)
+            rows = table.slice(max(0, table.num_rows - limit)).to_pylist()
+            logs.extend(_to_log(row) for row in rows)
+            logs.sort(key=lambda log: (log.timestamp, log.id), reverse=True)
+            del logs[limit:]
+        return logs
+
+    def iter_chunks(
+        self,
+        columns: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 1000
+    ) -> Iterator[List[tuple]]:
+        """Archived rows in the range as tuples of `columns`, newest segment first
+        and newest first within each segment"""
+        parquet_filters = self._filters(start, end)
+        enums = {"event_type": EventType, "severity": SeverityLevel}
+        for segment in sorted(self.overlapping(start, end), key=lambda s: s.max_timestamp, reverse=True):
+            table = self._read(segment, parquet_filters, columns=columns)
+            # Zero-copy batches, newest last - converted to Python one chunk at a time
+            for batch in reversed(table.to_batches(max_chunksize=chunk_size)):
+                rows = batch.to_pydict()
+                values = [
+                    [enums[name](v) if name in enums and v is not None else v for v in rows[name]]
+                    for name in columns
+                ]
+                yield list(zip(*values))[::-1]
+
+    def iter_rollup_rows(self, segment: SegmentInfo = None, fields: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """Rollup fields (or the given fields) of every archived log (or of one segment)"""
+        for s in [segment] if segment else self.segments():
+            for batch in self._read(s, None, columns=fields or ROLLUP_FIELDS).to_batches(max_chunksize=10000):
+                for row in batch.to_pylist():
+                    if "event_type" in row:
+                        row["event_type"] = EventType(row["event_type"])
+                    if row.get("severity") is not None:
+                        row["severity"] = SeverityLevel(row["severity"])
+                    yield row
+
+
+class LogArchiver:
+    """Moves logs older than ARCHIVE_AFTER_DAYS into segment files.
+
+    Each pass archives whole days: the oldest eligible rows go into segments of
+    up to ARCHIVE_SEGMENT_ROWS, and only once a segment is on disk are its rows
+    deleted from security_logs. Logs referenced by an alert stay in the
+    database. Archived logs still count in the analytics rollups.
+
+    With LOG_RETENTION_DAYS set, segments whose newest log is past retention
+    are deleted and subtracted from the rollups.
+    """
+
+    def __init__(
+        self,
+        store: SegmentStore = None,
+        session_factory=SessionLocal,
+        after_days: int = None,
+        segment_rows: int = None,
+        retention_days: int = None,
+        interval: float = None
+    ):
+        self.store = store or segment_store
+        self.session_factory = session_factory
+        self.after_days = after_days if after_days is not None else settings.ARCHIVE_AFTER_DAYS
+        self.segment_rows = segment_rows or settings.ARCHIVE_SEGMENT_ROWS
+        self.retention_days = retention_days if retention_days is not None else settings.LOG_RETENTION_DAYS
+        self.interval = interval or settings.ARCHIVE_INTERVAL_SECONDS
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def archive_before(self, db: Session, cutoff: datetime) -> List[SegmentInfo]:
+        """Archive every unreferenced log older than cutoff."""
+        referenced = select(Alert.log_id).where(Alert.log_id.isnot(None))
+        written = []
+        last: Optional[Tuple[datetime, int]] = None
+        while True:
+            stmt = select(*ARCHIVE_COLUMNS).where(
+                SecurityLog.timestamp < cutoff, SecurityLog.id.notin_(referenced)
+            )
+            if last is not None:
+                # Referenced rows stay behind - don't pick them up again
+                stmt = stmt.where(
+                    (SecurityLog.timestamp > last[0])
+                    | ((SecurityLog.timestamp == last[0]) & (SecurityLog.id > last[1]))
+                )
+            rows = db.execute(
+                stmt.order_by(SecurityLog.timestamp, SecurityLog.id).limit(self.segment_rows)
+            ).mappings().all()
+            if not rows:
+                break
+            rows = [dict(row) for row in rows]
+            segment = self.store.write_segment(rows)
+            try:
+                ids = [row["id"] for row in rows]
+                for offset in range(0, len(ids), ARCHIVE_DELETE_BATCH):
+                    db.execute(delete(SecurityLog).where(SecurityLog.id.in_(ids[offset:offset + ARCHIVE_DELETE_BATCH])))
+                db.commit()
+            except Exception:
+                # Rows are still in the database - don't leave a duplicate copy on disk
+                db.rollback()
+                self.store.remove(segment)
+                raise
+            written.append(segment)
+            last = (rows[-1]["timestamp"], rows[-1]["id"])
+        return written
+
+    def drop_expired(self, db: Session, cutoff: datetime) -> List[SegmentInfo]:
+        """Delete segments holding only logs older than cutoff."""
+        dropped = []
+        for segment in self.store.segments():
+            if segment.max_timestamp >= cutoff:
+                continue
+            RollupService.apply(db, list(self.store.iter_rollup_rows(segment)), sign=-1)
+            # Partition retention may have dropped these buckets already
+            for model in (LogRollupHourly, LogRollupDaily):
+                db.execute(delete(model).where(model.count <= 0))
+            db.commit()
+            self.store.remove(segment)
+            dropped.append(segment)
+        return dropped
+
+    def run_once(self, now: datetime = None) -> dict:
+        """One archive pass (blocking - run it in a thread from async code)."""
+        now = now or datetime.utcnow()
+        result = {"archived_rows": 0, "segments": 0, "dropped_segments": 0}
+        db = self.session_factory()
+        try:
+            if self.enabled:
+                written = self.archive_before(db, floor_day(now - timedelta(days=self.after_days)))
+                result["segments"] = len(written)
+                result["archived_rows"] = sum(s.rows for s in written)
+            if self.retention_days > 0:
+                result["dropped_segments"] = len(self.drop_expired(db, now - timedelta(days=self.retention_days)))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if any(result.values()):
+            log_count_cache.clear()
+            response_cache.bump("logs")
+        return result
+
+    def start(self):
+        if (self.enabled or self.retention_days > 0) and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await asyncio.to_thread(self.run_once)
+                if any(result.values()):
+                    logger.info(f"Log archive: {result}")
+            except Exception as e:
+                logger.error(f"Log archive failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+segment_store = SegmentStore()
+log_archiver = LogArchiver()
@@ -0,0 +1,348 @@
+"""Behavioural baselines per username and source IP, behind is_anomaly."""
+import asyncio
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.sketches import hash64
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Per-entity float32 state: events seen, short- and long-window decayed event
+# counts, the current hour-profile increment and profile total, then 24 hour bins
+N, SHORT, LONG, BUMP, TOTAL, PROFILE = 0, 1, 2, 3, 4, 5
+STRIDE = PROFILE + 24
+WAYS = 4  # slots per hash set - an entity can only live in its set's slots
+BYTES_PER_ENTITY = 8 + 2 * 8 + 4 * STRIDE  # key hash, first/last seen, state
+
+# Hour-profile weights grow by exp(elapsed / profile window) instead of every
+# bin decaying; rescaled to 1 before they overflow float32
+_RESCALE_AT = 1e30
+_DAY = 86400.0
+
+
+class BaselineJournal:
+    """What a batch changed in a BaselineStore - the slots it touched as they
+    were before it, and the counters - so a failed write can be undone"""
+
+    def __init__(self):
+        self.slots: Dict[int, tuple] = {}
+        self.counters = None
+
+
+class BaselineStore:
+    """Exponentially weighted activity baselines with O(1) updates.
+
+    Each entity (a username or a source IP) keeps an event rate over a short
+    and a long window, as exponentially decayed event counts, and an
+    hour-of-day profile decayed over BASELINE_PROFILE_WINDOW_SECONDS. An event is scored against its entities' baselines
+    before being added to them:
+
+    - rate: events in the short window against what the long-window rate
+      predicts, as a Poisson z-score over BASELINE_RATE_Z
+    - hour: the share of the entity's recent activity in this hour of day,
+      when it is under BASELINE_HOUR_MIN_SHARE (once it has a day of history)
+
+    The larger deviation wins, and 1 or more is an anomaly. Entities with
+    fewer than BASELINE_MIN_EVENTS events have no baseline yet.
+
+    State lives in preallocated arrays sized from BASELINE_MEMORY_MB, hashed
+    into sets of WAYS slots. A new entity takes a free slot in its set or
+    evicts the least recently seen one, so memory never grows. The arrays
+    are allocated lazily (and zero pages cost nothing until touched), and are
+    snapshotted to BASELINE_SNAPSHOT_PATH periodically and on shutdown. State
+    is per process - with several API workers each sees its own share of events,
+    and the last one to snapshot wins.
+
+    Callers scoring events before they are stored pass a BaselineJournal and
+    restore() it if the write fails, so a rolled-back or retried batch isn't
+    counted twice.
+    """
+
+    def __init__(
+        self,
+        memory_mb: float = None,
+        snapshot_path: str = None,
+        snapshot_interval: float = None,
+        short_window: float = None,
+        long_window: float = None,
+        profile_window: float = None,
+        min_events: int = None,
+        rate_z: float = None,
+        hour_min_share: float = None
+    ):
+        memory_mb = memory_mb or settings.BASELINE_MEMORY_MB
+        self.sets = max(1, int(memory_mb * 2 ** 20 // (BYTES_PER_ENTITY * WAYS)))
+        self.capacity = self.sets * WAYS
+        self.snapshot_path = snapshot_path if snapshot_path is not None else settings.BASELINE_SNAPSHOT_PATH
+        self.snapshot_interval = snapshot_interval or settings.BASELINE_SNAPSHOT_INTERVAL_SECONDS
+        self.short_window = short_window or settings.BASELINE_SHORT_WINDOW_SECONDS
+        self.long_window = long_window or settings.BASELINE_LONG_WINDOW_SECONDS
+        self.profile_window = profile_window or settings.BASELINE_PROFILE_WINDOW_SECONDS
+        self.min_events = min_events if min_events is not None else settings.BASELINE_MIN_EVENTS
+        self.rate_z = rate_z or settings.BASELINE_RATE_Z
+        self.hour_min_share = hour_min_share or settings.BASELINE_HOUR_MIN_SHARE
+
+        self._lock = threading.Lock()
+        self._blank = memoryview(np.zeros(STRIDE, dtype=np.float32))
+        self._allocated = False
+        self._journal: Optional[BaselineJournal] = None
+        self.task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.anomalies = 0
+        self.evicted = 0
+
+    def _allocate(self):
+        self.keys = np.zeros(self.capacity, dtype=np.uint64)
+        self.times = np.zeros(2 * self.capacity)  # first seen, last seen
+        self.state = np.zeros(STRIDE * self.capacity, dtype=np.float32)
+        # Element access through memoryviews gives plain Python numbers - much
+        # faster than numpy scalars one event at a time
+        self._keys, self._times, self._state = memoryview(self.keys), memoryview(self.times), memoryview(self.state)
+        self._allocated = True
+
+    def clear(self):
+        with self._lock:
+            self._allocated = False
+            self.keys = self.times = self.state = None
+            self._keys = self._times = self._state = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = int(np.count_nonzero(self.keys)) if self._allocated else 0
+        return {
+            "tracked_entities": tracked,
+            "capacity": self.capacity,
+            "bytes_per_entity": BYTES_PER_ENTITY,
+            "events": self.events,
+            "anomalies": self.anomalies,
+            "evicted": self.evicted
+        }
+
+    # --- Scoring ------------------------------------------------------------------
+
+    def observe(self, timestamp: datetime, username: Optional[str], source_ip: Optional[str],
+                journal: BaselineJournal = None) -> float:
+        """Score one event against its user's and source IP's baselines, then
+        add it to them. Returns the deviation (1 or more is anomalous)."""
+        with self._lock:
+            self._begin(journal)
+            try:
+                return self._observe_event(timestamp, username, source_ip)
+            finally:
+                self._journal = None
+
+    def is_anomaly(self, timestamp: datetime, username: Optional[str], source_ip: Optional[str],
+                   journal: BaselineJournal = None) -> bool:
+        return self.observe(timestamp, username, source_ip, journal) >= 1.0
+
+    def mark_rows(self, rows: Iterable[Dict[str, Any]], journal: BaselineJournal = None) -> int:
+        """Set is_anomaly on log rows (dicts with timestamp, username, source_ip)
+        in order. Returns how many were anomalous."""
+        flagged = 0
+        with self._lock:
+            self._begin(journal)
+            try:
+                for row in rows:
+                    anomalous = self._observe_event(row['timestamp'], row.get('username'), row.get('source_ip')) >= 1.0
+                    row['is_anomaly'] = anomalous
+                    flagged += anomalous
+            finally:
+                self._journal = None
+        return flagged
+
+    def restore(self, journal: BaselineJournal):
+        """Undo the events recorded in journal. Events other callers added to
+        the same entities in the meantime are undone with them."""
+        with self._lock:
+            if journal.counters is None or not self._allocated:
+                return
+            for slot, (key, times, state) in journal.slots.items():
+                self.keys[slot] = key
+                self.times[2 * slot:2 * slot + 2] = times
+                self.state[slot * STRIDE:(slot + 1) * STRIDE] = state
+            self.events, self.anomalies, self.evicted = journal.counters
+            journal.slots.clear()
+            journal.counters = None
+
+    def _begin(self, journal: Optional[BaselineJournal]):
+        if journal is not None and journal.counters is None:
+            journal.counters = (self.events, self.anomalies, self.evicted)
+        self._journal = journal
+
+    def _remember(self, slot: int):
+        """Keep slot's current contents in the active journal (first touch only)"""
+        journal = self._journal
+        if journal is None or slot in journal.slots:
+            return
+        offset = slot * STRIDE
+        journal.slots[slot] = (
+            self.keys[slot], self.times[2 * slot:2 * slot + 2].copy(), self.state[offset:offset + STRIDE].copy()
+        )
+
+    def _observe_event(self, timestamp: datetime, username: Optional[str], source_ip: Optional[str]) -> float:
+        if not self._allocated:
+            self._allocate()
+        self.events += 1
+        at = (timestamp - _EPOCH).total_seconds()
+        deviation = 0.0
+        if username:
+            deviation = self._observe(hash64(f"user:{username}") or 1, at, timestamp.hour)
+        if source_ip:
+            deviation = max(deviation, self._observe(hash64(f"ip:{source_ip}") or 1, at, timestamp.hour))
+        if deviation >= 1.0:
+            self.anomalies += 1
+        return deviation
+
+    def _slot(self, key: int) -> int:
+        """Slot holding key, claiming one (free or least recently seen) if it has none"""
+        keys, times = self._keys, self._times
+        base = (key % self.sets) * WAYS
+        for slot in range(base, base + WAYS):
+            if keys[slot] == key:
+                self._remember(slot)
+                return slot
+        victim, oldest = base, math.inf
+        for slot in range(base, base + WAYS):
+            if keys[slot] == 0:
+                victim = slot
+                break
+            if times[2 * slot + 1] < oldest:
+                victim, oldest = slot, times[2 * slot + 1]
+        else:
+            self.evicted += 1
+        self._remember(victim)
+        keys[victim] = key
+        offset = victim * STRIDE
+        self._state[offset:offset + STRIDE] = self._blank
+        return victim
+
+    def _observe(self, key: int, at: float, hour: int) -> float:
+        slot = self._slot(key)
+        state, times = self._state, self._times
+        offset, t = slot * STRIDE, 2 * slot
+        events = state[offset + N]
+        if events == 0:
+            times[t] = times[t + 1] = at
+        # Late events don't move the clock back (nor decay anything)
+        elapsed = at - times[t + 1]
+        if elapsed > 0:
+            times[t + 1] = at
+        else:
+            elapsed = 0.0
+        short = state[offset + SHORT] * math.exp(-elapsed / self.short_window)
+        long = state[offset + LONG] * math.exp(-elapsed / self.long_window)
+
+        deviation = 0.0
+        if events >= self.min_events:
+            # Decayed counts of a steady rate r come to r * window * (1 - exp(-age / window))
+            age = max(at - times[t], 1.0)
+            rate = long / (self.long_window * -math.expm1(-age / self.long_window))
+            expected = rate * self.short_window * -math.expm1(-age / self.short_window)
+            z = (short + 1 - expected) / math.sqrt(expected + 1)
+            deviation = z / self.rate_z
+            if age >= _DAY:
+                share = state[offset + PROFILE + hour] / state[offset + TOTAL]
+                deviation = max(deviation, self.hour_min_share / max(share, 1e-6))
+
+        state[offset + N] = events + 1
+        state[offset + SHORT] = short + 1
+        state[offset + LONG] = long + 1
+        bump = state[offset + BUMP] * math.exp(elapsed / self.profile_window) if events else 1.0
+        state[offset + PROFILE + hour] += bump
+        state[offset + TOTAL] += bump
+        if bump > _RESCALE_AT:
+            for i in range(offset + TOTAL, offset + STRIDE):
+                state[i] /= bump
+            bump = 1.0
+        state[offset + BUMP] = bump
+        return deviation
+
+    # --- Snapshots ------------------------------------------------------------------
+
+    def snapshot(self, path: str = None) -> int:
+        """Write the tracked entities to disk. Returns how many were written."""
+        path = path or self.snapshot_path
+        if not path:
+            return 0
+        with self._lock:
+            if not self._allocated:
+                return 0
+            slots = np.flatnonzero(self.keys)
+            keys = self.keys[slots]
+            times = self.times.reshape(-1, 2)[slots]
+            state = self.state.reshape(-1, STRIDE)[slots]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, sets=self.sets, slots=slots, keys=keys, times=times, state=state)
+        os.replace(tmp_path, path)
+        return len(slots)
+
+    def load(self, path: str = None) -> int:
+        """Restore a snapshot (replacing current state). Returns the entities loaded."""
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            sets, slots, keys, times, state = (
+                int(data["sets"]), data["slots"], data["keys"], data["times"], data["state"]
+            )
+        if state.shape[1:] != (STRIDE,):
+            logger.warning(f"Ignoring baseline snapshot {path} - different layout")
+            return 0
+        with self._lock:
+            self._allocate()
+            if sets == self.sets:
+                self.keys[slots] = keys
+                self.times.reshape(-1, 2)[slots] = times
+                self.state.reshape(-1, STRIDE)[slots] = state
+            else:
+                # Resized - rehash entities into their new sets, most recent last so they survive
+                for i in np.argsort(times[:, 1], kind="stable"):
+                    slot = self._slot(int(keys[i]))
+                    self.times.reshape(-1, 2)[slot] = times[i]
+                    self.state.reshape(-1, STRIDE)[slot] = state[i]
+                self.evicted = 0
+        return len(keys)
+
+    # --- Background snapshots ---------------------------------------------------------
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        try:
+            await asyncio.to_thread(self.snapshot)
+        except Exception as e:
+            logger.error(f"Final baseline snapshot failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                logger.error(f"Baseline snapshot failed: {e}")
+
+
+baseline_store = BaselineStore()
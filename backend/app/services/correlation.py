@@ -0,0 +1,338 @@
+"""Stateful correlation of security events into brute-force and attack-chain alerts."""
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Alert, EventType, SeverityLevel
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_FINDINGS: Tuple = ()
+
+Key = Tuple[Optional[str], Optional[str]]  # (source_ip, username)
+
+
+class ThresholdRule(NamedTuple):
+    """Fires when `count` matching events arrive within `window` seconds"""
+    name: str
+    title: str
+    event_types: FrozenSet[EventType]
+    count: int
+    window: float
+    severity: SeverityLevel
+
+
+class SequenceRule(NamedTuple):
+    """Fires when the steps happen in order within `window` seconds of the first.
+
+    Each step is (event types, minimum matching events) - a step only counts as
+    done once it has its minimum, and the next step's events are ignored before that.
+    """
+    name: str
+    title: str
+    steps: Tuple[Tuple[FrozenSet[EventType], int], ...]
+    window: float
+    severity: SeverityLevel
+
+
+class Finding(NamedTuple):
+    rule: NamedTuple
+    source_ip: Optional[str]
+    username: Optional[str]
+    at: float  # seconds since the epoch (UTC)
+
+
+def default_rules() -> List[NamedTuple]:
+    """Brute force and failed-logins -> login -> exfiltration, from settings.
+
+    LOGIN_ATTEMPT is the only login event we have, so in the chain it stands
+    for the successful login after the failures.
+    """
+    return [
+        ThresholdRule(
+            "brute_force",
+            "Brute force: repeated failed logins",
+            frozenset({EventType.FAILED_LOGIN}),
+            settings.BRUTE_FORCE_THRESHOLD,
+            settings.BRUTE_FORCE_WINDOW_SECONDS,
+            SeverityLevel.HIGH
+        ),
+        SequenceRule(
+            "account_takeover_exfiltration",
+            "Account takeover: failed logins, login, then data exfiltration",
+            (
+                (frozenset({EventType.FAILED_LOGIN}), settings.ATTACK_CHAIN_MIN_FAILURES),
+                (frozenset({EventType.LOGIN_ATTEMPT}), 1),
+                (frozenset({EventType.DATA_EXFILTRATION}), 1),
+            ),
+            settings.ATTACK_CHAIN_WINDOW_SECONDS,
+            SeverityLevel.CRITICAL
+        ),
+    ]
+
+
+class CorrelationJournal:
+    """What a batch changed in a CorrelationEngine - the keys it touched (or
+    dropped) as they were before it, and the counters - so a failed write can
+    be undone"""
+
+    def __init__(self):
+        self.keys: Dict[Key, Optional[array]] = {}
+        self.counters = None
+
+
+class CorrelationEngine:
+    """Sliding-window rules over the event stream, O(1) work per event.
+
+    Each (source_ip, username) gets one flat array of doubles, fixed in size
+    by the rule set: last-seen time, then per threshold rule (events counted,
+    quiet-until, ring of the last `count` event times), then per sequence rule
+    (step, hits in step, start time). The ring makes the window check one
+    comparison against its oldest slot.
+
+    States live in an LRU of at most max_keys entries. Keys idle for longer
+    than idle_seconds (or than the longest rule window) are dropped from the
+    cold end as new events arrive, and the least recently seen key is evicted
+    when the table is full, so memory is bounded whatever the number of
+    distinct senders. Events that can't start any rule never create state.
+
+    A threshold rule that fires stays quiet for that key for one window, so a
+    sustained attack produces an alert per window rather than per event. State
+    is per process - with several API workers each sees its own share of events.
+
+    Callers correlating events before they are stored pass a CorrelationJournal
+    to process_rows and restore() it if the write fails, so the windows,
+    cooldowns and counters don't keep events that were never stored.
+    """
+
+    def __init__(self, rules: Iterable[NamedTuple] = None, max_keys: int = None, idle_seconds: float = None):
+        rules = list(default_rules() if rules is None else rules)
+        self.threshold_rules = [rule for rule in rules if isinstance(rule, ThresholdRule)]
+        self.sequence_rules = [rule for rule in rules if isinstance(rule, SequenceRule)]
+        self.max_keys = max_keys or settings.CORRELATION_MAX_KEYS
+        longest = max([rule.window for rule in rules], default=0)
+        self.idle_seconds = max(idle_seconds or settings.CORRELATION_IDLE_SECONDS, longest)
+
+        # Offsets into the per-key array, and event type -> (offset, rule) it can advance
+        size = 1
+        self._thresholds_by_type: Dict[EventType, List[Tuple[int, ThresholdRule]]] = {}
+        for rule in self.threshold_rules:
+            for event_type in rule.event_types:
+                self._thresholds_by_type.setdefault(event_type, []).append((size, rule))
+            size += 2 + rule.count
+        self._sequences_by_type: Dict[EventType, List[Tuple[int, SequenceRule]]] = {}
+        for rule in self.sequence_rules:
+            for event_type in frozenset().union(*(types for types, _ in rule.steps)):
+                self._sequences_by_type.setdefault(event_type, []).append((size, rule))
+            size += 3
+        self._blank = array("d", bytes(8 * size))
+        # Event types that can open a new key's state
+        self._starters = set(self._thresholds_by_type).union(
+            *(rule.steps[0][0] for rule in self.sequence_rules)
+        )
+
+        self.states: "OrderedDict[Key, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._journal: Optional[CorrelationJournal] = None
+        self.events = 0
+        self.fired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def clear(self):
+        with self._lock:
+            self.states.clear()
+
+    def stats(self) -> dict:
+        return {
+            "tracked_keys": len(self.states),
+            "max_keys": self.max_keys,
+            "bytes_per_key": self._blank.itemsize * len(self._blank),
+            "events": self.events,
+            "fired": self.fired,
+            "evicted": self.evicted
+        }
+
+    def process(self, source_ip: Optional[str], username: Optional[str], event_type: EventType, at: float):
+        """Feed one event; returns the rules it fired (usually none).
+
+        Not locked - use process_rows() when several threads share the engine.
+        """
+        self.events += 1
+        states = self.states
+        key = (source_ip, username)
+        state = states.get(key)
+        if state is None:
+            if event_type not in self._starters:
+                return _NO_FINDINGS
+            self._expire(at)
+            if self._journal is not None:
+                self._remember(key)
+            state = states[key] = self._blank[:]
+        else:
+            if self._journal is not None:
+                self._remember(key)
+            states.move_to_end(key)
+            if at - state[0] > self.idle_seconds:
+                state = states[key] = self._blank[:]
+        state[0] = at
+
+        fired = None
+        thresholds = self._thresholds_by_type.get(event_type)
+        if thresholds is not None:
+            for offset, rule in thresholds:
+                if self._advance_threshold(state, offset, rule, at):
+                    fired = fired or []
+                    fired.append(rule)
+        sequences = self._sequences_by_type.get(event_type)
+        if sequences is not None:
+            for offset, rule in sequences:
+                if self._advance_sequence(state, offset, rule, event_type, at):
+                    fired = fired or []
+                    fired.append(rule)
+        if fired is None:
+            return _NO_FINDINGS
+        self.fired += len(fired)
+        return fired
+
+    @staticmethod
+    def _advance_threshold(state: array, offset: int, rule: ThresholdRule, at: float) -> bool:
+        # state[offset] = events counted, [offset + 1] = quiet until, then the ring
+        filled = int(state[offset]) + 1
+        slot = (filled - 1) % rule.count
+        ring = offset + 2
+        state[ring + slot] = at
+        state[offset] = filled
+        if filled < rule.count or at < state[offset + 1]:
+            return False
+        # Oldest of the last `count` events is the next slot round
+        if at - state[ring + (slot + 1) % rule.count] > rule.window:
+            return False
+        state[offset] = 0
+        state[offset + 1] = at + rule.window
+        return True
+
+    @staticmethod
+    def _advance_sequence(state: array, offset: int, rule: SequenceRule, event_type: EventType, at: float) -> bool:
+        step, hits, started = int(state[offset]), int(state[offset + 1]), state[offset + 2]
+        if hits and at - started > rule.window:
+            step, hits = 0, 0
+
+        types, needed = rule.steps[step]
+        if event_type in types:
+            if hits == 0 and step == 0:
+                started = at
+            hits += 1
+        elif hits >= needed and step + 1 < len(rule.steps) and event_type in rule.steps[step + 1][0]:
+            step, hits = step + 1, 1
+        else:
+            return False
+
+        if step == len(rule.steps) - 1 and hits >= rule.steps[step][1]:
+            state[offset], state[offset + 1], state[offset + 2] = 0, 0, 0
+            return True
+        state[offset], state[offset + 1], state[offset + 2] = step, hits, started
+        return False
+
+    def _expire(self, at: float):
+        """Make room for a new key - drop idle keys, then the LRU one if still full"""
+        states = self.states
+        while states:
+            oldest_key = next(iter(states))
+            if at - states[oldest_key][0] <= self.idle_seconds:
+                break
+            if self._journal is not None:
+                self._remember(oldest_key)
+            del states[oldest_key]
+        if len(states) >= self.max_keys:
+            if self._journal is not None:
+                self._remember(next(iter(states)))
+            states.popitem(last=False)
+            self.evicted += 1
+
+    def _remember(self, key: Key):
+        """Keep key's current state (None if it has none) in the active journal (first touch only)"""
+        keys = self._journal.keys
+        if key not in keys:
+            state = self.states.get(key)
+            keys[key] = state[:] if state is not None else None
+
+    def process_rows(self, rows: List[dict], journal: CorrelationJournal = None) -> List[Tuple[dict, Finding]]:
+        """Feed inserted log rows (dicts with id and timestamp) in order.
+
+        Returns (row, finding) for every rule fired, the row being the event
+        that completed it.
+        """
+        results = []
+        process = self.process
+        with self._lock:
+            if journal is not None and journal.counters is None:
+                journal.counters = (self.events, self.fired, self.evicted)
+            self._journal = journal
+            try:
+                for row in rows:
+                    at = (row["timestamp"] - _EPOCH).total_seconds()
+                    source_ip, username = row.get("source_ip"), row.get("username")
+                    for rule in process(source_ip, username, EventType(row["event_type"]), at):
+                        results.append((row, Finding(rule, source_ip, username, at)))
+            finally:
+                self._journal = None
+        return results
+
+    def restore(self, journal: CorrelationJournal):
+        """Undo the events recorded in journal. Events other callers added to
+        the same keys in the meantime are undone with them."""
+        with self._lock:
+            if journal.counters is None:
+                return
+            for key, state in journal.keys.items():
+                if state is None:
+                    self.states.pop(key, None)
+                else:
+                    self.states[key] = state
+            self.events, self.fired, self.evicted = journal.counters
+            journal.keys.clear()
+            journal.counters = None
+
+
+def describe(finding: Finding) -> str:
+    rule = finding.rule
+    who = f"source IP {finding.source_ip or 'unknown'}, user {finding.username or 'unknown'}"
+    if isinstance(rule, ThresholdRule):
+        types = ", ".join(sorted(t.value for t in rule.event_types))
+        return f"{rule.count} {types} events within {rule.window:g}s from {who}"
+    steps = " -> ".join(
+        f"{'/'.join(sorted(t.value for t in types))}" + (f" x{needed}" if needed > 1 else "")
+        for types, needed in rule.steps
+    )
+    return f"{steps} within {rule.window:g}s from {who}"
+
+
+def create_alerts(db: Session, findings: List[Tuple[dict, Finding]]) -> int:
+    """Add an Alert per finding, linked to the triggering log. Caller commits."""
+    if not findings:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(Alert), [
+        {
+            "log_id": row["id"],
+            "title": finding.rule.title,
+            "description": describe(finding),
+            "severity": finding.rule.severity,
+            "status": "open",
+            "created_at": now,
+            "updated_at": now
+        }
+        for row, finding in findings
+    ])
+    return len(findings)
+
+
+correlation_engine = CorrelationEngine()
@@ -0,0 +1,146 @@
+"""Cheaper alternatives to COUNT(*) for paginated log listings."""
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Dict, Any, List
+import json
+import threading
+import time
+
+from app.core.config import settings
+
+
+def _value(value):
+    """Enum members -> their value so they compare with query-string filters"""
+    return getattr(value, 'value', value)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class LogCountCache:
+    """Short-lived store of filtered log counts.
+    
+    Entries are keyed by the listing filters. Inserts made through this process
+    bump the matching entries instead of clearing them, because collectors insert
+    constantly. The TTL bounds drift from writes made by other workers.
+    """
+    
+    MAX_ENTRIES = 1024
+    
+    def __init__(self, ttl: int = None):
+        self.ttl = ttl or settings.LOG_COUNT_CACHE_TTL_SECONDS
+        self._entries: Dict[tuple, list] = {}  # key -> [count, expires_at, filters]
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(filters: Dict[str, Any]) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in filters.items() if v is not None))
+    
+    def get(self, filters: Dict[str, Any]) -> Optional[int]:
+        key = self.make_key(filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[0]
+    
+    def set(self, filters: Dict[str, Any], count: int):
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                # dicts keep insertion order - drop the oldest entry
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[self.make_key(filters)] = [count, time.monotonic() + self.ttl, dict(filters)]
+    
+    def record_inserts(self, rows: List[Dict[str, Any]]):
+        """Add newly inserted rows to every cached count they match."""
+        with self._lock:
+            self._drop_searches()
+            for entry in self._entries.values():
+                entry[0] += sum(1 for row in rows if self._matches(entry[2], row))
+    
+    def record_delete(self, row: Dict[str, Any]):
+        with self._lock:
+            self._drop_searches()
+            for entry in self._entries.values():
+                if self._matches(entry[2], row):
+                    entry[0] -= 1
+    
+    def _drop_searches(self):
+        # Whether a row matches a full-text query is only known to the database
+        for key in [key for key, entry in self._entries.items() if entry[2].get('q')]:
+            del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    @staticmethod
+    def _matches(filters: Dict[str, Any], row: Dict[str, Any]) -> bool:
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            if name == 'start_date':
+                if row['timestamp'] < _naive_utc(wanted):
+                    return False
+            elif name == 'end_date':
+                if row['timestamp'] > _naive_utc(wanted):
+                    return False
+            elif _value(row.get(name)) != _value(wanted):
+                return False
+        return True
+
+
+def estimate_count(db: Session, query) -> Optional[int]:
+    """Row estimate from the PostgreSQL planner (None on other databases)."""
+    bind = db.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    try:
+        sql = query.statement.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        # A failed statement aborts the transaction on PostgreSQL
+        db.rollback()
+        print(f"Count estimate failed: {e}")
+        return None
+
+
+def count_logs(db: Session, query, filters: Dict[str, Any], mode: str) -> Tuple[Optional[int], bool]:
+    """Total for a filtered listing according to mode.
+    
+    exact    - COUNT(*) every time (default, what the API always did)
+    estimate - planner estimate on PostgreSQL, otherwise a cached count
+    none     - skip the count entirely
+    
+    Returns (total, is_exact).
+    """
+    if mode == 'none':
+        return None, False
+    
+    if mode == 'estimate':
+        estimate = estimate_count(db, query)
+        if estimate is not None:
+            return estimate, False
+        
+        cached = log_count_cache.get(filters)
+        if cached is not None:
+            return cached, False
+        
+        total = query.count()
+        log_count_cache.set(filters, total)
+        return total, True
+    
+    return query.count(), True
+
+
+log_count_cache = LogCountCache()
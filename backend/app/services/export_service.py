@@ -0,0 +1,173 @@
+"""Streaming exports of security logs."""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Iterator, List, Optional
+import csv
+import io
+import zlib
+
+from app.db.models import SecurityLog
+from app.services.archive_service import segment_store
+
+EXPORT_CHUNK_ROWS = 1000
+# Columnar formats write one row group / record batch per chunk - bigger is better
+COLUMNAR_CHUNK_ROWS = 20000
+
+EXPORT_COLUMNS = [
+    SecurityLog.id, SecurityLog.timestamp, SecurityLog.event_type, SecurityLog.severity,
+    SecurityLog.source_ip, SecurityLog.destination_ip, SecurityLog.username,
+    SecurityLog.description, SecurityLog.threat_score, SecurityLog.is_threat,
+    SecurityLog.is_anomaly,
+]
+
+CSV_HEADER = [
+    'ID', 'Timestamp', 'Event Type', 'Severity', 'Source IP',
+    'Destination IP', 'Username', 'Description', 'Threat Score',
+    'Is Threat', 'Is Anomaly'
+]
+
+
+def iter_log_chunks(
+    db: Session,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_ROWS
+) -> Iterator[List[tuple]]:
+    """Yield matching logs (newest first) as lists of plain row tuples.
+    
+    yield_per turns on server-side cursors where the driver has them, so at most
+    one chunk of rows is in memory, and no ORM objects are built. Logs moved to
+    the cold archive come after the ones still in the database.
+    """
+    stmt = select(*EXPORT_COLUMNS)
+    if start_date:
+        stmt = stmt.where(SecurityLog.timestamp >= start_date)
+    if end_date:
+        stmt = stmt.where(SecurityLog.timestamp <= end_date)
+    stmt = stmt.order_by(SecurityLog.timestamp.desc(), SecurityLog.id.desc())
+    
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+    
+    # Archived logs follow, read straight from their segment files
+    if segment_store.reaches(start_date):
+        columns = [column.key for column in EXPORT_COLUMNS]
+        yield from segment_store.iter_chunks(columns, start_date, end_date, chunk_size=chunk_size)
+
+
+def csv_stream(chunks: Iterator[List[tuple]], compress: bool = False) -> Iterator[bytes]:
+    """Encode row chunks as CSV, one output chunk per input chunk (optionally gzipped)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # wbits=31 -> gzip container, so the output is a regular .csv.gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    
+    def drain() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+    
+    writer.writerow(CSV_HEADER)
+    yield drain()
+    
+    for rows in chunks:
+        for (log_id, timestamp, event_type, severity, *rest) in rows:
+            writer.writerow([log_id, timestamp, event_type.value, severity.value, *rest])
+        data = drain()
+        if data:
+            yield data
+    
+    if compressor:
+        yield compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema():
+    """Arrow schema for exported logs - low-cardinality strings are dictionary encoded."""
+    import pyarrow as pa
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('us')),
+        ('event_type', dictionary),
+        ('severity', dictionary),
+        ('source_ip', dictionary),
+        ('destination_ip', pa.string()),
+        ('username', pa.string()),
+        ('description', pa.string()),
+        ('threat_score', pa.float64()),
+        ('is_threat', pa.bool_()),
+        ('is_anomaly', pa.bool_()),
+    ])
+
+
+def rows_to_record_batch(rows: List[tuple], schema):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name in ('event_type', 'severity'):
+            values = [v.value if v is not None else None for v in values]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+
+def columnar_stream(chunks: Iterator[List[tuple]], fmt: str) -> Iterator[bytes]:
+    """Encode row chunks as Parquet (fmt='parquet') or an Arrow IPC stream (fmt='arrow').
+    
+    Each chunk becomes one Parquet row group / Arrow record batch and is sent
+    as soon as it is written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    
+    for rows in chunks:
+        if rows:
+            writer.write_batch(rows_to_record_batch(rows, schema))
+        data = sink.drain()
+        if data:
+            yield data
+    
+    writer.close()
+    yield sink.drain()
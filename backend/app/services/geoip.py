@@ -0,0 +1,207 @@
+"""GeoIP enrichment from a local, memory-mapped IP-range database."""
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import SecurityLog
+
+logger = logging.getLogger(__name__)
+
+Location = Tuple[Optional[str], Optional[str]]  # (country, city)
+
+# File layout (all integers little-endian):
+#   header   magic, version, record count, offset of the location table
+#   records  sorted, non-overlapping (start, end, location index); start/end are
+#            16-byte big-endian addresses with IPv4 mapped into ::ffff:0:0/96, so
+#            comparing the raw bytes compares the addresses
+#   locations  count, then per entry a u16 length + "country\tcity" in UTF-8
+MAGIC = b"GEOIPRNG"
+VERSION = 1
+HEADER = struct.Struct("<8sHxxIQ")
+RECORD = struct.Struct("<16s16sI")
+_LENGTH = struct.Struct("<H")
+_COUNT = struct.Struct("<I")
+
+
+def address_key(ip) -> bytes:
+    """16-byte sort key of an address (IPv4 as IPv4-mapped IPv6)"""
+    address = ipaddress.ip_address(ip) if isinstance(ip, str) else ip
+    if address.version == 4:
+        address = ipaddress.IPv6Address(b"\0" * 10 + b"\xff\xff" + address.packed)
+    return address.packed
+
+
+def build_database(ranges: Iterable[Tuple[str, str, Optional[str], Optional[str]]], path: str) -> int:
+    """Write (start_ip, end_ip, country, city) ranges as a database file.
+
+    Ranges may come in any order but must not overlap. Returns the record count.
+    """
+    locations, location_ids, records = [], {}, []
+    for start, end, country, city in ranges:
+        location = f"{country or ''}\t{city or ''}"
+        if location not in location_ids:
+            location_ids[location] = len(locations)
+            locations.append(location)
+        records.append((address_key(start.strip()), address_key(end.strip()), location_ids[location]))
+    records.sort()
+    for previous, current in zip(records, records[1:]):
+        if current[0] <= previous[1]:
+            raise ValueError("GeoIP ranges overlap")
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        locations_offset = HEADER.size + RECORD.size * len(records)
+        f.write(HEADER.pack(MAGIC, VERSION, len(records), locations_offset))
+        for record in records:
+            f.write(RECORD.pack(*record))
+        f.write(_COUNT.pack(len(locations)))
+        for location in locations:
+            encoded = location.encode()
+            f.write(_LENGTH.pack(len(encoded)) + encoded)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class GeoIPResolver:
+    """Resolves IPs to (country, city) with a binary search over the mmapped file.
+
+    Only the small location table is read into memory; range records are
+    searched in place in the mapping, so the OS pages in just what lookups
+    touch. Results are kept in an LRU cache. Without a database file every
+    lookup returns (None, None) and enrichment is effectively off.
+    """
+
+    def __init__(self, path: str = None, cache_size: int = None):
+        self.path = path or settings.GEOIP_DB_PATH
+        self.cache_size = cache_size or settings.GEOIP_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._opened = False
+        self._mmap: Optional[mmap.mmap] = None
+        self._count = 0
+        self._locations: List[Location] = []
+        self._cached = lru_cache(maxsize=self.cache_size)(self._lookup)
+
+    @property
+    def available(self) -> bool:
+        self._open()
+        return self._mmap is not None
+
+    def _open(self):
+        if self._opened:
+            return
+        with self._lock:
+            if self._opened:
+                return
+            if os.path.exists(self.path):
+                try:
+                    self._load()
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not open GeoIP database {self.path}: {e}")
+            self._opened = True
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, locations_offset = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            mapped.close()
+            raise ValueError("not a GeoIP range database")
+        locations = []
+        (total,) = _COUNT.unpack_from(mapped, locations_offset)
+        offset = locations_offset + _COUNT.size
+        for _ in range(total):
+            (length,) = _LENGTH.unpack_from(mapped, offset)
+            offset += _LENGTH.size
+            country, city = mapped[offset:offset + length].decode().split("\t")
+            locations.append((country or None, city or None))
+            offset += length
+        self._mmap, self._count, self._locations = mapped, count, locations
+
+    def reload(self):
+        """Pick up a replaced database file."""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap, self._count, self._locations = None, 0, []
+            self._opened = False
+            self._cached.cache_clear()
+
+    def _lookup(self, ip: str) -> Location:
+        try:
+            key = address_key(ip.strip())
+        except ValueError:
+            return None, None
+        mapped = self._mmap
+        # Last record whose start <= key
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            if mapped[offset:offset + 16] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None, None
+        _, end, location = RECORD.unpack_from(mapped, HEADER.size + (lo - 1) * RECORD.size)
+        if key > end:
+            return None, None
+        return self._locations[location]
+
+    def lookup(self, ip: Optional[str]) -> Location:
+        if not ip or not self.available:
+            return None, None
+        return self._cached(ip)
+
+    def lookup_many(self, ips: Iterable[Optional[str]]) -> List[Location]:
+        if not self.available:
+            return [(None, None) for _ in ips]
+        cached = self._cached
+        return [cached(ip) if ip else (None, None) for ip in ips]
+
+    def enrich(self, rows: List[dict]):
+        """Fill country/city of row dicts from their source_ip (in place)"""
+        if not self.available:
+            return
+        for row, (country, city) in zip(rows, self.lookup_many(row.get("source_ip") for row in rows)):
+            if country and not row.get("country"):
+                row["country"], row["city"] = country, city
+
+
+def backfill_geo(db: Session, resolver: GeoIPResolver, chunk_size: int = 5000) -> int:
+    """Resolve country/city for stored logs that don't have one. Returns rows updated."""
+    if not resolver.available:
+        return 0
+    updated, last_id = 0, 0
+    while True:
+        rows = db.execute(
+            select(SecurityLog.id, SecurityLog.source_ip)
+            .where(SecurityLog.id > last_id, SecurityLog.country.is_(None), SecurityLog.source_ip.isnot(None))
+            .order_by(SecurityLog.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        changes = [
+            {"id": log_id, "country": country, "city": city}
+            for (log_id, _), (country, city) in zip(rows, resolver.lookup_many(ip for _, ip in rows))
+            if country
+        ]
+        if changes:
+            db.execute(update(SecurityLog), changes)
+        db.commit()
+        updated += len(changes)
+        last_id = rows[-1][0]
+    return updated
+
+
+geo_resolver = GeoIPResolver()
@@ -0,0 +1,136 @@
+"""Write-behind ingest queue - handlers enqueue, a background task scores and inserts."""
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.websocket_manager import manager
+from app.db.database import SessionLocal
+from app.schemas.schemas import SecurityLogCreate
+from app.services.ingest_service import IngestService
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Bounded in-process queue drained by a single writer task.
+    
+    Scoring (sklearn) and the SQLAlchemy session are both blocking, so each batch
+    runs in a worker thread with its own session and the event loop stays free
+    for API and WebSocket traffic. When the queue is full, put() refuses new
+    events, so callers can answer 503 instead of queueing without limit.
+    """
+    
+    def __init__(
+        self,
+        service: IngestService,
+        session_factory=SessionLocal,
+        maxsize: int = None,
+        flush_interval: float = None
+    ):
+        self.service = service
+        self.session_factory = session_factory
+        self.maxsize = maxsize or settings.INGEST_QUEUE_MAX_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.INGEST_FLUSH_INTERVAL_SECONDS
+        
+        # Created in start() so the queue belongs to the running event loop
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        
+        self.enqueued = 0
+        self.written = 0
+        self.rejected = 0  # refused because the queue was full
+        self.dropped = 0   # accepted but lost because the batch failed to write
+        self.batches = 0
+    
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+    
+    def start(self):
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"Ingest queue started (capacity {self.maxsize})")
+    
+    async def stop(self, timeout: float = 10.0):
+        """Flush whatever is queued (up to timeout) and stop the writer."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingest queue stopped with {self.queue.qsize()} events unwritten")
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+    
+    def put(self, logs: List[SecurityLogCreate]) -> bool:
+        """Enqueue all of logs, or none of them if there isn't room."""
+        if not self.running or self.maxsize - self.queue.qsize() < len(logs):
+            self.rejected += len(logs)
+            return False
+        for log in logs:
+            self.queue.put_nowait(log)
+        self.enqueued += len(logs)
+        return True
+    
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "depth": self.queue.qsize() if self.queue else 0,
+            "capacity": self.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            
+            # Collect a batch - whatever is already queued, plus stragglers until the deadline
+            while len(batch) < self.service.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                rows = await asyncio.to_thread(self._write_batch, batch)
+                if rows:
+                    await manager.broadcast_json(IngestService.broadcast_payload(rows))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    def _write_batch(self, batch: List[SecurityLogCreate]):
+        db = self.session_factory()
+        try:
+            rows = self.service.ingest(db, batch)
+            self.written += len(rows)
+            self.batches += 1
+            return rows
+        except Exception as e:
+            db.rollback()
+            self.dropped += len(batch)
+            logger.error(f"Ingest queue failed to write {len(batch)} events: {e}")
+            return []
+        finally:
+            db.close()
@@ -0,0 +1,281 @@
+"""Batched ingestion of security logs (scoring + multi-row insert)."""
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from datetime import datetime
+from typing import List, Dict, Any, AsyncIterator, Optional
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.db.models import SecurityLog
+from app.schemas.schemas import SecurityLogCreate
+from app.services.threat_detector import ThreatDetector
+from app.services.count_service import log_count_cache
+from app.services.rollup_service import RollupService
+from app.services.geoip import GeoIPResolver, geo_resolver
+from app.services.correlation import CorrelationEngine, CorrelationJournal, correlation_engine, create_alerts
+from app.services.sketch_service import sketch_store
+from app.services.baselines import BaselineJournal, BaselineStore, baseline_store
+
+logger = logging.getLogger(__name__)
+
+
+def format_validation_errors(error: ValidationError) -> List[dict]:
+    """Compact, JSON-safe version of pydantic's error list."""
+    return [{"loc": list(err["loc"]), "msg": err["msg"]} for err in error.errors()]
+
+
+class IngestService:
+    """Scores and stores security logs in batches."""
+    
+    def __init__(
+        self,
+        detector: ThreatDetector,
+        batch_size: int = None,
+        geo: GeoIPResolver = None,
+        correlator: CorrelationEngine = None,
+        baselines: BaselineStore = None
+    ):
+        self.detector = detector
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.geo = geo or geo_resolver
+        if correlator is None and settings.CORRELATION_ENABLED:
+            correlator = correlation_engine
+        self.correlator = correlator
+        self.baselines = baselines or baseline_store
+    
+    def ingest(self, db: Session, logs: List[SecurityLogCreate]) -> List[Dict[str, Any]]:
+        """Score and insert logs, committing once per batch.
+        
+        Returns the inserted rows (with ids) in the same order as the input.
+        """
+        inserted = []
+        for start in range(0, len(logs), self.batch_size):
+            inserted.extend(self._ingest_batch(db, logs[start:start + self.batch_size]))
+        return inserted
+    
+    def _ingest_batch(self, db: Session, logs: List[SecurityLogCreate]) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        rows = []
+        for log in logs:
+            row = log.model_dump()
+            row['timestamp'] = now
+            rows.append(row)
+        
+        # Detector works on model instances - these are never added to the session
+        scores = self.detector.predict_threat_batch([SecurityLog(**row) for row in rows])
+        for row, (is_threat, confidence, threat_score) in zip(rows, scores):
+            row['is_threat'] = bool(is_threat)
+            row['confidence_score'] = float(confidence)
+            row['threat_score'] = float(threat_score)
+        # Baselines learn the batch now (later rows are scored against earlier
+        # ones) - undone below if it never gets stored
+        journal = BaselineJournal()
+        self.baselines.mark_rows(rows, journal)
+        correlation_journal = CorrelationJournal()
+        try:
+            self.geo.enrich(rows)
+            
+            # Single multi-row INSERT ... RETURNING for the whole batch
+            ids = db.scalars(
+                insert(SecurityLog).returning(SecurityLog.id, sort_by_parameter_order=True),
+                rows
+            ).all()
+            for row, log_id in zip(rows, ids):
+                row['id'] = log_id
+            # Correlate before commit so alerts land in the same transaction as their
+            # logs - the engine's windows are rolled back with it below
+            alerts = 0
+            if self.correlator is not None:
+                alerts = create_alerts(db, self.correlator.process_rows(rows, correlation_journal))
+            RollupService.apply(db, rows)
+            db.commit()
+        except Exception:
+            self.baselines.restore(journal)
+            if self.correlator is not None:
+                self.correlator.restore(correlation_journal)
+            raise
+        
+        log_count_cache.record_inserts(rows)
+        sketch_store.record(rows)
+        response_cache.bump("logs")
+        if alerts:
+            response_cache.bump("alerts")
+        return rows
+
+    @staticmethod
+    def broadcast_payload(rows: List[Dict[str, Any]]) -> dict:
+        """One coalesced WebSocket message for a whole ingest call."""
+        return {
+            "type": "new_logs",
+            "data": {
+                "count": len(rows),
+                "threats": sum(1 for row in rows if row['is_threat']),
+                "ids": [row['id'] for row in rows],
+                "timestamp": rows[-1]['timestamp'].isoformat() if rows else None
+            }
+        }
+
+
+class StreamIngestor:
+    """Incremental NDJSON reader that flushes micro-batches through IngestService.
+    
+    Only the current partial line and one pending batch are held in memory, so
+    memory use doesn't depend on the size of the stream. A batch is flushed when
+    it reaches batch_size or when flush_interval seconds have passed since its
+    first event - by run(), even while the connection is idle. A batch that
+    fails to store is rolled back and its lines reported as rejected; the
+    stream carries on.
+    """
+    
+    MAX_REPORTED_ERRORS = 100
+    
+    def __init__(
+        self,
+        service: IngestService,
+        db: Session,
+        flush_interval: float = None,
+        max_line_bytes: int = None
+    ):
+        self.service = service
+        self.db = db
+        self.flush_interval = flush_interval if flush_interval is not None else settings.INGEST_FLUSH_INTERVAL_SECONDS
+        self.max_line_bytes = max_line_bytes or settings.INGEST_MAX_LINE_BYTES
+        
+        self.pending: List[SecurityLogCreate] = []
+        self.pending_lines: List[int] = []
+        self.pending_since = None
+        self.partial = b""
+        self.skipping = False  # inside an over-long line we already rejected
+        
+        self.lines = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors: List[dict] = []
+    
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """Consume a chunk of the body; returns rows inserted by any flushes it triggered."""
+        inserted = []
+        self.partial += chunk
+        *lines, self.partial = self.partial.split(b"\n")
+        
+        for line in lines:
+            if self.skipping:
+                # Tail end of an over-long line
+                self.skipping = False
+                continue
+            if len(line) > self.max_line_bytes:
+                self.lines += 1
+                self._reject(self.lines, [{"loc": [], "msg": f"Line exceeds {self.max_line_bytes} bytes"}])
+                continue
+            self._handle_line(line)
+            if len(self.pending) >= self.service.batch_size:
+                inserted.extend(self.flush())
+        
+        if len(self.partial) > self.max_line_bytes:
+            if not self.skipping:
+                self.lines += 1
+                self._reject(self.lines, [{"loc": [], "msg": f"Line exceeds {self.max_line_bytes} bytes"}])
+                self.skipping = True
+            self.partial = b""
+        
+        if self.pending and self.seconds_until_flush() == 0:
+            inserted.extend(self.flush())
+        return inserted
+    
+    async def run(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Feed a whole body, yielding the rows of each flush as it happens.
+        
+        Waits for the next chunk no longer than the pending batch has left, so
+        a quiet connection still gets its events written on time.
+        """
+        chunks = chunks.__aiter__()
+        next_chunk = None
+        try:
+            while True:
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(chunks.__anext__())
+                # asyncio.wait leaves the read running on timeout (wait_for would cancel it)
+                done, _ = await asyncio.wait({next_chunk}, timeout=self.seconds_until_flush())
+                if not done:
+                    rows = self.flush()
+                else:
+                    try:
+                        chunk = next_chunk.result()
+                    except StopAsyncIteration:
+                        break
+                    next_chunk = None
+                    rows = self.feed(chunk)
+                if rows:
+                    yield rows
+        finally:
+            if next_chunk is not None and not next_chunk.done():
+                next_chunk.cancel()
+        
+        rows = self.finish()
+        if rows:
+            yield rows
+    
+    def seconds_until_flush(self) -> Optional[float]:
+        """Time left before the pending batch is due, None when nothing is pending"""
+        if not self.pending:
+            return None
+        return max(0.0, self.pending_since + self.flush_interval - time.monotonic())
+    
+    def finish(self) -> List[Dict[str, Any]]:
+        """End of stream - handle a last unterminated line and flush what's left."""
+        if self.partial and not self.skipping:
+            self._handle_line(self.partial)
+        self.partial = b""
+        return self.flush()
+    
+    def flush(self) -> List[Dict[str, Any]]:
+        if not self.pending:
+            return []
+        logs, line_numbers = self.pending, self.pending_lines
+        self.pending, self.pending_lines = [], []
+        self.pending_since = None
+        try:
+            rows = self.service.ingest(self.db, logs)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Stream ingest failed to store {len(logs)} events: {e}")
+            for line_number in line_numbers:
+                self._reject(line_number, [{"loc": [], "msg": "Not stored, the batch failed - retry this line"}])
+            return []
+        self.accepted += len(rows)
+        self.batches += 1
+        return rows
+    
+    def summary(self) -> dict:
+        return {
+            "lines": self.lines,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "errors": self.errors,
+            "errors_truncated": self.rejected > len(self.errors)
+        }
+    
+    def _handle_line(self, line: bytes):
+        self.lines += 1
+        if not line.strip():
+            return
+        try:
+            log = SecurityLogCreate.model_validate_json(line)
+        except ValidationError as e:
+            self._reject(self.lines, format_validation_errors(e))
+            return
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending.append(log)
+        self.pending_lines.append(self.lines)
+    
+    def _reject(self, line_number: int, errors: List[dict]):
+        self.rejected += 1
+        if len(self.errors) < self.MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "errors": errors})
@@ -0,0 +1,345 @@
+"""In-memory matching of security logs against threat indicators (IOCs)."""
+import asyncio
+import ipaddress
+import logging
+import re
+import socket
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ThreatIndicator, SeverityLevel
+
+logger = logging.getLogger(__name__)
+
+# Tokens in raw_log worth looking up
+_IPV4_TOKEN = re.compile(r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])")
+_IPV6_TOKEN = re.compile(r"(?<![\w:])[0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7}(?![\w:])")
+_HASH_TOKEN = re.compile(r"(?<![0-9A-Fa-f])(?:[0-9A-Fa-f]{64}|[0-9A-Fa-f]{40}|[0-9A-Fa-f]{32})(?![0-9A-Fa-f])")
+_EMAIL_TOKEN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_DOMAIN_TOKEN = re.compile(r"(?<![\w.-])(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z][A-Za-z0-9-]{1,62}(?![\w-])")
+
+
+class IOCMatch(NamedTuple):
+    indicator_id: Optional[int]
+    indicator_type: str
+    value: str
+    threat_level: SeverityLevel
+
+
+def _normalize(indicator_type: str, value: str) -> Tuple[str, str]:
+    indicator_type = (indicator_type or "").strip().lower()
+    value = value.strip()
+    if indicator_type in ("ip", "cidr"):
+        return "ip", str(ipaddress.ip_network(value, strict=False))
+    if indicator_type == "domain":
+        return "domain", value.lower().strip(".")
+    return indicator_type, value.lower()
+
+
+class _PrefixTable:
+    """Longest-prefix match over IP networks.
+
+    One hash table per prefix length in use, probed from the longest length
+    down - the same O(prefix length) walk as a radix tree, but with one dict
+    entry per network instead of a node per bit, which matters at millions of
+    entries. Single addresses are /32 (/128) networks.
+    """
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.tables: Dict[int, Dict[int, IOCMatch]] = {}
+        # (netmask, table) per prefix length, longest first
+        self.probes: List[Tuple[int, Dict[int, IOCMatch]]] = []
+
+    def add(self, network, match: IOCMatch):
+        table = self.tables.get(network.prefixlen)
+        if table is None:
+            table = self.tables[network.prefixlen] = {}
+            all_ones = (1 << self.bits) - 1
+            self.probes = [
+                (all_ones ^ ((1 << (self.bits - length)) - 1), self.tables[length])
+                for length in sorted(self.tables, reverse=True)
+            ]
+        table[int(network.network_address)] = match
+
+    def remove(self, network):
+        table = self.tables.get(network.prefixlen)
+        if table is not None:
+            table.pop(int(network.network_address), None)
+
+    def lookup(self, address: int) -> Optional[IOCMatch]:
+        for mask, table in self.probes:
+            match = table.get(address & mask)
+            if match is not None:
+                return match
+        return None
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+
+class _DomainTrie:
+    """Suffix trie over domain labels (com -> evil -> www).
+
+    An indicator for evil.com matches every subdomain of it. Nodes are dicts
+    keyed by label; a leaf with no subdomains below it is stored as the match
+    itself rather than a dict, which keeps memory per domain to one entry.
+    """
+
+    _MATCH = None  # key of a node's own match
+
+    def __init__(self):
+        self.root: dict = {}
+        self.size = 0
+
+    def add(self, domain: str, match: IOCMatch):
+        labels = domain.split(".")[::-1]
+        node = self.root
+        for label in labels[:-1]:
+            child = node.get(label)
+            if not isinstance(child, dict):
+                child = node[label] = {} if child is None else {self._MATCH: child}
+            node = child
+        last = labels[-1]
+        existing = node.get(last)
+        if isinstance(existing, dict):
+            if self._MATCH not in existing:
+                self.size += 1
+            existing[self._MATCH] = match
+        else:
+            if existing is None:
+                self.size += 1
+            node[last] = match
+
+    def remove(self, domain: str):
+        node = self.root
+        labels = domain.split(".")[::-1]
+        for label in labels[:-1]:
+            node = node.get(label)
+            if not isinstance(node, dict):
+                return
+        last = labels[-1]
+        existing = node.get(last)
+        if isinstance(existing, dict):
+            if existing.pop(self._MATCH, None) is not None:
+                self.size -= 1
+        elif existing is not None:
+            del node[last]
+            self.size -= 1
+
+    def lookup(self, domain: str) -> Optional[IOCMatch]:
+        """Match for domain or its closest listed parent"""
+        node, found = self.root, None
+        for label in reversed(domain.lower().rstrip(".").split(".")):
+            child = node.get(label)
+            if child is None:
+                break
+            if not isinstance(child, dict):
+                return child
+            found = child.get(self._MATCH, found)
+            node = child
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+class IOCMatcher:
+    """Threat indicators held in memory for per-log lookups.
+
+    - ip (or cidr): longest-prefix match on the address
+    - domain: suffix match on labels, so listed domains cover their subdomains
+    - hash, email and other types: exact, case-insensitive set lookups
+
+    load() builds everything from the active rows of threat_indicators;
+    refresh() then applies only rows added or touched (id or last_seen past
+    the previous pass) and falls back to a full reload when the active count
+    says rows were deleted or deactivated some other way.
+    """
+
+    def __init__(self, session_factory=SessionLocal, refresh_interval: float = None):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval or settings.IOC_REFRESH_INTERVAL_SECONDS
+        self.task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.networks = {4: _PrefixTable(32), 6: _PrefixTable(128)}
+        self.domains = _DomainTrie()
+        self.exact: Dict[str, Dict[str, IOCMatch]] = {}
+        # indicator id -> (type, normalized value), for updates and removals
+        self.by_id: Dict[int, Tuple[str, str]] = {}
+        self.max_id = 0
+        self.last_seen: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self.networks[4]) + len(self.networks[6]) + len(self.domains) + \
+            sum(len(values) for values in self.exact.values())
+
+    # --- Building -------------------------------------------------------------
+
+    def add(self, indicator_type: str, value: str, threat_level=SeverityLevel.MEDIUM, indicator_id: int = None):
+        """Add one indicator. Invalid values are skipped (returns False)."""
+        try:
+            kind, normalized = _normalize(indicator_type, value)
+        except ValueError:
+            if indicator_id is not None:
+                # Still counts as loaded, so refresh() doesn't keep reloading over it
+                self.by_id[indicator_id] = (indicator_type, value)
+            return False
+        match = IOCMatch(indicator_id, kind, normalized, SeverityLevel(threat_level or SeverityLevel.MEDIUM))
+        if kind == "ip":
+            network = ipaddress.ip_network(normalized)
+            self.networks[network.version].add(network, match)
+        elif kind == "domain":
+            self.domains.add(normalized, match)
+        else:
+            self.exact.setdefault(kind, {})[normalized] = match
+        if indicator_id is not None:
+            self.by_id[indicator_id] = (kind, normalized)
+        return True
+
+    def remove(self, indicator_type: str, value: str):
+        try:
+            kind, normalized = _normalize(indicator_type, value)
+        except ValueError:
+            return
+        if kind == "ip":
+            network = ipaddress.ip_network(normalized)
+            self.networks[network.version].remove(network)
+        elif kind == "domain":
+            self.domains.remove(normalized)
+        else:
+            self.exact.get(kind, {}).pop(normalized, None)
+
+    def _apply(self, indicators: Iterable[ThreatIndicator]):
+        for indicator in indicators:
+            previous = self.by_id.pop(indicator.id, None)
+            if previous is not None:
+                self.remove(*previous)
+            if indicator.is_active:
+                self.add(indicator.indicator_type, indicator.value, indicator.threat_level, indicator.id)
+            self.max_id = max(self.max_id, indicator.id)
+            if indicator.last_seen and (self.last_seen is None or indicator.last_seen > self.last_seen):
+                self.last_seen = indicator.last_seen
+
+    def load(self, db: Session, chunk_size: int = 10000) -> int:
+        """Rebuild from every active indicator. Returns the number loaded."""
+        # Built off to the side and swapped in, so lookups never see a partial set
+        fresh = IOCMatcher(self.session_factory, self.refresh_interval)
+        query = db.query(ThreatIndicator).filter(ThreatIndicator.is_active == True)
+        fresh._apply(query.yield_per(chunk_size))
+        with self._lock:
+            for name in ("networks", "domains", "exact", "by_id", "max_id", "last_seen"):
+                setattr(self, name, getattr(fresh, name))
+        return len(self.by_id)
+
+    def refresh(self, db: Session) -> int:
+        """Apply indicators changed since the last load/refresh. Returns rows applied."""
+        changed_filter = ThreatIndicator.id > self.max_id
+        if self.last_seen is not None:
+            changed_filter = or_(changed_filter, ThreatIndicator.last_seen > self.last_seen)
+        changed = db.query(ThreatIndicator).filter(changed_filter).all()
+        with self._lock:
+            self._apply(changed)
+
+        active = db.query(func.count(ThreatIndicator.id)).filter(ThreatIndicator.is_active == True).scalar()
+        if active != len(self.by_id):
+            return self.load(db)
+        return len(changed)
+
+    # --- Matching ---------------------------------------------------------------
+
+    def match_ip(self, value: str) -> Optional[IOCMatch]:
+        # inet_pton is strict and much cheaper than building an ipaddress object
+        value = value.strip()
+        family, version = (socket.AF_INET6, 6) if ":" in value else (socket.AF_INET, 4)
+        try:
+            address = int.from_bytes(socket.inet_pton(family, value), "big")
+        except OSError:
+            return None
+        return self.networks[version].lookup(address)
+
+    def match_domain(self, value: str) -> Optional[IOCMatch]:
+        return self.domains.lookup(value)
+
+    def match_exact(self, indicator_type: str, value: str) -> Optional[IOCMatch]:
+        return self.exact.get(indicator_type, {}).get(value.lower())
+
+    def scan_text(self, text: str) -> List[IOCMatch]:
+        """Every indicator mentioned in free text (IPs, domains, hashes, emails)"""
+        matches = []
+        if self.networks[4].probes:
+            matches += [m for m in map(self.match_ip, _IPV4_TOKEN.findall(text)) if m]
+        if self.networks[6].probes and ":" in text:
+            matches += [m for m in map(self.match_ip, _IPV6_TOKEN.findall(text)) if m]
+        if len(self.domains):
+            matches += [m for m in map(self.match_domain, _DOMAIN_TOKEN.findall(text)) if m]
+        for kind, values in self.exact.items():
+            if not values:
+                continue
+            if kind == "hash":
+                tokens = _HASH_TOKEN.findall(text)
+            elif kind == "email":
+                tokens = _EMAIL_TOKEN.findall(text)
+            else:
+                tokens = text.split()
+            matches += [values[t.lower()] for t in tokens if t.lower() in values]
+        return matches
+
+    def match_log(self, log) -> List[IOCMatch]:
+        """Indicators hit by a log's source/destination IP or raw_log"""
+        if not len(self):
+            return []
+        matches = []
+        for ip in (log.source_ip, log.destination_ip):
+            if ip:
+                match = self.match_ip(ip)
+                if match:
+                    matches.append(match)
+        if log.raw_log:
+            matches += self.scan_text(log.raw_log)
+        return matches
+
+    # --- Background refresh ------------------------------------------------------
+
+    def refresh_in_session(self) -> int:
+        db = self.session_factory()
+        try:
+            return self.refresh(db)
+        finally:
+            db.close()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                changed = await asyncio.to_thread(self.refresh_in_session)
+                if changed:
+                    logger.info(f"IOC matcher refreshed {changed} indicators")
+            except Exception as e:
+                logger.error(f"IOC refresh failed: {e}")
+
+
+ioc_matcher = IOCMatcher()
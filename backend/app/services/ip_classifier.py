@@ -0,0 +1,125 @@
+"""IP address classification (private, loopback, CGNAT, ... or public)."""
+import bisect
+import ipaddress
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+PUBLIC = "public"
+INVALID = "invalid"
+ALLOW = "allow"
+DENY = "deny"
+
+# Address space that never belongs to an outside attacker
+BUILTIN_RANGES = [
+    ("10.0.0.0/8", "private"),        # RFC 1918
+    ("172.16.0.0/12", "private"),
+    ("192.168.0.0/16", "private"),
+    ("127.0.0.0/8", "loopback"),
+    ("169.254.0.0/16", "link_local"),
+    ("100.64.0.0/10", "cgnat"),       # RFC 6598 carrier-grade NAT
+    ("::1/128", "loopback"),
+    ("fe80::/10", "link_local"),
+    ("fc00::/7", "ula"),              # IPv6 unique local addresses
+]
+
+# Categories that make a source IP worth a closer look
+SUSPICIOUS = frozenset({PUBLIC, DENY, INVALID})
+
+_IPV4_MAPPED = ipaddress.ip_network("::ffff:0:0/96")
+
+
+class _RangeTable:
+    """Sorted [start, end] integer ranges, searched with bisect.
+
+    Ranges in one table must not overlap unless they share a label - those are
+    merged (deny/allow lists are one label each, the built-in ranges are disjoint).
+    """
+
+    def __init__(self, ranges: Iterable[Tuple[int, int, str]]):
+        merged: List[List] = []
+        for start, end, label in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1 and merged[-1][2] == label:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end, label])
+        self.starts = [r[0] for r in merged]
+        self.ends = [r[1] for r in merged]
+        self.labels = [r[2] for r in merged]
+
+    def lookup(self, address: int) -> Optional[str]:
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i >= 0 and address <= self.ends[i]:
+            return self.labels[i]
+        return None
+
+
+def _tables(ranges: Iterable[Tuple[str, str]]) -> dict:
+    by_version = {4: [], 6: []}
+    for cidr, label in ranges:
+        network = ipaddress.ip_network(cidr, strict=False)
+        by_version[network.version].append(
+            (int(network.network_address), int(network.broadcast_address), label)
+        )
+    return {version: _RangeTable(entries) for version, entries in by_version.items()}
+
+
+class IPClassifier:
+    """Classifies addresses with sorted integer-range tables (one per IP version).
+
+    Lookup order is deny list, allow list, then the built-in special-purpose
+    ranges; anything else is public. IPv4-mapped IPv6 addresses are classified
+    as the IPv4 address they carry. Results are kept in an LRU cache, since
+    logs repeat the same handful of addresses.
+    """
+
+    def __init__(
+        self,
+        allow: Sequence[str] = None,
+        deny: Sequence[str] = None,
+        cache_size: int = None
+    ):
+        allow = settings.IP_ALLOWLIST if allow is None else allow
+        deny = settings.IP_DENYLIST if deny is None else deny
+        self.layers = [
+            _tables((cidr, DENY) for cidr in deny),
+            _tables((cidr, ALLOW) for cidr in allow),
+            _tables(BUILTIN_RANGES),
+        ]
+        self._cached = lru_cache(maxsize=cache_size or settings.IP_CLASSIFIER_CACHE_SIZE)(self._classify)
+
+    def _classify(self, ip: str) -> str:
+        try:
+            address = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            return INVALID
+        if address.version == 6 and address in _IPV4_MAPPED:
+            address = address.ipv4_mapped
+        value = int(address)
+        for tables in self.layers:
+            label = tables[address.version].lookup(value)
+            if label is not None:
+                return label
+        return PUBLIC
+
+    def classify(self, ip: str) -> str:
+        return self._cached(ip)
+
+    def classify_many(self, ips: Iterable[Optional[str]]) -> List[Optional[str]]:
+        """classify() for a batch (None stays None)"""
+        cached = self._cached
+        return [cached(ip) if ip else None for ip in ips]
+
+    def is_suspicious(self, ip: str) -> bool:
+        return self._cached(ip) in SUSPICIOUS
+
+    def suspicious_many(self, ips: Iterable[Optional[str]]) -> List[bool]:
+        """is_suspicious() for a batch - missing IPs are never suspicious"""
+        return [label in SUSPICIOUS for label in self.classify_many(ips)]
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+ip_classifier = IPClassifier()
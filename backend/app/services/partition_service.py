@@ -0,0 +1,231 @@
+"""Partition maintenance and retention for security_logs."""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete, update, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.db.database import SessionLocal
+from app.db.models import SecurityLog, Alert, LogRollupHourly, LogRollupDaily
+from app.services.count_service import log_count_cache
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "security_logs"
+
+
+def period_start(ts: datetime, interval: str) -> datetime:
+    """Start of the day (or ISO week, Monday) holding ts"""
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def period_end(start: datetime, interval: str) -> datetime:
+    return start + timedelta(days=7 if interval == "week" else 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+
+def partition_start(name: str) -> Optional[datetime]:
+    """Inverse of partition_name (None for anything that isn't one of ours)"""
+    prefix = f"{PARENT_TABLE}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], "%Y%m%d")
+    except ValueError:
+        return None
+
+
+def create_partition_sql(start: datetime, interval: str) -> str:
+    end = period_end(start, interval)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+
+
+class PartitionManager:
+    """Keeps future partitions in place and enforces LOG_RETENTION_DAYS.
+
+    On PostgreSQL, once migration 0002 has made security_logs a range-partitioned
+    table, each maintenance pass creates the partitions for the next
+    LOG_PARTITIONS_AHEAD periods. There is no DEFAULT partition, so anything
+    writing backdated rows calls ensure_backfill first. Retention detaches and drops whole partitions,
+    so there is no large DELETE, no bloat and no long locks.
+
+    Elsewhere (SQLite, or PostgreSQL before the migration) retention deletes
+    expired rows in small batches, committing after each one.
+
+    Either way the analytics rollups, the listing count cache and the response
+    cache are kept in step with what was removed.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        interval: str = None,
+        ahead: int = None,
+        retention_days: int = None,
+        maintenance_interval: float = None
+    ):
+        self.session_factory = session_factory
+        self.interval = interval or settings.LOG_PARTITION_INTERVAL
+        self.ahead = ahead if ahead is not None else settings.LOG_PARTITIONS_AHEAD
+        self.retention_days = retention_days if retention_days is not None else settings.LOG_RETENTION_DAYS
+        self.maintenance_interval = maintenance_interval or settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+        self.task: Optional[asyncio.Task] = None
+
+    # --- PostgreSQL partitions -------------------------------------------
+
+    @staticmethod
+    def is_partitioned(db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :name"
+        ), {"name": PARENT_TABLE}).first() is not None
+
+    @staticmethod
+    def list_partitions(db: Session) -> List[Tuple[str, datetime]]:
+        """(name, start) of every partition, oldest first"""
+        names = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ), {"name": PARENT_TABLE}).scalars().all()
+        partitions = [(name, partition_start(name)) for name in names]
+        return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
+
+    def ensure_partitions(self, db: Session, now: datetime = None, oldest: datetime = None) -> List[str]:
+        """Create partitions from the current period (or the one holding
+        oldest, if that's earlier) through `ahead` periods out."""
+        now = now or datetime.utcnow()
+        start = period_start(min(oldest or now, now), self.interval)
+        last = period_start(now, self.interval)
+        for _ in range(self.ahead):
+            last = period_end(last, self.interval)
+        existing = {name for name, _ in self.list_partitions(db)}
+        created = []
+        while start <= last:
+            name = partition_name(start)
+            if name not in existing:
+                db.execute(text(create_partition_sql(start, self.interval)))
+                created.append(name)
+            start = period_end(start, self.interval)
+        db.commit()
+        return created
+
+    def ensure_backfill(self, db: Session, oldest: datetime) -> List[str]:
+        """Partitions for rows about to be written as far back as oldest (no-op unless partitioned)."""
+        if not self.is_partitioned(db):
+            return []
+        return self.ensure_partitions(db, oldest=oldest)
+
+    def drop_expired_partitions(self, db: Session, cutoff: datetime) -> List[str]:
+        """Drop partitions that end on or before cutoff."""
+        dropped = []
+        for name, start in self.list_partitions(db):
+            end = period_end(start, self.interval)
+            if end > cutoff:
+                break
+            # Alerts outlive the logs they point at (there's no FK on a partitioned table)
+            db.execute(text(f"UPDATE alerts SET log_id = NULL WHERE log_id IN (SELECT id FROM {name})"))
+            db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+            # Partitions are whole days, so whole rollup buckets go with them
+            for model in (LogRollupHourly, LogRollupDaily):
+                db.execute(delete(model).where(model.bucket >= start, model.bucket < end))
+            db.commit()
+            dropped.append(name)
+        return dropped
+
+    # --- Row-by-batch retention ---------------------------------------------
+
+    def delete_expired_rows(self, db: Session, cutoff: datetime, batch_size: int = None) -> int:
+        """Delete logs older than cutoff in batches (oldest first)."""
+        batch_size = batch_size or settings.LOG_RETENTION_BATCH_SIZE
+        columns = (SecurityLog.id, SecurityLog.timestamp, SecurityLog.event_type,
+                   SecurityLog.severity, SecurityLog.is_threat, SecurityLog.threat_score)
+        deleted = 0
+        while True:
+            rows = db.execute(
+                select(*columns).where(SecurityLog.timestamp < cutoff)
+                .order_by(SecurityLog.timestamp).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            ids = [row["id"] for row in rows]
+            db.execute(update(Alert).where(Alert.log_id.in_(ids)).values(log_id=None))
+            db.execute(delete(SecurityLog).where(SecurityLog.id.in_(ids)))
+            RollupService.apply(db, rows, sign=-1)
+            db.commit()
+            deleted += len(rows)
+        return deleted
+
+    # --- Maintenance ----------------------------------------------------------
+
+    def maintain(self, now: datetime = None) -> dict:
+        """One maintenance pass (blocking - run it in a thread from async code)."""
+        now = now or datetime.utcnow()
+        result = {"created": [], "dropped": [], "deleted_rows": 0}
+        db = self.session_factory()
+        try:
+            partitioned = self.is_partitioned(db)
+            if partitioned:
+                result["created"] = self.ensure_partitions(db, now)
+
+            if self.retention_days > 0:
+                cutoff = now - timedelta(days=self.retention_days)
+                if partitioned:
+                    result["dropped"] = self.drop_expired_partitions(db, cutoff)
+                else:
+                    result["deleted_rows"] = self.delete_expired_rows(db, cutoff)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if result["dropped"] or result["deleted_rows"]:
+            log_count_cache.clear()
+            response_cache.bump("logs", "alerts")
+        return result
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await asyncio.to_thread(self.maintain)
+                if any(result.values()):
+                    logger.info(f"Partition maintenance: {result}")
+            except Exception as e:
+                logger.error(f"Partition maintenance failed: {e}")
+            await asyncio.sleep(self.maintenance_interval)
+
+
+partition_manager = PartitionManager()
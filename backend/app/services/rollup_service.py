@@ -0,0 +1,189 @@
+"""Hourly/daily rollups of security logs for the analytics endpoints."""
+from sqlalchemy import func, delete, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Iterable, Any
+from collections import defaultdict
+
+from app.db.models import SecurityLog, LogRollupHourly, LogRollupDaily, EventType, SeverityLevel
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# (bucket, event_type, severity, is_threat, count, threat_score_sum)
+Segment = Tuple[datetime, EventType, SeverityLevel, bool, int, float]
+
+
+def floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(ts: datetime, floor) -> datetime:
+    start = floor(ts)
+    if start == ts:
+        return start
+    return start + (HOUR if floor is floor_hour else DAY)
+
+
+def _key(row: Dict[str, Any]) -> tuple:
+    """Rollup key fields of a log, normalised to the model enums"""
+    return (
+        EventType(getattr(row['event_type'], 'value', row['event_type'])),
+        SeverityLevel(getattr(row['severity'], 'value', row['severity']) or SeverityLevel.LOW),
+        bool(row['is_threat']),
+    )
+
+
+class RollupService:
+    """Keeps log_rollups_hourly/daily in step with security_logs and answers
+    windowed count queries from them.
+
+    Rollups are updated in the same transaction as the insert/delete they
+    describe. Window queries combine a raw scan for the partial first hour,
+    hourly rollups up to the next midnight, and daily rollups after that, so
+    they return exactly what a full scan would.
+    """
+
+    @staticmethod
+    def aggregate(rows: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[tuple, Dict[tuple, list]]:
+        """Group rows into {model: {(bucket, event_type, severity, is_threat): [count, score_sum]}}"""
+        deltas = {LogRollupHourly: defaultdict(lambda: [0, 0.0]), LogRollupDaily: defaultdict(lambda: [0, 0.0])}
+        for row in rows:
+            key = _key(row)
+            score = (row.get('threat_score') or 0.0) * sign
+            for model, floor in ((LogRollupHourly, floor_hour), (LogRollupDaily, floor_day)):
+                entry = deltas[model][(floor(row['timestamp']),) + key]
+                entry[0] += sign
+                entry[1] += score
+        return deltas
+
+    @staticmethod
+    def apply(db: Session, rows: List[Dict[str, Any]], sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) logs from the rollups. Caller commits."""
+        if not rows:
+            return
+        for model, entries in RollupService.aggregate(rows, sign).items():
+            RollupService._upsert(db, model, entries)
+
+    @staticmethod
+    def _upsert(db: Session, model, entries: Dict[tuple, list]):
+        values = [
+            {
+                "bucket": bucket, "event_type": event_type, "severity": severity,
+                "is_threat": is_threat, "count": count, "threat_score_sum": score_sum
+            }
+            for (bucket, event_type, severity, is_threat), (count, score_sum) in entries.items()
+        ]
+        dialect = db.get_bind().dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = insert(model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['bucket', 'event_type', 'severity', 'is_threat'],
+                set_={
+                    "count": model.count + stmt.excluded['count'],
+                    "threat_score_sum": model.threat_score_sum + stmt.excluded.threat_score_sum,
+                }
+            )
+            db.execute(stmt, values)
+            return
+
+        # Generic fallback - read, modify, write
+        for value in values:
+            existing = db.get(model, (value['bucket'], value['event_type'], value['severity'], value['is_threat']))
+            if existing:
+                existing.count += value['count']
+                existing.threat_score_sum += value['threat_score_sum']
+            else:
+                db.add(model(**value))
+        db.flush()
+
+    @staticmethod
+    def rebuild(db: Session, chunk_size: int = 10000) -> int:
+        """Recompute all rollups from security_logs and the log archive (one streaming pass)."""
+        db.execute(delete(LogRollupHourly))
+        db.execute(delete(LogRollupDaily))
+
+        columns = (SecurityLog.timestamp, SecurityLog.event_type, SecurityLog.severity,
+                   SecurityLog.is_threat, SecurityLog.threat_score)
+        stmt = select(*columns).where(SecurityLog.timestamp.isnot(None))
+        result = db.execute(stmt.execution_options(yield_per=chunk_size))
+        totals = RollupService.aggregate(result.mappings())
+
+        # Archived logs still count
+        from app.services.archive_service import segment_store
+        for model, entries in RollupService.aggregate(segment_store.iter_rollup_rows()).items():
+            for key, (count, score) in entries.items():
+                totals[model][key][0] += count
+                totals[model][key][1] += score
+
+        for model, entries in totals.items():
+            if entries:
+                RollupService._upsert(db, model, entries)
+        db.commit()
+        return sum(count for count, _ in totals[LogRollupDaily].values())
+
+    @staticmethod
+    def ensure_built(db: Session):
+        """Build rollups for a database that has logs but no rollups yet."""
+        has_rollups = db.query(LogRollupHourly.bucket).first() is not None
+        if not has_rollups and db.query(SecurityLog.id).first() is not None:
+            print("Building analytics rollups from existing logs...")
+            RollupService.rebuild(db)
+
+    @staticmethod
+    def segments(db: Session, start: datetime, granularity: str = 'day') -> List[Segment]:
+        """Counts for every log with timestamp >= start.
+
+        granularity='day' uses daily rollups for whole days, 'hour' stops at
+        hourly rollups (for per-hour breakdowns). The partial first hour comes
+        from security_logs directly and is reported under floor_hour(start).
+        """
+        first_hour = _ceil(start, floor_hour)
+        segments: List[Segment] = []
+
+        if start < first_hour:
+            edge = db.query(
+                SecurityLog.event_type,
+                SecurityLog.severity,
+                SecurityLog.is_threat,
+                func.count(SecurityLog.id),
+                func.sum(SecurityLog.threat_score)
+            ).filter(
+                SecurityLog.timestamp >= start,
+                SecurityLog.timestamp < first_hour
+            ).group_by(SecurityLog.event_type, SecurityLog.severity, SecurityLog.is_threat).all()
+            bucket = floor_hour(start)
+            merged = defaultdict(lambda: [0, 0.0])
+            for event_type, severity, is_threat, count, score_sum in edge:
+                entry = merged[(bucket,) + _key({"event_type": event_type, "severity": severity, "is_threat": is_threat})]
+                entry[0] += count
+                entry[1] += score_sum or 0.0
+            segments.extend(key + tuple(value) for key, value in merged.items())
+
+        if granularity == 'hour':
+            hourly_end, first_day = None, None
+        else:
+            first_day = _ceil(first_hour, floor_day)
+            hourly_end = first_day
+
+        segments.extend(RollupService._read(db, LogRollupHourly, first_hour, hourly_end))
+        if first_day is not None:
+            segments.extend(RollupService._read(db, LogRollupDaily, first_day, None))
+        return segments
+
+    @staticmethod
+    def _read(db: Session, model, start: datetime, end) -> List[Segment]:
+        query = db.query(
+            model.bucket, model.event_type, model.severity, model.is_threat,
+            model.count, model.threat_score_sum
+        ).filter(model.bucket >= start, model.count != 0)
+        if end is not None:
+            query = query.filter(model.bucket < end)
+        return [tuple(row) for row in query.all()]
@@ -0,0 +1,331 @@
+"""Streaming sketches of source IPs, usernames and scores, per hour and day bucket."""
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import LogSketch, SecurityLog
+from app.services.rollup_service import floor_hour, floor_day, DAY
+from app.services.sketches import HeavyHitters, HyperLogLog, TDigest, hash64, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+TOP_SOURCE_IPS = "top_source_ips"
+DISTINCT_SOURCE_IPS = "distinct_source_ips"
+DISTINCT_USERNAMES = "distinct_usernames"
+FIXED_SKETCHES = (TOP_SOURCE_IPS, DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES)
+
+# Score digests are kept per event type, named "<field>:<event type>"
+SCORE_FIELDS = ("threat_score", "confidence_score")
+
+
+def score_digest_name(field: str, event_type) -> str:
+    return f"{field}:{getattr(event_type, 'value', event_type)}"
+
+# Precision of the per-IP username counters - 256 bytes each, ~6.5% error
+# (and close to exact for the handful of users a typical IP has)
+USERS_PER_IP_PRECISION = 8
+
+Sketches = Dict[str, Any]  # sketch name -> sketch
+
+
+class SketchStore:
+    """Sketches updated at ingest, merged into log_sketches periodically.
+
+    Each process accumulates hourly sketches in memory and a flush merges
+    them into the stored hour and day rows (read, merge, write under a row
+    lock), so any number of workers can contribute to the same buckets.
+    Queries merge stored hour rows for the partial first day, day rows after
+    that, and whatever this process hasn't flushed yet - windows are aligned
+    to whole hours. Other workers' events show up once they flush.
+
+    Score digests exist only for the event types actually seen, so a bucket
+    holds the fixed sketches plus up to two digests per event type.
+
+    Sketches only grow: deleting a log doesn't remove it from them, and they
+    are kept for SKETCH_RETENTION_DAYS independently of the logs.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = None, retention_days: int = None):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval or settings.SKETCH_FLUSH_INTERVAL_SECONDS
+        self.retention_days = retention_days if retention_days is not None else settings.SKETCH_RETENTION_DAYS
+        self.pending: Dict[datetime, Sketches] = {}
+        # Taken out of pending by a flush that hasn't committed yet - still visible to queries
+        self.flushing: Dict[datetime, Sketches] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def new_sketch(name: str):
+        if name == TOP_SOURCE_IPS:
+            return HeavyHitters(settings.SKETCH_TOP_K, USERS_PER_IP_PRECISION)
+        if name in (DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES):
+            return HyperLogLog(settings.SKETCH_HLL_PRECISION)
+        return TDigest(settings.SKETCH_TDIGEST_COMPRESSION)
+
+    @classmethod
+    def new_sketches(cls) -> Sketches:
+        return {name: cls.new_sketch(name) for name in FIXED_SKETCHES}
+
+    @classmethod
+    def _merge_into(cls, target: Sketches, sketches: Sketches, names: List[str] = None, prefix: str = None):
+        """Merge sketches (all, the named ones or those starting with prefix) into target"""
+        for name, sketch in sketches.items():
+            if names is not None and name not in names:
+                continue
+            if prefix is not None and not name.startswith(prefix):
+                continue
+            mine = target.get(name)
+            if mine is None:
+                mine = target[name] = cls.new_sketch(name)
+            mine.merge(sketch)
+
+    def clear(self):
+        with self._lock:
+            self.pending = {}
+            self.flushing = {}
+
+    # --- Updating -------------------------------------------------------------
+
+    def record(self, rows: Iterable[Dict[str, Any]]):
+        """Add logs (dicts with timestamp, source_ip, username, event_type and scores) to the sketches"""
+        with self._lock:
+            pending = self.pending
+            for row in rows:
+                timestamp = row.get('timestamp')
+                if timestamp is None:
+                    continue
+                bucket = floor_hour(timestamp)
+                sketches = pending.get(bucket)
+                if sketches is None:
+                    sketches = pending[bucket] = self.new_sketches()
+                username = row.get('username')
+                user_hash = hash64(username) if username else None
+                source_ip = row.get('source_ip')
+                if source_ip:
+                    sketches[DISTINCT_SOURCE_IPS].add(source_ip)
+                    sketches[TOP_SOURCE_IPS].add(source_ip, distinct_hash=user_hash)
+                if user_hash is not None:
+                    sketches[DISTINCT_USERNAMES].add_hash(user_hash)
+                event_type = row.get('event_type')
+                if event_type is None:
+                    continue
+                for field in SCORE_FIELDS:
+                    value = row.get(field)
+                    if value is None:
+                        continue
+                    name = score_digest_name(field, event_type)
+                    digest = sketches.get(name)
+                    if digest is None:
+                        digest = sketches[name] = self.new_sketch(name)
+                    digest.add(value)
+
+    def flush(self, db: Session = None, commit: bool = True) -> int:
+        """Merge pending sketches into log_sketches. Returns the rows written.
+
+        With commit=False the rows are only flushed to the transaction."""
+        own_session = db is None
+        db = db or self.session_factory()
+        with self._flush_lock:
+            with self._lock:
+                batch, self.pending = self.pending, {}
+                self.flushing = batch
+            try:
+                written = self._write(db, batch, commit)
+            except Exception:
+                db.rollback()
+                # Keep the deltas for the next flush
+                with self._lock:
+                    for bucket, sketches in batch.items():
+                        self._absorb(self.pending, bucket, sketches)
+                    self.flushing = {}
+                raise
+            finally:
+                if own_session:
+                    db.close()
+            with self._lock:
+                self.flushing = {}
+        return written
+
+    @classmethod
+    def _absorb(cls, target: Dict[datetime, Sketches], bucket: datetime, sketches: Sketches):
+        existing = target.get(bucket)
+        if existing is None:
+            target[bucket] = sketches
+            return
+        cls._merge_into(existing, sketches)
+
+    def _write(self, db: Session, batch: Dict[datetime, Sketches], commit: bool = True) -> int:
+        if not batch:
+            return 0
+        # Hourly deltas as they are, plus their sum per day
+        writes: Dict[Tuple[str, datetime], Sketches] = {}
+        for bucket, sketches in batch.items():
+            writes[("hour", bucket)] = sketches
+            day = writes.setdefault(("day", floor_day(bucket)), {})
+            self._merge_into(day, sketches)
+
+        for (granularity, bucket), sketches in writes.items():
+            stored = {
+                row.name: row for row in db.execute(
+                    select(LogSketch).where(
+                        LogSketch.granularity == granularity,
+                        LogSketch.bucket == bucket,
+                        LogSketch.name.in_(list(sketches))
+                    ).with_for_update()
+                ).scalars()
+            }
+            for name, sketch in sketches.items():
+                row = stored.get(name)
+                if row is None:
+                    db.add(LogSketch(granularity=granularity, bucket=bucket, name=name, data=dumps(sketch)))
+                else:
+                    merged = loads(row.data)
+                    merged.merge(sketch)
+                    row.data = dumps(merged)
+        # If another worker created one of the rows first this raises
+        # IntegrityError, and flush() keeps the deltas for the next attempt
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        return sum(len(sketches) for sketches in writes.values())
+
+    def prune(self, db: Session, now: datetime = None) -> int:
+        """Delete sketches older than SKETCH_RETENTION_DAYS (0 = keep all)"""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = floor_day((now or datetime.utcnow()) - timedelta(days=self.retention_days))
+        deleted = db.execute(delete(LogSketch).where(LogSketch.bucket < cutoff)).rowcount
+        db.commit()
+        return deleted
+
+    # --- Querying ---------------------------------------------------------------
+
+    def merged(self, db: Session, start: datetime, names: List[str] = None, prefix: str = None) -> Sketches:
+        """The fixed sketches (or the named ones, or those whose name starts
+        with prefix) for logs from floor_hour(start) on.
+
+        Named sketches are always in the result, empty if nothing was
+        recorded; prefix matches only include the names that exist.
+        """
+        if prefix is None:
+            names = names or list(FIXED_SKETCHES)
+            result = {name: self.new_sketch(name) for name in names}
+            name_filter = LogSketch.name.in_(names)
+        else:
+            names, result = None, {}
+            name_filter = LogSketch.name.startswith(prefix, autoescape=True)
+        first_hour = floor_hour(start)
+        first_day = floor_day(first_hour)
+        if first_day < first_hour:
+            first_day += DAY
+
+        rows = db.execute(
+            select(LogSketch.name, LogSketch.data).where(
+                name_filter,
+                (
+                    (LogSketch.granularity == "hour") & (LogSketch.bucket >= first_hour) &
+                    (LogSketch.bucket < first_day)
+                ) | (
+                    (LogSketch.granularity == "day") & (LogSketch.bucket >= first_day)
+                )
+            )
+        ).all()
+        for name, data in rows:
+            self._merge_into(result, {name: loads(data)})
+
+        with self._lock:
+            unflushed = [sketches for source in (self.flushing, self.pending)
+                         for bucket, sketches in source.items() if bucket >= first_hour]
+            for sketches in unflushed:
+                self._merge_into(result, sketches, names, prefix)
+        return result
+
+    # --- Building -----------------------------------------------------------------
+
+    def rebuild(self, db: Session, chunk_size: int = 10000) -> int:
+        """Recompute every stored sketch from security_logs and the log archive."""
+        fresh = SketchStore(self.session_factory, self.flush_interval, self.retention_days)
+        db.execute(delete(LogSketch))
+        db.commit()
+
+        fields = ["timestamp", "source_ip", "username", "event_type", *SCORE_FIELDS]
+        columns = [getattr(SecurityLog, field) for field in fields]
+        stmt = select(*columns).where(SecurityLog.timestamp.isnot(None)).order_by(SecurityLog.timestamp)
+        result = db.execute(stmt.execution_options(yield_per=chunk_size)).mappings()
+        from app.services.archive_service import segment_store
+        archived = segment_store.iter_rollup_rows(fields=fields)
+
+        count = 0
+        for rows in (result, archived):
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    fresh.record(chunk)
+                    count += len(chunk)
+                    chunk = []
+                    # Rows come (mostly) oldest first - write out buckets as we go,
+                    # without committing: that would close the server-side cursor
+                    if len(fresh.pending) > 48:
+                        fresh.flush(db, commit=False)
+            fresh.record(chunk)
+            count += len(chunk)
+        fresh.flush(db)
+        return count
+
+    def ensure_built(self, db: Session):
+        """Build sketches for a database that has logs but no sketches yet."""
+        has_sketches = db.query(LogSketch.bucket).first() is not None
+        if not has_sketches and db.query(SecurityLog.id).first() is not None:
+            print("Building log sketches from existing logs...")
+            self.rebuild(db)
+
+    # --- Background flush -----------------------------------------------------------
+
+    def flush_and_prune(self) -> int:
+        db = self.session_factory()
+        try:
+            written = self.flush(db)
+            self.prune(db)
+            return written
+        finally:
+            db.close()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            logger.error(f"Final sketch flush failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush_and_prune)
+            except Exception as e:
+                logger.error(f"Sketch flush failed: {e}")
+
+
+sketch_store = SketchStore()
@@ -0,0 +1,325 @@
+"""Mergeable streaming sketches - heavy hitters, distinct counts and quantiles.
+
+Every sketch here can be merged with another of the same shape, and the
+result is the sketch of the combined streams. That is what lets per-hour
+sketches add up to any window, and sketches built by different worker
+processes be combined in the database.
+"""
+import base64
+import hashlib
+import json
+import math
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision one-byte registers.
+
+    Relative standard error is about 1.04 / sqrt(2**precision): 1.6% at the
+    default precision of 12 (4 KiB). Small counts fall back to linear
+    counting and are close to exact. Merging takes the register-wise max.
+    """
+
+    def __init__(self, precision: int = 12, registers: bytes = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h: int):
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLogs of different precision")
+        mine = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum(mine, np.frombuffer(other.registers, dtype=np.uint8), out=mine)
+
+    def count(self) -> int:
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+        zeros = m - int(np.count_nonzero(registers))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        return cls(data["precision"], base64.b64decode(data["registers"]))
+
+
+class HeavyHitters:
+    """Top-k frequent items - the Misra-Gries summary, the mergeable form of Space-Saving.
+
+    Keeps at most 2 * capacity counters while updating and capacity after a
+    merge. Reported counts never overestimate, and undercount any item by at
+    most error_bound = (total - sum of counters) / (capacity + 1), which is
+    never more than total / (capacity + 1). Any item with more than that many
+    occurrences is guaranteed to be present.
+
+    With distinct_precision set, each tracked item also carries a small
+    HyperLogLog of a second attribute (e.g. usernames per source IP). It only
+    sees occurrences while the item is tracked, so for items near the error
+    bound it can undercount.
+    """
+
+    def __init__(self, capacity: int = 256, distinct_precision: Optional[int] = None):
+        self.capacity = capacity
+        self.distinct_precision = distinct_precision
+        self.counts: Dict[str, int] = {}
+        self.distinct: Dict[str, HyperLogLog] = {}
+        self.total = 0
+
+    @property
+    def error_bound(self) -> float:
+        return (self.total - sum(self.counts.values())) / (self.capacity + 1)
+
+    def add(self, item: str, weight: int = 1, distinct_hash: Optional[int] = None):
+        counts = self.counts
+        counts[item] = counts.get(item, 0) + weight
+        self.total += weight
+        if distinct_hash is not None and self.distinct_precision:
+            sketch = self.distinct.get(item)
+            if sketch is None:
+                sketch = self.distinct[item] = HyperLogLog(self.distinct_precision)
+            sketch.add_hash(distinct_hash)
+        if len(counts) > 2 * self.capacity:
+            self._reduce()
+
+    def _reduce(self):
+        """Subtract the (capacity + 1)-th largest count from every counter, drop the non-positive"""
+        if len(self.counts) <= self.capacity:
+            return
+        cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+        self.counts = {item: count - cut for item, count in self.counts.items() if count > cut}
+        if self.distinct:
+            self.distinct = {item: sketch for item, sketch in self.distinct.items() if item in self.counts}
+
+    def merge(self, other: "HeavyHitters"):
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        for item, sketch in other.distinct.items():
+            mine = self.distinct.get(item)
+            if mine is None:
+                self.distinct[item] = HyperLogLog(sketch.precision, sketch.registers)
+            else:
+                mine.merge(sketch)
+        self.total += other.total
+        self._reduce()
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def distinct_count(self, item: str) -> Optional[int]:
+        sketch = self.distinct.get(item)
+        return sketch.count() if sketch is not None else None
+
+    def to_dict(self) -> dict:
+        self._reduce()
+        return {
+            "capacity": self.capacity,
+            "distinct_precision": self.distinct_precision,
+            "total": self.total,
+            "counts": self.counts,
+            "distinct": {item: base64.b64encode(bytes(sketch.registers)).decode()
+                         for item, sketch in self.distinct.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HeavyHitters":
+        sketch = cls(data["capacity"], data.get("distinct_precision"))
+        sketch.total = data["total"]
+        sketch.counts = dict(data["counts"])
+        sketch.distinct = {
+            item: HyperLogLog(sketch.distinct_precision, base64.b64decode(registers))
+            for item, registers in data.get("distinct", {}).items()
+        }
+        return sketch
+
+
+class TDigest:
+    """Quantile sketch - a merging t-digest (Dunning & Ertl).
+
+    Values are kept as weighted centroids, small near the tails and larger
+    in the middle (k1 scale function), so extreme quantiles such as p99 stay
+    accurate: rank error is roughly proportional to q * (1 - q) / compression.
+    At most about compression centroids are kept after compressing; new
+    values are buffered and folded in a few hundred at a time.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[float] = []
+        self._buffer_size = int(5 * compression)
+
+    def add(self, value: float):
+        self._buffer.append(value)
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        if not other.count:
+            return
+        other._compress()
+        self._compress(other.means, other.weights)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _q_limit(self, q: float) -> float:
+        """Largest quantile the centroid starting at q may reach (k1 scale function)"""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self, means: np.ndarray = None, weights: np.ndarray = None):
+        if not self._buffer and means is None:
+            return
+        parts_m = [self.means, np.asarray(self._buffer, dtype=float)]
+        parts_w = [self.weights, np.ones(len(self._buffer))]
+        if means is not None:
+            parts_m.append(means)
+            parts_w.append(weights)
+        all_means, all_weights = np.concatenate(parts_m), np.concatenate(parts_w)
+        self._buffer = []
+        if not len(all_means):
+            return
+        order = np.argsort(all_means, kind="mergesort")
+        all_means, all_weights = all_means[order].tolist(), all_weights[order].tolist()
+
+        total = sum(all_weights)
+        out_means, out_weights = [], []
+        mean, weight, so_far = all_means[0], all_weights[0], 0.0
+        limit = total * self._q_limit(0.0)
+        for m, w in zip(all_means[1:], all_weights[1:]):
+            if so_far + weight + w <= limit:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                out_means.append(mean)
+                out_weights.append(weight)
+                so_far += weight
+                limit = total * self._q_limit(min(so_far / total, 1.0))
+                mean, weight = m, w
+        out_means.append(mean)
+        out_weights.append(weight)
+        self.means, self.weights = np.array(out_means), np.array(out_weights)
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not self.count:
+            return None
+        means, weights = self.means, self.weights
+        centers = np.cumsum(weights) - weights / 2
+        target = q * self.count
+        if target <= centers[0]:
+            if centers[0] <= 0.5:
+                return float(means[0])
+            return float(self.min + (means[0] - self.min) * max(target - 0.5, 0) / (centers[0] - 0.5))
+        if target >= centers[-1]:
+            tail = self.count - centers[-1]
+            if tail <= 0.5:
+                return float(means[-1])
+            return float(means[-1] + (self.max - means[-1]) * min((target - centers[-1]) / (tail - 0.5), 1.0))
+        i = int(np.searchsorted(centers, target))
+        fraction = (target - centers[i - 1]) / (centers[i] - centers[i - 1])
+        return float(means[i - 1] + (means[i] - means[i - 1]) * fraction)
+
+    def cdf(self, value: float) -> float:
+        """Estimated fraction of values <= value"""
+        self._compress()
+        if not self.count or value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        means, weights = self.means, self.weights
+        centers = np.cumsum(weights) - weights / 2
+        if value < means[0]:
+            rank = centers[0] * (value - self.min) / (means[0] - self.min)
+        elif value >= means[-1]:
+            rank = centers[-1] + (self.count - centers[-1]) * (value - means[-1]) / (self.max - means[-1])
+        else:
+            i = int(np.searchsorted(means, value, side="right"))
+            span = means[i] - means[i - 1]
+            fraction = (value - means[i - 1]) / span if span > 0 else 1.0
+            rank = centers[i - 1] + (centers[i] - centers[i - 1]) * fraction
+        return float(min(max(rank / self.count, 0.0), 1.0))
+
+    def mean(self) -> Optional[float]:
+        self._compress()
+        if not self.count:
+            return None
+        return float(np.dot(self.means, self.weights) / self.weights.sum())
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "means": base64.b64encode(self.means.astype("<f8").tobytes()).decode(),
+            "weights": base64.b64encode(self.weights.astype("<f8").tobytes()).decode()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        sketch = cls(data["compression"])
+        sketch.count = data["count"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.means = np.frombuffer(base64.b64decode(data["means"]), dtype="<f8").astype(float)
+        sketch.weights = np.frombuffer(base64.b64decode(data["weights"]), dtype="<f8").astype(float)
+        return sketch
+
+
+_TYPES = {"hll": HyperLogLog, "heavy_hitters": HeavyHitters, "tdigest": TDigest}
+_TYPE_NAMES = {cls: name for name, cls in _TYPES.items()}
+
+
+def dumps(sketch) -> bytes:
+    """Compact serialized form for storage (zlib-compressed JSON)"""
+    payload = {"type": _TYPE_NAMES[type(sketch)], "data": sketch.to_dict()}
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+
+
+def loads(blob: bytes):
+    payload = json.loads(zlib.decompress(blob))
+    return _TYPES[payload["type"]].from_dict(payload["data"])
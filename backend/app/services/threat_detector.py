@@ -14,18 +14,38 @@ from datetime import datetime, timedelta
 import random
 
 from app.db.models import SecurityLog, SeverityLevel, EventType
+from app.services.ioc_matcher import IOCMatcher, ioc_matcher as default_ioc_matcher
+from app.services.ip_classifier import IPClassifier, ip_classifier as default_ip_classifier
+from app.services.forest import CompiledForest
 
+# Code for categories the encoders never saw. Tree splits sit between the
+# fitted codes (0.5, 1.5, ...) so this routes the same way code 0 used to.
+UNKNOWN_CATEGORY = -1
+
+# Minimum threat score for a log that hits a known indicator, by indicator level
+IOC_SCORES = {
+    SeverityLevel.LOW: 0.5,
+    SeverityLevel.MEDIUM: 0.7,
+    SeverityLevel.HIGH: 0.85,
+    SeverityLevel.CRITICAL: 0.95,
+}
 
 class ThreatDetector:
     
-    def __init__(self):
+    def __init__(self, ioc_matcher: IOCMatcher = None, ip_classifier: IPClassifier = None):
         self.model = None
+        # Flattened copy of the model that predictions actually run on
+        self.forest = None
+        # Known-bad IPs/domains/hashes (threat_indicators), checked on every log
+        self.ioc_matcher = ioc_matcher if ioc_matcher is not None else default_ioc_matcher
+        self.ip_classifier = ip_classifier or default_ip_classifier
         self.encoders = {}
         self.scaler = StandardScaler()
         self.model_path = "app/ml_models/threat_model.pkl"
         self.enc_path = "app/ml_models/encoders.pkl"
         self.scaler_path = "app/ml_models/scaler.pkl"
         self.trained = False
+        self._compile_encoders()
         
         # Try to load existing model
         # NOTE: Falls back to heuristics if model doesn't exist - this saved us during demo
@@ -60,12 +80,14 @@ class ThreatDetector:
         if self.trained and self.model:
             try:
                 features = self._extract_features(log)
-                prediction = self.model.predict_proba([features])[0]
+                prediction = self._predict_proba([features])[0]
                 threat_score = prediction[1]  # Probability of being a threat
                 is_threat = threat_score > 0.6
                 confidence = max(prediction)
                 # print(f"[ML] Threat detected: {is_threat}, score: {threat_score}")  # debug
-                return is_threat, round(confidence, 3), round(threat_score, 3)
+                return self._apply_iocs(
+                    log, (bool(is_threat), float(round(confidence, 3)), float(round(threat_score, 3)))
+                )
             except Exception as e:
                 # TODO: actually log this somewhere instead of just printing
                 print(f"ML prediction error: {e}, falling back to heuristics")
@@ -98,56 +120,147 @@ class ThreatDetector:
         is_threat = threat_score > 0.6
         confidence = threat_score if is_threat else (1 - threat_score)
         
-        return is_threat, round(confidence, 3), round(threat_score, 3)
+        return self._apply_iocs(log, (is_threat, round(confidence, 3), round(threat_score, 3)))
     
-    def _is_suspicious_ip(self, ip: str) -> bool:
-        """Check if IP is suspicious (simplified)"""
-        suspicious_patterns = [
-            '192.168.',  # Internal IPs shouldn't be external threats
-            '10.',
-            '172.16.',
+    def predict_threat_batch(self, logs) -> List[Tuple[bool, float, float]]:
+        """Score many logs at once.
+        
+        Builds one feature matrix and makes a single predict_proba call (or runs
+        the heuristics as array ops). Results match predict_threat row for row.
+        """
+        if not len(logs):
+            return []
+        
+        if self.trained and self.model:
+            try:
+                predictions = self._predict_proba(self._extract_feature_matrix(logs))
+                threat_scores = np.round(predictions[:, 1], 3)
+                confidences = np.round(predictions.max(axis=1), 3)
+                is_threat = predictions[:, 1] > 0.6
+                return [
+                    self._apply_iocs(log, (bool(threat), float(confidence), float(score)))
+                    for log, threat, confidence, score in zip(logs, is_threat, confidences, threat_scores)
+                ]
+            except Exception as e:
+                print(f"ML batch prediction error: {e}, falling back to heuristics")
+        
+        # Same arithmetic as the per-row heuristics, one column at a time
+        base_scores = np.array([self.threat_rules.get(log.event_type, 0.5) for log in logs])
+        severity_weights = np.array([self.severity_weights.get(log.severity, 0.5) for log in logs])
+        suspicious = np.array(self.ip_classifier.suspicious_many([log.source_ip for log in logs]), dtype=bool)
+        failed_login = np.array([log.event_type == EventType.FAILED_LOGIN for log in logs])
+        
+        threat_scores = (base_scores * 0.7) + (severity_weights * 0.3)
+        threat_scores = np.where(suspicious, threat_scores + 0.2, threat_scores)
+        threat_scores = np.where(failed_login, threat_scores + 0.2, threat_scores)
+        threat_scores = np.minimum(threat_scores, 1.0)
+        
+        is_threat = threat_scores > 0.6
+        confidences = np.where(is_threat, threat_scores, 1 - threat_scores)
+        
+        # Python's round() (not np.round) so the values are bit-for-bit the per-row ones
+        return [
+            self._apply_iocs(log, (bool(threat), round(float(confidence), 3), round(float(score), 3)))
+            for log, threat, confidence, score in zip(logs, is_threat, confidences, threat_scores)
         ]
-        return not any(ip.startswith(pattern) for pattern in suspicious_patterns)
     
-    def _extract_features(self, log: SecurityLog) -> List[float]:
-        """Extract numerical features from a log entry for ML prediction."""
-        features = []
+    def _predict_proba(self, X) -> np.ndarray:
+        """Class probabilities - same numbers as model.predict_proba, without its per-call overhead"""
+        if self.forest is not None:
+            return self.forest.predict_proba(X)
+        return self.model.predict_proba(X)
+    
+    def _compile_forest(self):
+        try:
+            self.forest = CompiledForest.from_sklearn(self.model)
+        except Exception as e:
+            print(f"Could not compile model ({e}), predicting through sklearn")
+            self.forest = None
+    
+    def _apply_iocs(self, log, result: Tuple[bool, float, float]) -> Tuple[bool, float, float]:
+        """Raise the score of a log that hits a known threat indicator to that indicator's floor"""
+        matches = self.ioc_matcher.match_log(log)
+        if not matches:
+            return result
+        floor = max(IOC_SCORES.get(match.threat_level, 0.7) for match in matches)
+        if result[2] >= floor:
+            return result
+        is_threat = floor > 0.6
+        confidence = floor if is_threat else (1 - floor)
+        return is_threat, round(confidence, 3), round(floor, 3)
+    
+    def _is_suspicious_ip(self, ip: str) -> bool:
+        """Public (or deny-listed) addresses - internal ones shouldn't be external threats"""
+        return self.ip_classifier.is_suspicious(ip)
+    
+    def _compile_encoders(self):
+        """Turn the fitted LabelEncoders/scaler into plain lookup tables.
         
-        # Encode event type
-        if 'event_type' in self.encoders:
-            try:
-                event_encoded = self.encoders['event_type'].transform([log.event_type.value])[0]
-            except:
-                event_encoded = 0
-        else:
-            event_encoded = 0
-        features.append(event_encoded)
+        LabelEncoder.transform does a sorted search plus input validation per call,
+        which is a lot of work to map one of ten enum values to an int. Tables are
+        keyed by both the enum member and its string value.
+        """
+        self.category_codes = {}
+        for name, enum_cls in (('event_type', EventType), ('severity', SeverityLevel)):
+            table = {}
+            if name in self.encoders:
+                for code, value in enumerate(self.encoders[name].classes_):
+                    table[enum_cls(value)] = code
+                    table[value] = code
+            self.category_codes[name] = table
         
-        # Encode severity
-        if 'severity' in self.encoders:
-            try:
-                severity_encoded = self.encoders['severity'].transform([log.severity.value])[0]
-            except:
-                severity_encoded = 0
+        # StandardScaler columns: threat_score, hour, day_of_week
+        if hasattr(self.scaler, 'mean_'):
+            self.scaler_mean = [float(v) for v in self.scaler.mean_]
+            self.scaler_scale = [float(v) for v in self.scaler.scale_]
         else:
-            severity_encoded = 0
-        features.append(severity_encoded)
-        
-        # Threat score (if available)
-        features.append(log.threat_score if log.threat_score else 0.0)
+            self.scaler_mean = [0.0, 0.0, 0.0]
+            self.scaler_scale = [1.0, 1.0, 1.0]
+    
+    def _prior_score(self, log) -> float:
+        """Rule-based score - same formula the synthetic training data uses for threat_score"""
+        return (self.threat_rules.get(log.event_type, 0.5) * 0.7) + \
+            (self.severity_weights.get(log.severity, 0.5) * 0.3)
+    
+    def _extract_features(self, log: SecurityLog) -> List[float]:
+        """Extract numerical features from a log entry for ML prediction."""
+        mean, scale = self.scaler_mean, self.scaler_scale
         
-        # Hour of day (normalized 0-1)
+        # New logs don't have a score yet - use the rule prior the model was trained on
+        threat_score = log.threat_score if log.threat_score else self._prior_score(log)
         hour = log.timestamp.hour if log.timestamp else 0
-        features.append(hour / 24.0)
-        
-        # Day of week (normalized 0-1)
         day_of_week = log.timestamp.weekday() if log.timestamp else 0
-        features.append(day_of_week / 7.0)
         
-        # Is anomaly flag
-        features.append(1.0 if log.is_anomaly else 0.0)
+        return [
+            self.category_codes['event_type'].get(log.event_type, UNKNOWN_CATEGORY),
+            self.category_codes['severity'].get(log.severity, UNKNOWN_CATEGORY),
+            # Same scaling train_model applies (raw hour/day, not 0-1 fractions)
+            (threat_score - mean[0]) / scale[0],
+            (hour - mean[1]) / scale[1],
+            (day_of_week - mean[2]) / scale[2],
+            1.0 if log.is_anomaly else 0.0,
+        ]
+    
+    def _extract_feature_matrix(self, logs) -> np.ndarray:
+        """Feature matrix for a batch of logs - same columns as _extract_features."""
+        event_codes = self.category_codes['event_type']
+        severity_codes = self.category_codes['severity']
+        
+        threat_scores = np.array([
+            log.threat_score if log.threat_score else self._prior_score(log) for log in logs
+        ], dtype=float)
+        hours = np.array([log.timestamp.hour if log.timestamp else 0 for log in logs], dtype=float)
+        days = np.array([log.timestamp.weekday() if log.timestamp else 0 for log in logs], dtype=float)
+        mean, scale = self.scaler_mean, self.scaler_scale
         
-        return features
+        return np.column_stack([
+            np.array([event_codes.get(log.event_type, UNKNOWN_CATEGORY) for log in logs], dtype=float),
+            np.array([severity_codes.get(log.severity, UNKNOWN_CATEGORY) for log in logs], dtype=float),
+            (threat_scores - mean[0]) / scale[0],
+            (hours - mean[1]) / scale[1],
+            (days - mean[2]) / scale[2],
+            np.array([1.0 if log.is_anomaly else 0.0 for log in logs]),
+        ])
     
     def generate_synthetic_data(self, num_samples: int = 1000) -> pd.DataFrame:
         """Generate synthetic training data for the ML model."""
@@ -243,7 +356,10 @@ class ThreatDetector:
         print(f"  Recall:    {recall:.3f}")
         print(f"  F1 Score:  {f1:.3f}")
         
+        self.trained = True
         self.is_trained = True
+        self._compile_encoders()
+        self._compile_forest()
         self.save_model()
         
         return {
@@ -260,6 +376,8 @@ class ThreatDetector:
                 self.model = joblib.load(self.model_path)
                 self.encoders = joblib.load(self.enc_path)
                 self.scaler = joblib.load(self.scaler_path)
+                self._compile_encoders()
+                self._compile_forest()
                 self.trained = True
                 print("✓ Pre-trained threat detection model loaded")
         except Exception as e:
@@ -11,9 +11,16 @@ from slowapi.errors import RateLimitExceeded
 
 from app.core.config import settings
 from app.api import auth, logs, analytics, alerts
-from app.db.database import engine, Base
+from app.db.database import engine, Base, SessionLocal
 from app.core.websocket_manager import manager
 from app.core.rate_limiter import limiter
+from app.services.rollup_service import RollupService
+from app.db.search import ensure_search_index
+from app.services.partition_service import partition_manager
+from app.services.archive_service import log_archiver
+from app.services.ioc_matcher import ioc_matcher
+from app.services.sketch_service import sketch_store
+from app.services.baselines import baseline_store
 
 # Configure logging
 # TODO: move this to a separate logging config file when we have time
@@ -30,9 +37,31 @@ async def lifespan(app):
     logger.info("Starting Security Dashboard API...")
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables created/verified")
+    db = SessionLocal()
+    try:
+        RollupService.ensure_built(db)
+        sketch_store.ensure_built(db)
+        if ensure_search_index(db):
+            logger.info("Built full-text search index for existing logs")
+        logger.info(f"Loaded {ioc_matcher.load(db)} threat indicators")
+    finally:
+        db.close()
+    logger.info(f"Loaded baselines for {baseline_store.load()} entities")
+    logs.ingest_queue.start()
+    partition_manager.start()
+    log_archiver.start()
+    ioc_matcher.start()
+    sketch_store.start()
+    baseline_store.start()
     yield
     # Shutdown
     logger.info("Shutting down Security Dashboard API...")
+    await baseline_store.stop()
+    await sketch_store.stop()
+    await ioc_matcher.stop()
+    await log_archiver.stop()
+    await partition_manager.stop()
+    await logs.ingest_queue.stop()
 
 
 # Initialize FastAPI app
@@ -55,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -0,0 +1,74 @@
+"""Composite and partial indexes for the dashboard's query shapes
+
+Tables are created by Base.metadata.create_all() (init_db / app startup),
+which this revision takes as its baseline. create_all also builds these
+indexes on fresh databases, so each one is created IF NOT EXISTS, and tables
+that don't exist yet are skipped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # (name, table, columns)
+    ("ix_security_logs_timestamp_is_threat", "security_logs", ["timestamp", "is_threat"]),
+    ("ix_security_logs_source_ip_timestamp", "security_logs", ["source_ip", "timestamp"]),
+    ("ix_security_logs_timestamp_id", "security_logs", ["timestamp", "id"]),
+    ("ix_alerts_status_severity_created_at", "alerts", ["status", "severity", "created_at"]),
+]
+
+
+def upgrade():
+    # On PostgreSQL build without blocking writes (needs to run outside a transaction)
+    postgres = op.get_context().dialect.name == "postgresql"
+    block = op.get_context().autocommit_block() if postgres else nullcontext()
+    tables = _existing_tables()
+
+    with block:
+        for name, table, columns in INDEXES:
+            if table in tables:
+                op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+        if "security_logs" not in tables:
+            return
+
+        # Threat rows only - a small slice of the table that every analytics query wants
+        op.create_index(
+            "ix_security_logs_threats_timestamp",
+            "security_logs",
+            ["timestamp", "event_type", "severity"],
+            postgresql_where=sa.text("is_threat"),
+            sqlite_where=sa.text("is_threat = 1"),
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+        # Refresh planner statistics so the new indexes are considered straight away
+        op.execute("ANALYZE security_logs")
+        if "alerts" in tables:
+            op.execute("ANALYZE alerts")
+
+
+def _existing_tables():
+    if op.get_context().as_sql:
+        # Offline (--sql) mode - assume the baseline schema
+        return {table for _, table, _ in INDEXES}
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def downgrade():
+    op.drop_index("ix_security_logs_threats_timestamp", table_name="security_logs", if_exists=True)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
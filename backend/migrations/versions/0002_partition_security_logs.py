@@ -0,0 +1,151 @@
+"""Range-partition security_logs by day (or week) on PostgreSQL
+
+Rebuilds security_logs as a table partitioned on timestamp:
+- the old table is renamed, its rows copied into the new partitions, and dropped
+- the primary key becomes (id, timestamp) - partitioned tables need the
+  partition key in every unique constraint. The id sequence is kept.
+- alerts.log_id loses its foreign key (PostgreSQL can't reference a partitioned
+  table by id alone). Retention nulls log_id for alerts on dropped partitions.
+- indexes are recreated on the parent table, which builds them on every
+  partition - the set security_logs has as of this revision
+
+The period comes from LOG_PARTITION_INTERVAL. Partitions from the oldest row
+through LOG_PARTITIONS_AHEAD periods out are created here; after that,
+PartitionManager (app/services/partition_service.py) keeps creating them.
+
+SQLite has no partitioning - this revision does nothing there.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+PARENT_TABLE = "security_logs"
+LEGACY_TABLE = "security_logs_unpartitioned"
+
+# security_logs indexes as of this revision (column index=True ones, then 0001's)
+INDEXES = [
+    # (name, columns, where)
+    ("ix_security_logs_id", ["id"], None),
+    ("ix_security_logs_timestamp", ["timestamp"], None),
+    ("ix_security_logs_event_type", ["event_type"], None),
+    ("ix_security_logs_severity", ["severity"], None),
+    ("ix_security_logs_username", ["username"], None),
+    ("ix_security_logs_timestamp_is_threat", ["timestamp", "is_threat"], None),
+    ("ix_security_logs_source_ip_timestamp", ["source_ip", "timestamp"], None),
+    ("ix_security_logs_timestamp_id", ["timestamp", "id"], None),
+    ("ix_security_logs_threats_timestamp", ["timestamp", "event_type", "severity"], "is_threat"),
+]
+
+
+# Partition bounds - same names and ranges PartitionManager uses
+def _period_start(ts: datetime, interval: str) -> datetime:
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _period_end(start: datetime, interval: str) -> datetime:
+    return start + timedelta(days=7 if interval == "week" else 1)
+
+
+def _create_partition_sql(start: datetime, interval: str) -> str:
+    end = _period_end(start, interval)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {PARENT_TABLE}_p{start:%Y%m%d} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+
+
+def _is_partitioned(conn) -> bool:
+    if op.get_context().as_sql:
+        # Offline (--sql) mode can't look - assume the state before this revision
+        return False
+    return conn.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name"
+    ), {"name": PARENT_TABLE}).first() is not None
+
+
+def _create_indexes():
+    for name, columns, where in INDEXES:
+        op.create_index(name, PARENT_TABLE, columns, postgresql_where=sa.text(where) if where else None)
+
+
+def upgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    conn = op.get_bind()
+    if _is_partitioned(conn):
+        return
+
+    interval = settings.LOG_PARTITION_INTERVAL
+
+    op.execute("ALTER TABLE alerts DROP CONSTRAINT IF EXISTS alerts_log_id_fkey")
+    op.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}")
+    # The sequence would be dropped along with the old table otherwise
+    op.execute("ALTER SEQUENCE security_logs_id_seq OWNED BY NONE")
+    # Range partitions can't hold NULL keys
+    op.execute(f"UPDATE {LEGACY_TABLE} SET timestamp = (now() AT TIME ZONE 'utc') WHERE timestamp IS NULL")
+
+    op.execute(
+        f"CREATE TABLE {PARENT_TABLE} "
+        f"(LIKE {LEGACY_TABLE} INCLUDING DEFAULTS, PRIMARY KEY (id, timestamp)) "
+        f"PARTITION BY RANGE (timestamp)"
+    )
+    op.execute(f"ALTER SEQUENCE security_logs_id_seq OWNED BY {PARENT_TABLE}.id")
+
+    oldest = None
+    if not op.get_context().as_sql:
+        oldest = conn.execute(sa.text(f"SELECT min(timestamp) FROM {LEGACY_TABLE}")).scalar()
+    now = datetime.utcnow()
+    start = _period_start(min(oldest or now, now), interval)
+    last = _period_start(now, interval)
+    for _ in range(settings.LOG_PARTITIONS_AHEAD):
+        last = _period_end(last, interval)
+    while start <= last:
+        op.execute(_create_partition_sql(start, interval))
+        start = _period_end(start, interval)
+
+    op.execute(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {LEGACY_TABLE}")
+    op.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    # Build indexes after the copy - much faster than maintaining them row by row
+    _create_indexes()
+    op.execute(f"ANALYZE {PARENT_TABLE}")
+
+
+def downgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    conn = op.get_bind()
+    if not op.get_context().as_sql and not _is_partitioned(conn):
+        return
+
+    op.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}")
+    op.execute("ALTER SEQUENCE security_logs_id_seq OWNED BY NONE")
+    op.execute(f"CREATE TABLE {PARENT_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS, PRIMARY KEY (id))")
+    op.execute(f"ALTER SEQUENCE security_logs_id_seq OWNED BY {PARENT_TABLE}.id")
+    op.execute(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {LEGACY_TABLE}")
+    # Drops every partition too
+    op.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    _create_indexes()
+    op.execute(f"UPDATE alerts SET log_id = NULL WHERE log_id NOT IN (SELECT id FROM {PARENT_TABLE})")
+    op.execute(
+        f"ALTER TABLE alerts ADD CONSTRAINT alerts_log_id_fkey "
+        f"FOREIGN KEY (log_id) REFERENCES {PARENT_TABLE} (id)"
+    )
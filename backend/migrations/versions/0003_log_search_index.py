@@ -0,0 +1,100 @@
+"""Full-text search index over security_logs.description and raw_log
+
+PostgreSQL: GIN index on the to_tsvector expression app/db/search.py queries
+with (built CONCURRENTLY unless security_logs is partitioned - partitioned
+tables don't support it).
+SQLite: external-content FTS5 table plus the triggers that keep it current,
+filled from the existing rows.
+
+The DDL is written out as it stands at this revision, not taken from the app.
+
+create_all builds both on fresh databases, so everything is IF NOT EXISTS.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_security_logs_search"
+FTS_TABLE = "security_logs_fts"
+
+SEARCH_DOCUMENT = (
+    "to_tsvector('english'::regconfig, (coalesce(description, '') || ' ') || coalesce(raw_log, ''))"
+)
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "description, raw_log, content='security_logs', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description, raw_log) VALUES (new.id, new.description, new.raw_log); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, raw_log) "
+    "VALUES ('delete', old.id, old.description, old.raw_log); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, raw_log ON security_logs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, raw_log) "
+    "VALUES ('delete', old.id, old.description, old.raw_log); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description, raw_log) VALUES (new.id, new.description, new.raw_log); "
+    "END",
+]
+
+
+def _has_logs_table() -> bool:
+    if op.get_context().as_sql:
+        return True
+    return "security_logs" in sa.inspect(op.get_bind()).get_table_names()
+
+
+def _is_partitioned() -> bool:
+    if op.get_context().as_sql:
+        return False
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'security_logs'"
+    )).first() is not None
+
+
+def upgrade():
+    if not _has_logs_table():
+        return
+    dialect = op.get_context().dialect.name
+
+    if dialect == "postgresql":
+        concurrently = not _is_partitioned()
+        block = op.get_context().autocommit_block() if concurrently else nullcontext()
+        with block:
+            op.create_index(
+                INDEX_NAME,
+                "security_logs",
+                [sa.text(SEARCH_DOCUMENT)],
+                postgresql_using="gin",
+                postgresql_concurrently=concurrently,
+                if_not_exists=True,
+            )
+    elif dialect == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == "postgresql":
+        op.drop_index(INDEX_NAME, table_name="security_logs", if_exists=True)
+    elif dialect == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
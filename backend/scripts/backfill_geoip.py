@@ -0,0 +1,23 @@
+"""
+Script to fill in country/city for stored security logs from the GeoIP
+database (e.g. after installing or updating GEOIP_DB_PATH)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.geoip import geo_resolver, backfill_geo
+
+
+if __name__ == "__main__":
+    if not geo_resolver.available:
+        print(f"✗ No GeoIP database at {settings.GEOIP_DB_PATH} - build one with scripts/build_geoip_db.py")
+        sys.exit(1)
+    db = SessionLocal()
+    try:
+        count = backfill_geo(db, geo_resolver)
+        print(f"✓ Resolved locations for {count} logs")
+    finally:
+        db.close()
@@ -0,0 +1,97 @@
+"""
+Benchmark for the compiled forest - predict_proba latency through sklearn and
+through the flattened NumPy arrays, for single events and batches, and a check
+that both give the same probabilities bit for bit
+
+Rows are timed as they come at ingest (a batch shares one timestamp) and as
+historical logs spread over a week. Trains the threat model first if there
+isn't one saved (like train_model.py).
+
+Usage: python scripts/benchmark_forest.py [--batches 1,10,100,1000,5000] [--repeat 20]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.db.models import SecurityLog, EventType, SeverityLevel
+from app.services.forest import CompiledForest
+from app.services.log_generator import LogGenerator
+from app.services.threat_detector import ThreatDetector
+
+
+def best_of(fn, X, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batches", default="1,10,100,1000,5000", help="batch sizes to time")
+    parser.add_argument("--repeat", type=int, default=20, help="timings per size (best is reported)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.batches.split(",")]
+    random.seed(5)
+    # Plain arrays have no feature names - sklearn warns on every call otherwise
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    detector = ThreatDetector()
+    if not detector.trained:
+        detector.train_model(num_samples=10000)
+    model = detector.model
+
+    generator = LogGenerator()
+    now = datetime.utcnow()
+    scenarios = {}
+    for name, spread in (("ingest", 0), ("7 days", 7 * 86400)):
+        logs = []
+        for _ in range(max(sizes)):
+            data = generator.generate_log()
+            logs.append(SecurityLog(
+                event_type=EventType(data['event_type']),
+                severity=SeverityLevel(data['severity']),
+                source_ip=data.get('source_ip'),
+                timestamp=now - timedelta(seconds=random.randint(0, spread)),
+                is_anomaly=random.random() > 0.95
+            ))
+        scenarios[name] = detector._extract_feature_matrix(logs)
+
+    began = time.perf_counter()
+    forest = CompiledForest.from_sklearn(model)
+    print(f"Compiled {forest.n_trees} trees, {len(forest.feature):,} nodes, depth {forest.depth} "
+          f"in {(time.perf_counter() - began) * 1e3:.1f} ms")
+
+    n_jobs = model.n_jobs
+    identical = True
+    for name, X in scenarios.items():
+        model.set_params(n_jobs=1)
+        identical &= np.array_equal(forest.predict_proba(X), model.predict_proba(X))
+        identical &= all(np.array_equal(forest.predict_proba(row), model.predict_proba(row[None, :])) for row in X[:200])
+        model.set_params(n_jobs=n_jobs)
+
+        print(f"\n  {name:<8}{'rows':>6}  {'sklearn (n_jobs=' + str(n_jobs) + ')':>20}  {'compiled':>12}  {'speedup':>8}")
+        for size in sizes:
+            batch = X[:size]
+            sklearn_time = best_of(model.predict_proba, batch, args.repeat)
+            compiled_time = best_of(forest.predict_proba, batch, args.repeat)
+            print(f"  {'':<8}{size:>6}  {sklearn_time * 1e3:>17.3f} ms  {compiled_time * 1e3:>9.3f} ms  "
+                  f"{sklearn_time / compiled_time:>7.1f}x")
+
+    rows = sum(len(X) for X in scenarios.values())
+    print(f"\n{'✓' if identical else '✗'} probabilities bit-identical to sklearn on {rows:,} rows")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for the IOC matcher - build time, memory and lookup throughput
+with a large indicator set
+
+Usage: python scripts/benchmark_ioc_matcher.py [--indicators 1000000] [--lookups 200000]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import resource
+import time
+
+from app.db.models import SecurityLog, EventType
+from app.services.ioc_matcher import IOCMatcher
+
+TLDS = ["com", "net", "org", "ru", "xyz", "top", "info", "io"]
+
+
+def random_ip(rng):
+    return ".".join(str(rng.randint(1, 254)) for _ in range(4))
+
+
+def random_domain(rng):
+    labels = rng.randint(1, 2)
+    name = ".".join("".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=rng.randint(5, 12)))
+                    for _ in range(labels))
+    return f"{name}.{rng.choice(TLDS)}"
+
+
+def build_indicators(count, rng):
+    """40% IPs, 10% CIDR ranges, 35% domains, 15% hashes"""
+    indicators = []
+    for i in range(count):
+        kind = i % 20
+        if kind < 8:
+            indicators.append(("ip", random_ip(rng)))
+        elif kind < 10:
+            indicators.append(("cidr", f"{random_ip(rng)}/{rng.choice([20, 24, 24, 28])}"))
+        elif kind < 17:
+            indicators.append(("domain", random_domain(rng)))
+        else:
+            indicators.append(("hash", "%032x" % rng.getrandbits(128)))
+    return indicators
+
+
+def timed(label, count, fn):
+    began = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - began
+    print(f"  {label:<28} {count / elapsed:>12,.0f}/s  ({elapsed * 1e6 / count:.2f} µs each)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--indicators", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"Generating {args.indicators:,} indicators...")
+    indicators = build_indicators(args.indicators, rng)
+    known_ips = [value for kind, value in indicators if kind == "ip"]
+    known_domains = [value for kind, value in indicators if kind == "domain"]
+
+    matcher = IOCMatcher()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.perf_counter()
+    for kind, value in indicators:
+        matcher.add(kind, value)
+    build = time.perf_counter() - began
+    # ru_maxrss is in KiB on Linux - a rough figure for the matcher's footprint
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    print(f"\nBuilt in {build:.2f}s, {len(matcher):,} entries, ~{grown / 1024:.0f} MiB peak RSS growth")
+
+    n = args.lookups
+    random_ips = [random_ip(rng) for _ in range(n)]
+    hit_ips = [rng.choice(known_ips) for _ in range(n)]
+    subdomains = [f"www.{rng.choice(known_domains)}" for _ in range(n)]
+    misses = [random_domain(rng) for _ in range(n)]
+    logs = [
+        SecurityLog(
+            event_type=EventType.NETWORK_ANOMALY,
+            source_ip=random_ips[i],
+            destination_ip=hit_ips[i] if i % 10 == 0 else random_ips[-i],
+            raw_log=f"conn {random_ips[i]} -> {subdomains[i] if i % 10 == 0 else misses[i]} "
+                    f"sha={rng.getrandbits(128):032x} status=200"
+        )
+        for i in range(min(n, 50000))
+    ]
+
+    print(f"\nLookups ({n:,} each):")
+    timed("IP (mostly misses)", n, lambda: [matcher.match_ip(ip) for ip in random_ips])
+    timed("IP (hits)", n, lambda: [matcher.match_ip(ip) for ip in hit_ips])
+    timed("domain suffix (hits)", n, lambda: [matcher.match_domain(d) for d in subdomains])
+    timed("domain (misses)", n, lambda: [matcher.match_domain(d) for d in misses])
+    hits = timed("full log (IPs + raw_log)", len(logs), lambda: [matcher.match_log(log) for log in logs])
+    print(f"\n{sum(1 for h in hits if h):,} of {len(logs):,} logs matched an indicator")
+
+
+if __name__ == "__main__":
+    main()
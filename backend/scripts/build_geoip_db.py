@@ -0,0 +1,39 @@
+"""
+Script to build the GeoIP range database (GEOIP_DB_PATH) from a CSV of IP ranges,
+e.g. the free DB-IP "IP to City Lite" download
+
+Usage: python scripts/build_geoip_db.py ranges.csv [--country-col 3] [--city-col 5] [--output PATH]
+Columns are 0-based; the first two are always the range's start and end IP.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import gzip
+
+from app.core.config import settings
+from app.services.geoip import build_database
+
+
+def read_ranges(path, country_col, city_col):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) <= max(country_col, city_col) or row[0].startswith("#"):
+                continue
+            yield row[0], row[1], row[country_col] or None, row[city_col] or None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv")
+    parser.add_argument("--country-col", type=int, default=3)
+    parser.add_argument("--city-col", type=int, default=5)
+    parser.add_argument("--output", default=settings.GEOIP_DB_PATH)
+    args = parser.parse_args()
+
+    count = build_database(read_ranges(args.csv, args.country_col, args.city_col), args.output)
+    print(f"✓ Wrote {count} ranges to {args.output}")
+    print("  Restart the API to pick it up, then run scripts/backfill_geoip.py for existing logs")
@@ -63,7 +63,15 @@ def generate_sample_logs(db):
     logs_data = log_gen.generate_realistic_timeline(days=7)
     
     from app.services.threat_detector import ThreatDetector
+    from app.services.ioc_matcher import ioc_matcher
+    from app.services.geoip import geo_resolver
+    from app.services.baselines import baseline_store
+    from app.services.partition_service import partition_manager
+    # Score against the indicators created above
+    ioc_matcher.load(db)
     detector = ThreatDetector()
+    # The sample logs go back a week - a partitioned table needs somewhere to put them
+    partition_manager.ensure_backfill(db, min(datetime.fromisoformat(log['timestamp']) for log in logs_data))
     
     for log_data in logs_data:
         # Convert timestamp string to datetime
@@ -87,13 +95,34 @@ def generate_sample_logs(db):
         log.is_threat = is_threat
         log.confidence_score = confidence
         log.threat_score = threat_score
-        log.is_anomaly = threat_score > 0.7
+        # Logs come oldest first, so each is scored against the history before it
+        log.is_anomaly = baseline_store.is_anomaly(timestamp, log.username, log.source_ip)
+        log.country, log.city = geo_resolver.lookup(log.source_ip)
         
         db.add(log)
     
     db.commit()
+    baseline_store.snapshot()
     print(f"✓ Generated {len(logs_data)} sample logs")
 
+def build_rollups(db):
+    """Aggregate the sample logs into the analytics rollup tables"""
+    print("Building analytics rollups...")
+    
+    from app.services.rollup_service import RollupService
+    count = RollupService.rebuild(db)
+    
+    print(f"✓ Rolled up {count} logs")
+
+def build_sketches(db):
+    """Build the top-IP and distinct-count sketches for the sample logs"""
+    print("Building log sketches...")
+    
+    from app.services.sketch_service import sketch_store
+    count = sketch_store.rebuild(db)
+    
+    print(f"✓ Sketched {count} logs")
+
 def create_sample_alerts(db):
     """Create sample alerts from threat logs"""
     print("Creating sample alerts...")
@@ -160,9 +189,11 @@ def main():
     try:
         create_tables()
         create_default_users(db)
+        create_threat_indicators(db)
         generate_sample_logs(db)
+        build_rollups(db)
+        build_sketches(db)
         create_sample_alerts(db)
-        create_threat_indicators(db)
         
         print("\n" + "="*50)
         print("✓ Database initialization complete!")
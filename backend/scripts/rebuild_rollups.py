@@ -0,0 +1,20 @@
+"""
+Script to rebuild the hourly/daily analytics rollups from security_logs
+(e.g. after bulk edits made directly in the database)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.database import SessionLocal, engine, Base
+from app.services.rollup_service import RollupService
+
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        count = RollupService.rebuild(db)
+        print(f"✓ Rolled up {count} logs")
+    finally:
+        db.close()
@@ -0,0 +1,21 @@
+"""
+Script to rebuild the top source IP and distinct-count sketches from
+security_logs and the log archive (e.g. after changing SKETCH_TOP_K or
+SKETCH_HLL_PRECISION - sketches of different shapes don't merge)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.database import SessionLocal, engine, Base
+from app.services.sketch_service import sketch_store
+
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        count = sketch_store.rebuild(db)
+        print(f"✓ Sketched {count} logs")
+    finally:
+        db.close()
@@ -0,0 +1,66 @@
+"""
+Script to re-run threat detection over stored security logs
+(e.g. after retraining the model)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import select, update
+
+from app.db.database import SessionLocal
+from app.db.models import SecurityLog
+from app.services.threat_detector import ThreatDetector
+from app.services.ioc_matcher import ioc_matcher
+from app.services.rollup_service import RollupService
+
+CHUNK_SIZE = 5000
+
+
+def rescore_logs(db, detector):
+    """Score logs chunk by chunk and write the results back with bulk UPDATEs"""
+    total = 0
+    last_id = 0
+
+    while True:
+        logs = db.scalars(
+            select(SecurityLog)
+            .where(SecurityLog.id > last_id)
+            .order_by(SecurityLog.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not logs:
+            break
+
+        scores = detector.predict_threat_batch(logs)
+        db.execute(update(SecurityLog), [
+            {
+                "id": log.id,
+                "is_threat": is_threat,
+                "confidence_score": confidence,
+                "threat_score": threat_score,
+            }
+            for log, (is_threat, confidence, threat_score) in zip(logs, scores)
+        ])
+
+        last_id = logs[-1].id
+        total += len(logs)
+
+        db.commit()
+        db.expunge_all()
+        print(f"  rescored {total} logs...")
+
+    return total
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        ioc_matcher.load(db)
+        count = rescore_logs(db, ThreatDetector())
+        print(f"✓ Rescored {count} logs")
+        # Threat counts and score sums in the rollups are stale now
+        RollupService.rebuild(db)
+        print("✓ Rebuilt analytics rollups")
+    finally:
+        db.close()
@@ -22,6 +22,25 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_caches(tmp_path):
+    """In-process caches outlive the per-test database - start each test clean."""
+    from app.services.count_service import log_count_cache
+    from app.core.snapshot import snapshot_store
+    from app.core.response_cache import response_cache
+    from app.services.correlation import correlation_engine
+    from app.services.sketch_service import sketch_store
+    from app.services.baselines import baseline_store
+    log_count_cache.clear()
+    correlation_engine.clear()
+    sketch_store.clear()
+    baseline_store.clear()
+    baseline_store.snapshot_path = str(tmp_path / "baselines.npz")
+    snapshot_store.invalidate()
+    response_cache.clear()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database session for each test."""
@@ -34,6 +53,12 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def session_factory(db_session):
+    """Session factory bound to the test database (for background workers)."""
+    return TestingSessionLocal
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client with dependency override."""
@@ -71,3 +96,15 @@ def test_log_data():
         "description": "Failed login attempt",
         "username": "testuser"
     }
+
+
+@pytest.fixture
+def auth_headers(client, test_user_data):
+    """Register + login the test user and return bearer auth headers."""
+    client.post("/api/auth/register", json=test_user_data)
+    login_response = client.post("/api/auth/login", data={
+        "username": test_user_data["username"],
+        "password": test_user_data["password"]
+    })
+    token = login_response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,26 @@
+"""Tests for alerts endpoints."""
+from fastapi import status
+
+
+def test_alerts_cursor_pagination(client, auth_headers, test_log_data):
+    """Test alerts can be paged with the X-Next-Cursor header."""
+    log_id = client.post("/api/logs/", json=test_log_data, headers=auth_headers).json()["id"]
+    for i in range(3):
+        client.post("/api/alerts/", json={
+            "log_id": log_id,
+            "title": f"Alert {i}",
+            "severity": "high"
+        }, headers=auth_headers)
+    
+    first = client.get("/api/alerts/?limit=2", headers=auth_headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert len(first.json()) == 2
+    cursor = first.headers["X-Next-Cursor"]
+    
+    second = client.get(f"/api/alerts/?limit=2&cursor={cursor}", headers=auth_headers)
+    assert len(second.json()) == 1
+    assert "X-Next-Cursor" not in second.headers
+    
+    ids = [a["id"] for a in first.json() + second.json()]
+    assert sorted(ids, reverse=True) == ids
+    assert len(set(ids)) == 3
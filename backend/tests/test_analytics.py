@@ -0,0 +1,232 @@
+"""Tests for analytics endpoints."""
+import random
+import pytest
+from fastapi import status
+from datetime import datetime, timedelta
+
+from app.db.models import SecurityLog, User, EventType, SeverityLevel
+from app.services.rollup_service import RollupService
+
+
+@pytest.fixture
+def spread_logs(db_session):
+    """Logs at random times over the last 10 days, rolled up like init_db does."""
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    for _ in range(300):
+        db_session.add(SecurityLog(
+            timestamp=now - timedelta(seconds=rng.randint(0, 10 * 24 * 3600)),
+            event_type=rng.choice(list(EventType)),
+            severity=rng.choice(list(SeverityLevel)),
+            source_ip=f"10.0.0.{rng.randint(1, 5)}",
+            is_threat=rng.random() < 0.3,
+            threat_score=rng.random()
+        ))
+    db_session.commit()
+    RollupService.rebuild(db_session)
+
+
+def _raw_statistics(db_session, days):
+    start = datetime.utcnow() - timedelta(days=days)
+    logs = db_session.query(SecurityLog).filter(SecurityLog.timestamp >= start).all()
+    threats = [log for log in logs if log.is_threat]
+    by_severity, by_type, by_date = {}, {}, {}
+    for log in threats:
+        by_severity[log.severity.value] = by_severity.get(log.severity.value, 0) + 1
+        by_type[log.event_type.value] = by_type.get(log.event_type.value, 0) + 1
+    for log in logs:
+        date = log.timestamp.strftime("%Y-%m-%d")
+        by_date[date] = by_date.get(date, 0) + 1
+    return len(logs), len(threats), by_severity, by_type, by_date
+
+
+def test_statistics_match_raw_counts(client, auth_headers, db_session, spread_logs, test_log_data):
+    """Test rollup-backed statistics agree with a full scan, including API writes."""
+    created = client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    assert created.status_code == status.HTTP_200_OK
+    client.post("/api/logs/bulk", json=[test_log_data] * 3, headers=auth_headers)
+
+    for days in (1, 3, 7):
+        response = client.get(f"/api/analytics/statistics?days={days}", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+
+        total, threats, by_severity, by_type, by_date = _raw_statistics(db_session, days)
+        assert data["total_events"] == total
+        assert data["total_threats"] == threats
+        assert data["threat_by_severity"] == by_severity
+        assert data["threat_by_type"] == by_type
+        for point in data["timeline"][1:]:
+            # The first day of the window is only partially covered
+            assert point["count"] == by_date.get(point["date"], 0)
+
+
+def test_trends_match_raw_counts(client, auth_headers, db_session, spread_logs):
+    """Test rollup-backed hourly trends agree with a full scan."""
+    response = client.get("/api/analytics/trends?hours=72", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    trends = response.json()["hourly_trends"]
+
+    start = datetime.utcnow() - timedelta(hours=72)
+    logs = db_session.query(SecurityLog).filter(SecurityLog.timestamp >= start).all()
+    expected = {}
+    for log in logs:
+        counts = expected.setdefault(log.timestamp.strftime("%Y-%m-%d %H:00"), [0, 0])
+        counts[0] += 1
+        counts[1] += int(log.is_threat)
+    for point in trends:
+        assert [point["total"], point["threats"]] == expected.get(point["hour"], [0, 0])
+
+
+def test_rollups_follow_deletes(client, auth_headers, db_session, test_log_data):
+    """Test deleting a log takes it out of the rollups."""
+    log_id = client.post("/api/logs/", json=test_log_data, headers=auth_headers).json()["id"]
+    before = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert before["total_events"] == 1
+
+    # Only admins can delete
+    db_session.query(User).update({"is_admin": True})
+    db_session.commit()
+    client.delete(f"/api/logs/{log_id}", headers=auth_headers)
+
+    after = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert after["total_events"] == 0
+    assert sum(point["count"] for point in after["timeline"]) == 0
+
+
+def test_dashboard_summary_counts(client, auth_headers, test_log_data):
+    """Test dashboard counters from the single-pass aggregates."""
+    threat = dict(test_log_data, event_type="malware_detected", severity="critical")
+    log_id = client.post("/api/logs/", json=threat, headers=auth_headers).json()["id"]
+    client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    client.post("/api/alerts/", json={"log_id": log_id, "title": "Malware", "severity": "critical"},
+                headers=auth_headers)
+    client.post("/api/alerts/", json={"log_id": log_id, "title": "Other", "severity": "low"},
+                headers=auth_headers)
+
+    response = client.get("/api/analytics/dashboard", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_logs"] == 2
+    assert data["total_alerts"] == 2
+    assert data["critical_alerts"] == 1
+    assert len(data["recent_logs"]) == 2
+    assert len(data["recent_alerts"]) == 2
+
+
+def test_snapshot_store_coalesces_concurrent_requests():
+    """Test concurrent callers share one computation, then the cached snapshot."""
+    import asyncio
+    from app.core.snapshot import SnapshotStore
+
+    store = SnapshotStore()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": len(calls)}
+
+    async def run():
+        results = await asyncio.gather(*(store.get_or_compute("k", 60, compute) for _ in range(10)))
+        cached = await store.get_or_compute("k", 60, compute)
+        return results, cached
+
+    results, cached = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {"value": 1} for result in results)
+    assert cached == {"value": 1}
+    assert store.coalesced == 9
+    assert store.hits == 1
+
+
+def test_statistics_cached_until_new_log(client, auth_headers, db_session, test_log_data):
+    """Test cached statistics survive direct DB writes but not API writes."""
+    client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    first = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert first["total_events"] == 1
+
+    # Written behind the API's back - the cached response is still served
+    RollupService.apply(db_session, [{
+        "timestamp": datetime.utcnow(), "event_type": "failed_login", "severity": "low",
+        "is_threat": False, "threat_score": 0.0
+    }])
+    db_session.commit()
+    cached = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert cached["total_events"] == 1
+
+    # A write through the API bumps the logs version
+    client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    fresh = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert fresh["total_events"] == 3
+
+
+def test_response_cache_stale_while_revalidate(session_factory):
+    """Test an invalidated entry is served stale once while it is refreshed."""
+    import asyncio
+    from app.core.response_cache import ResponseCache
+
+    class NoRedis:
+        enabled = False
+
+    cache = ResponseCache(redis=NoRedis(), session_factory=session_factory, stale_seconds=60)
+    calls = []
+
+    def compute(db):
+        calls.append(1)
+        return {"value": len(calls)}
+
+    async def run():
+        db = session_factory()
+        try:
+            first = await cache.get_or_compute("stats", {"days": 1}, ("logs",), 30, compute, db)
+            cache.bump("logs")
+            stale = await cache.get_or_compute("stats", {"days": 1}, ("logs",), 30, compute, db)
+            await asyncio.sleep(0.05)  # let the background refresh finish
+            fresh = await cache.get_or_compute("stats", {"days": 1}, ("logs",), 30, compute, db)
+            return first, stale, fresh
+        finally:
+            db.close()
+
+    first, stale, fresh = asyncio.run(run())
+    assert first == {"value": 1}
+    assert stale == {"value": 1}
+    assert fresh == {"value": 2}
+    assert len(calls) == 2
+    assert cache.stale_hits == 1
+
+
+@pytest.mark.parametrize("interval,tz", [
+    ("1m", "UTC"), ("5m", "UTC"), ("1d", "UTC"),
+    ("1h", "Asia/Kolkata"), ("1d", "America/New_York"), ("15m", "Australia/Adelaide"),
+])
+def test_bucket_counts_match_raw(db_session, spread_logs, interval, tz):
+    """Test bucketed counts (incl. non-UTC zones) agree with bucketing in Python."""
+    from zoneinfo import ZoneInfo
+    from app.db.time_buckets import BUCKET_WIDTHS, bucket_counts, floor_local
+
+    start = datetime.utcnow() - timedelta(days=5)
+    counts = bucket_counts(db_session, start, interval, tz)
+
+    expected = {}
+    for log in db_session.query(SecurityLog).filter(SecurityLog.timestamp >= start):
+        bucket = floor_local(log.timestamp, BUCKET_WIDTHS[interval], ZoneInfo(tz))
+        total, threats = expected.get(bucket, (0, 0))
+        expected[bucket] = (total + 1, threats + int(log.is_threat))
+    assert counts == expected
+
+
+def test_trends_custom_interval(client, auth_headers, db_session, spread_logs):
+    """Test trends with a non-default interval/tz and tz validation."""
+    response = client.get("/api/analytics/trends?hours=6&interval=5m&tz=Europe/Paris", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["interval"] == "5m"
+    assert len(data["hourly_trends"]) in (72, 73)
+
+    start = datetime.utcnow() - timedelta(hours=6)
+    assert sum(point["total"] for point in data["hourly_trends"]) == \
+        db_session.query(SecurityLog).filter(SecurityLog.timestamp >= start).count()
+
+    bad = client.get("/api/analytics/trends?tz=Mars/Olympus", headers=auth_headers)
+    assert bad.status_code == status.HTTP_400_BAD_REQUEST
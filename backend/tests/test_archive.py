@@ -0,0 +1,122 @@
+"""Tests for the cold log archive."""
+import pytest
+from datetime import datetime, timedelta
+
+from app.db.models import SecurityLog, EventType, SeverityLevel
+from app.services.archive_service import LogArchiver, segment_store
+from app.services.rollup_service import RollupService
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_store, "directory", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def aged_logs(db_session):
+    """One log per day for the last 10 days, alternating threat/non-threat."""
+    # Midday yesterday, so archive cutoffs (whole days) land in a known place
+    now = (datetime.utcnow() - timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago in range(10):
+        db_session.add(SecurityLog(
+            timestamp=now - timedelta(days=days_ago, hours=1),
+            event_type=EventType.MALWARE_DETECTED if days_ago % 2 else EventType.FAILED_LOGIN,
+            severity=SeverityLevel.HIGH, is_threat=bool(days_ago % 2), threat_score=0.5,
+            source_ip=f"10.0.0.{days_ago}"
+        ))
+    db_session.commit()
+    RollupService.rebuild(db_session)
+    return now
+
+
+def test_archive_moves_old_logs_and_listing_merges_them(client, auth_headers, db_session, session_factory,
+                                                        archive_dir, aged_logs):
+    """Test archived logs leave the table but still show up in listings and exports."""
+    old_log = db_session.query(SecurityLog).order_by(SecurityLog.timestamp).first()
+    client.post("/api/alerts/", json={"log_id": old_log.id, "title": "Keep", "severity": "high"},
+                headers=auth_headers)
+
+    archiver = LogArchiver(session_factory=session_factory, after_days=4, segment_rows=2)
+    result = archiver.run_once(now=aged_logs)
+    # Days 5..9 are before the cutoff day, minus the one an alert points at
+    assert result["archived_rows"] == 4
+    assert result["segments"] == 2
+    assert len(list(archive_dir.glob("*.parquet"))) == 2
+
+    db_session.expire_all()
+    assert db_session.query(SecurityLog).count() == 6
+    assert db_session.get(SecurityLog, old_log.id) is not None
+
+    # Default window only sees the database rows near the top...
+    page = client.get("/api/logs/?limit=3", headers=auth_headers).json()
+    assert page["total"] == 10
+    assert [log["source_ip"] for log in page["logs"]] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+
+    # ...a date range reaching back merges archived rows in order
+    start = (aged_logs - timedelta(days=8)).isoformat()
+    seen, cursor = [], None
+    while True:
+        params = {"start_date": start, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/logs/", params=params, headers=auth_headers).json()
+        assert page["total"] == 8
+        seen += [log["source_ip"] for log in page["logs"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"10.0.0.{i}" for i in range(8)]
+
+    threats = client.get("/api/logs/", params={"start_date": start, "is_threat": True, "skip": 2},
+                         headers=auth_headers).json()
+    assert threats["total"] == 4
+    assert [log["source_ip"] for log in threats["logs"]] == ["10.0.0.5", "10.0.0.7"]
+
+    csv = client.get("/api/logs/export/csv", params={"start_date": start}, headers=auth_headers).text
+    assert len(csv.strip().splitlines()) == 1 + 8
+    assert "10.0.0.7" in csv
+
+    # Analytics still count archived logs, also after a rebuild
+    RollupService.rebuild(db_session)
+    stats = client.get("/api/analytics/statistics?days=30", headers=auth_headers).json()
+    assert stats["total_events"] == 10
+
+
+def test_archive_retention_drops_expired_segments(client, auth_headers, db_session, session_factory,
+                                                  archive_dir, aged_logs):
+    """Test segments past retention are deleted and leave the rollups."""
+    archiver = LogArchiver(session_factory=session_factory, after_days=2, segment_rows=3, retention_days=6)
+    archiver.archive_before(db_session, aged_logs - timedelta(days=2))
+    assert len(segment_store.segments()) == 3
+
+    result = archiver.run_once(now=aged_logs)
+    # Only the segment of days 7..9 is wholly past retention
+    assert result["dropped_segments"] == 1
+    assert len(segment_store.segments()) == 2
+
+    stats = client.get("/api/analytics/statistics?days=30", headers=auth_headers).json()
+    assert stats["total_events"] == 7
+
+
+def test_segment_reads_newest_rows_in_chunks(tmp_path):
+    """Test a large segment yields only the newest rows for a page and streams exports newest first."""
+    from app.services.archive_service import SegmentStore, segment_schema
+    store = SegmentStore(str(tmp_path))
+    start = datetime(2026, 1, 1)
+    rows = [{field.name: None for field in segment_schema()} for _ in range(2500)]
+    for i, row in enumerate(rows):
+        row.update(id=i + 1, timestamp=start + timedelta(seconds=i), event_type=EventType.FAILED_LOGIN,
+                   severity=SeverityLevel.LOW, is_threat=i % 2 == 0)
+    store.write_segment(rows)
+
+    logs = store.read_logs(limit=3)
+    assert [log.id for log in logs] == [2500, 2499, 2498]
+    threats = store.read_logs(limit=2, is_threat=True)
+    assert [log.id for log in threats] == [2499, 2497]
+
+    chunks = list(store.iter_chunks(["id", "event_type"], chunk_size=1000))
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    ids = [row[0] for chunk in chunks for row in chunk]
+    assert ids == list(range(2500, 0, -1))
+    assert chunks[0][0][1] is EventType.FAILED_LOGIN
@@ -0,0 +1,104 @@
+"""Tests for the per-entity behavioural baselines."""
+from datetime import datetime, timedelta
+
+from app.services.baselines import BaselineStore, BYTES_PER_ENTITY, WAYS
+from app.api.logs import ingest_service
+
+
+def _store(**kwargs):
+    return BaselineStore(**dict({"memory_mb": 1, "snapshot_path": ""}, **kwargs))
+
+
+def test_rate_burst_is_anomalous():
+    """Test steady activity stays normal and a sudden burst stands out."""
+    store = _store()
+    start = datetime(2024, 1, 1)
+    steady = [store.observe(start + timedelta(minutes=10 * i), "alice", None) for i in range(288)]
+    assert max(steady[20:]) < 0.5
+
+    burst_start = start + timedelta(days=2)
+    burst = [store.is_anomaly(burst_start + timedelta(seconds=2 * i), "alice", None) for i in range(30)]
+    assert not burst[0] and all(burst[10:])
+    # Someone else at the same moment is unaffected
+    assert not store.is_anomaly(burst_start, "bob", None)
+
+
+def test_unusual_hour_is_anomalous():
+    """Test activity at an hour the entity is never seen at."""
+    store = _store()
+    start = datetime(2024, 1, 1)
+    for day in range(10):
+        for hour in range(9, 18):
+            store.observe(start + timedelta(days=day, hours=hour), None, "10.0.0.1")
+
+    assert not store.is_anomaly(start + timedelta(days=10, hours=11), None, "10.0.0.1")
+    assert store.is_anomaly(start + timedelta(days=10, hours=3), None, "10.0.0.1")
+    # Either entity deviating is enough
+    assert store.is_anomaly(start + timedelta(days=10, hours=4), "newuser", "10.0.0.1")
+
+
+def test_memory_is_fixed_and_snapshots_restore(tmp_path):
+    """Test the table never grows past its budget, and snapshots round-trip."""
+    tiny = _store(memory_mb=8 * WAYS * BYTES_PER_ENTITY / 2 ** 20)
+    assert tiny.capacity == 8 * WAYS
+    now = datetime(2024, 1, 1)
+    for i in range(1000):
+        tiny.observe(now + timedelta(seconds=i), f"user{i}", None)
+    stats = tiny.stats()
+    assert stats["tracked_entities"] == tiny.capacity
+    assert stats["evicted"] == 1000 - tiny.capacity
+
+    store = _store()
+    for i in range(40):
+        store.observe(now + timedelta(minutes=i), "alice", "10.0.0.1")
+    path = str(tmp_path / "baselines.npz")
+    assert store.snapshot(path) == 2
+
+    later = now + timedelta(hours=1)
+    expected = store.observe(later, "alice", "10.0.0.1")
+    for restored in (_store(), _store(memory_mb=2)):
+        assert restored.load(path) == 2
+        assert restored.observe(later, "alice", "10.0.0.1") == expected
+    assert _store().load(str(tmp_path / "missing.npz")) == 0
+
+
+def test_create_log_uses_baseline(client, auth_headers, test_log_data):
+    """Test is_anomaly comes from the baseline rather than the threat score."""
+    now = datetime.utcnow()
+    odd_hour = now.replace(minute=0) - timedelta(days=40, hours=12)
+    for day in range(30):
+        ingest_service.baselines.observe(odd_hour + timedelta(days=day), test_log_data["username"], None)
+
+    response = client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    assert response.json()["is_anomaly"] is True
+
+    other = dict(test_log_data, username="someone_new", source_ip="198.51.100.20")
+    assert client.post("/api/logs/", json=other, headers=auth_headers).json()["is_anomaly"] is False
+
+
+def test_failed_ingest_leaves_baselines_untouched(db_session, test_log_data, monkeypatch):
+    """Test a batch that is rolled back isn't learned (and a retry isn't counted twice)."""
+    import pytest
+    from app.schemas.schemas import SecurityLogCreate
+    from app.services import ingest_service as ingest_module
+    from app.services.ingest_service import IngestService
+    from app.services.threat_detector import ThreatDetector
+
+    store, untouched = _store(), _store()
+    now = datetime.utcnow()
+    for i in range(40):
+        for s in (store, untouched):
+            s.observe(now - timedelta(minutes=40 - i), test_log_data["username"], test_log_data["source_ip"])
+    service = IngestService(ThreatDetector(), baselines=store)
+    logs = [SecurityLogCreate(**test_log_data)] * 30
+
+    def fail(db, rows, sign=1):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(ingest_module.RollupService, "apply", fail)
+    with pytest.raises(RuntimeError):
+        service.ingest(db_session, logs)
+    db_session.rollback()
+    assert store.stats() == untouched.stats()
+    probe = now + timedelta(seconds=1)
+    assert store.observe(probe, test_log_data["username"], None) == untouched.observe(probe, test_log_data["username"], None)
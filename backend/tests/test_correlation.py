@@ -0,0 +1,121 @@
+"""Tests for the event correlation engine."""
+from app.db.models import EventType, SeverityLevel
+from app.services.correlation import CorrelationEngine, ThresholdRule, SequenceRule
+
+FAILED, LOGIN, EXFIL = EventType.FAILED_LOGIN, EventType.LOGIN_ATTEMPT, EventType.DATA_EXFILTRATION
+
+BRUTE = ThresholdRule("brute", "Brute force", frozenset({FAILED}), 3, 10, SeverityLevel.HIGH)
+CHAIN = SequenceRule("chain", "Chain", (
+    (frozenset({FAILED}), 2), (frozenset({LOGIN}), 1), (frozenset({EXFIL}), 1)
+), 100, SeverityLevel.CRITICAL)
+
+
+def _fired(engine, events, ip="1.2.3.4", user="bob"):
+    return [[rule.name for rule in engine.process(ip, user, event_type, at)] for event_type, at in events]
+
+
+def test_threshold_rule_window_and_quiet_period():
+    """Test N events in T seconds fire once per window, spread-out events don't."""
+    engine = CorrelationEngine([BRUTE])
+    assert _fired(engine, [(FAILED, 0), (FAILED, 8), (FAILED, 12), (FAILED, 20)]) == [[], [], [], []]
+    assert _fired(engine, [(FAILED, 21)]) == [["brute"]]
+    # Quiet for one window, then the next burst fires again
+    assert _fired(engine, [(FAILED, 22), (FAILED, 23), (FAILED, 24)]) == [[], [], []]
+    assert _fired(engine, [(FAILED, 40), (FAILED, 40), (FAILED, 40)]) == [[], [], ["brute"]]
+    # Other keys and event types have their own state
+    assert _fired(engine, [(FAILED, 30), (FAILED, 30)], user="alice") == [[], []]
+    assert _fired(engine, [(LOGIN, 30)], user="alice") == [[]]
+
+
+def test_sequence_rule():
+    """Test failed logins -> login -> exfiltration fires in order and within the window."""
+    engine = CorrelationEngine([CHAIN])
+    # Login before enough failures doesn't advance
+    assert _fired(engine, [(FAILED, 0), (LOGIN, 1), (EXFIL, 2)]) == [[], [], []]
+    assert _fired(engine, [(FAILED, 3), (LOGIN, 4), (FAILED, 5), (EXFIL, 6)]) == [[], [], [], ["chain"]]
+    # Too slow - the sequence starts over
+    assert _fired(engine, [(FAILED, 10), (FAILED, 11), (LOGIN, 12), (EXFIL, 200)]) == [[], [], [], []]
+
+
+def test_memory_is_bounded():
+    """Test the key table never grows past max_keys and idle keys are dropped."""
+    engine = CorrelationEngine([BRUTE], max_keys=100, idle_seconds=50)
+    for i in range(1000):
+        engine.process(f"10.0.{i // 256}.{i % 256}", None, FAILED, 0)
+    assert len(engine) == 100
+    assert engine.evicted == 900
+    engine.process("10.9.9.9", None, FAILED, 1000)
+    assert len(engine) == 1
+    # Events no rule cares about don't create state
+    engine.process("10.9.9.8", None, EventType.MALWARE_DETECTED, 1000)
+    assert len(engine) == 1
+
+
+def test_ingest_creates_alerts(client, auth_headers, test_log_data):
+    """Test a burst of failed logins through the API becomes one brute-force alert."""
+    burst = [dict(test_log_data, source_ip="203.0.113.9", username="root") for _ in range(12)]
+    client.post("/api/logs/bulk", json=burst[:9], headers=auth_headers)
+    assert client.get("/api/alerts/", headers=auth_headers).json() == []
+
+    tenth = client.post("/api/logs/", json=burst[9], headers=auth_headers).json()
+    client.post("/api/logs/bulk", json=burst[10:], headers=auth_headers)
+    alerts = client.get("/api/alerts/", headers=auth_headers).json()
+    assert len(alerts) == 1
+    assert alerts[0]["log_id"] == tenth["id"]
+    assert alerts[0]["severity"] == "high"
+    assert "203.0.113.9" in alerts[0]["description"]
+
+
+def test_journal_restores_state():
+    """Test restoring a journal undoes windows, cooldowns, new keys and evictions."""
+    from datetime import datetime, timedelta
+    from app.services.correlation import CorrelationJournal
+    start = datetime(2026, 1, 1)
+
+    def rows(ip, count, offset=0):
+        return [{"id": i, "timestamp": start + timedelta(seconds=offset + i), "source_ip": ip,
+                 "username": None, "event_type": FAILED} for i in range(count)]
+
+    engine = CorrelationEngine([BRUTE], max_keys=2)
+    engine.process_rows(rows("1.1.1.1", 2))
+    engine.process_rows(rows("2.2.2.2", 1))
+    before = {key: list(state) for key, state in engine.states.items()}
+    counters = (engine.events, engine.fired, engine.evicted)
+
+    journal = CorrelationJournal()
+    # Fires for 1.1.1.1 (starting its quiet period), and 3.3.3.3 evicts 2.2.2.2
+    assert len(engine.process_rows(rows("1.1.1.1", 1, offset=2) + rows("3.3.3.3", 1), journal)) == 1
+    engine.restore(journal)
+    assert {key: list(state) for key, state in engine.states.items()} == before
+    assert (engine.events, engine.fired, engine.evicted) == counters
+
+    # Replaying the same events fires again - nothing was left in cooldown
+    assert len(engine.process_rows(rows("1.1.1.1", 1, offset=2))) == 1
+
+
+def test_failed_ingest_alert_fires_on_retry(db_session, test_log_data, monkeypatch):
+    """Test a batch rolled back after firing a rule still raises its alert when resent."""
+    import pytest
+    from app.db.models import Alert
+    from app.schemas.schemas import SecurityLogCreate
+    from app.services import ingest_service as ingest_module
+    from app.services.ingest_service import IngestService
+    from app.services.threat_detector import ThreatDetector
+
+    service = IngestService(ThreatDetector(), correlator=CorrelationEngine([BRUTE]))
+    logs = [SecurityLogCreate(**dict(test_log_data, source_ip="203.0.113.9", username="bob"))] * 3
+    apply = ingest_module.RollupService.apply
+
+    def fail(db, rows, sign=1):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(ingest_module.RollupService, "apply", fail)
+    with pytest.raises(RuntimeError):
+        service.ingest(db_session, logs)
+    db_session.rollback()
+    assert db_session.query(Alert).count() == 0
+
+    monkeypatch.setattr(ingest_module.RollupService, "apply", apply)
+    service.ingest(db_session, logs)
+    assert db_session.query(Alert).count() == 1
+    assert service.correlator.events == 3
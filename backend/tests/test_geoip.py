@@ -0,0 +1,73 @@
+"""Tests for GeoIP enrichment."""
+import pytest
+
+from app.api import logs as logs_api
+from app.db.models import SecurityLog, EventType, SeverityLevel
+from app.services.geoip import GeoIPResolver, build_database, backfill_geo
+
+RANGES = [
+    ("89.248.160.0", "89.248.175.255", "NL", "Amsterdam"),
+    ("1.0.0.0", "1.0.0.255", "AU", "Sydney"),
+    ("185.220.100.0", "185.220.103.255", "DE", None),
+    ("2001:db8::", "2001:db8::ffff", "US", "Seattle"),
+]
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    path = str(tmp_path / "geoip.bin")
+    assert build_database(RANGES, path) == 4
+    return GeoIPResolver(path=path)
+
+
+def test_lookup(resolver, tmp_path):
+    """Test range boundaries, misses, IPv6 and the cache."""
+    assert resolver.lookup("89.248.160.0") == ("NL", "Amsterdam")
+    assert resolver.lookup("89.248.175.255") == ("NL", "Amsterdam")
+    assert resolver.lookup("89.248.176.0") == (None, None)
+    assert resolver.lookup("0.255.255.255") == (None, None)
+    assert resolver.lookup("185.220.101.23") == ("DE", None)
+    assert resolver.lookup("2001:db8::42") == ("US", "Seattle")
+    assert resolver.lookup("not-an-ip") == (None, None)
+    assert resolver.lookup_many(["1.0.0.7", None, "1.0.0.7"]) == [("AU", "Sydney"), (None, None), ("AU", "Sydney")]
+    assert resolver._cached.cache_info().hits >= 1
+
+    assert GeoIPResolver(path=str(tmp_path / "missing.bin")).lookup("1.0.0.7") == (None, None)
+    with pytest.raises(ValueError):
+        build_database([("1.0.0.0", "1.0.0.9", "AU", None), ("1.0.0.5", "1.0.0.20", "NZ", None)],
+                       str(tmp_path / "overlap.bin"))
+
+
+def test_enrichment_backfill_and_breakdown(client, auth_headers, db_session, resolver, monkeypatch):
+    """Test ingest fills locations, backfill catches up old rows, /geo aggregates them."""
+    db_session.add(SecurityLog(event_type=EventType.FAILED_LOGIN, severity=SeverityLevel.LOW,
+                               source_ip="1.0.0.9"))
+    db_session.commit()
+
+    monkeypatch.setattr(logs_api, "geo_resolver", resolver)
+    monkeypatch.setattr(logs_api.ingest_service, "geo", resolver)
+    log = client.post("/api/logs/", json={"event_type": "malware_detected", "severity": "critical",
+                                          "source_ip": "89.248.165.12"}, headers=auth_headers).json()
+    assert (log["country"], log["city"]) == ("NL", "Amsterdam")
+    client.post("/api/logs/bulk", json=[
+        {"event_type": "failed_login", "source_ip": "89.248.161.1"},
+        {"event_type": "failed_login", "source_ip": "10.0.0.1"},
+    ], headers=auth_headers)
+
+    assert backfill_geo(db_session, resolver) == 1
+    assert backfill_geo(db_session, resolver) == 0
+
+    # Whether a log counts as a threat is the detector's call - take it from the stored rows
+    db_session.expire_all()
+    threats = {country: 0 for country in ("NL", "AU")}
+    for row in db_session.query(SecurityLog).filter(SecurityLog.country.isnot(None)):
+        threats[row.country] += bool(row.is_threat)
+
+    geo = client.get("/api/analytics/geo", headers=auth_headers).json()
+    assert geo["locations"] == [
+        {"country": "NL", "count": 2, "threats": threats["NL"]},
+        {"country": "AU", "count": 1, "threats": threats["AU"]},
+    ]
+    assert geo["unknown"] == 1
+    cities = client.get("/api/analytics/geo?level=city&limit=1", headers=auth_headers).json()
+    assert cities["locations"] == [{"country": "NL", "city": "Amsterdam", "count": 2, "threats": threats["NL"]}]
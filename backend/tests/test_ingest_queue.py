@@ -0,0 +1,75 @@
+"""Tests for the write-behind ingest queue."""
+import asyncio
+import time
+from fastapi import status
+
+from app.schemas.schemas import SecurityLogCreate
+from app.services.ingest_queue import IngestQueue
+from app.services.ingest_service import IngestService
+from app.services.threat_detector import ThreatDetector
+
+
+def test_queue_batches_and_writes(session_factory, test_log_data):
+    """Test queued events are written in batches by the background task."""
+    service = IngestService(ThreatDetector(), batch_size=4)
+    queue = IngestQueue(service, session_factory=session_factory, maxsize=100, flush_interval=0.05)
+    
+    async def run():
+        queue.start()
+        assert queue.put([SecurityLogCreate(**test_log_data)] * 10)
+        await queue.stop()
+    
+    asyncio.run(run())
+    stats = queue.stats()
+    assert stats["written"] == 10
+    assert stats["batches"] == 3
+    assert stats["depth"] == 0
+    assert stats["running"] is False
+
+
+def test_queue_rejects_when_full(session_factory, test_log_data):
+    """Test the queue refuses events instead of growing past capacity."""
+    queue = IngestQueue(IngestService(ThreatDetector()), session_factory=session_factory, maxsize=3)
+    log = SecurityLogCreate(**test_log_data)
+    
+    # Not started yet - nothing is accepted
+    assert queue.put([log]) is False
+    
+    async def run():
+        queue.start()
+        assert queue.put([log, log]) is True
+        assert queue.put([log, log]) is False  # all-or-nothing
+        assert queue.stats()["depth"] == 2
+        await queue.stop()
+    
+    asyncio.run(run())
+    assert queue.stats()["rejected"] == 3
+    assert queue.stats()["written"] == 2
+
+
+def test_enqueue_endpoint(client, auth_headers, test_log_data, session_factory, monkeypatch):
+    """Test the enqueue endpoint accepts events and the worker stores them."""
+    from app.api import logs
+    monkeypatch.setattr(logs.ingest_queue, "session_factory", session_factory)
+    
+    response = client.post("/api/logs/enqueue", json=test_log_data, headers=auth_headers)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        stats = client.get("/api/logs/queue/stats", headers=auth_headers).json()
+        if stats["written"] >= 1:
+            break
+        time.sleep(0.05)
+    assert stats["written"] >= 1
+    assert client.get("/api/logs/", headers=auth_headers).json()["total"] == 1
+
+
+def test_enqueue_endpoint_full(client, auth_headers, test_log_data, monkeypatch):
+    """Test a full queue answers 503 with Retry-After."""
+    from app.api import logs
+    monkeypatch.setattr(logs.ingest_queue, "put", lambda items: False)
+    
+    response = client.post("/api/logs/enqueue", json=test_log_data, headers=auth_headers)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert "Retry-After" in response.headers
@@ -0,0 +1,100 @@
+"""Tests for the threat indicator (IOC) matcher."""
+from datetime import datetime, timedelta
+
+from app.api import logs as logs_api
+from app.db.models import ThreatIndicator, SecurityLog, EventType, SeverityLevel
+from app.services.ioc_matcher import IOCMatcher
+from app.services.threat_detector import ThreatDetector
+
+
+def _indicator(value, indicator_type="ip", level=SeverityLevel.HIGH, **kwargs):
+    return ThreatIndicator(indicator_type=indicator_type, value=value, threat_level=level, **kwargs)
+
+
+def test_matcher_lookups():
+    """Test exact IPs, CIDR ranges, domain suffixes, hashes and raw_log scanning."""
+    matcher = IOCMatcher()
+    matcher.add("ip", "185.220.101.23", SeverityLevel.HIGH)
+    matcher.add("cidr", "45.0.0.0/8", SeverityLevel.LOW)
+    matcher.add("cidr", "45.12.0.0/16", SeverityLevel.CRITICAL)
+    matcher.add("ip", "2001:db8::/32")
+    matcher.add("domain", "malicious-site.evil")
+    matcher.add("hash", "D41D8CD98F00B204E9800998ECF8427E")
+    matcher.add("email", "phisher@bad.example")
+    assert matcher.add("ip", "not-an-ip") is False
+
+    assert matcher.match_ip("185.220.101.23").threat_level == SeverityLevel.HIGH
+    assert matcher.match_ip("185.220.101.24") is None
+    # Longest prefix wins
+    assert matcher.match_ip("45.12.9.9").threat_level == SeverityLevel.CRITICAL
+    assert matcher.match_ip("45.1.2.3").threat_level == SeverityLevel.LOW
+    assert matcher.match_ip("2001:db8::1") is not None
+
+    assert matcher.match_domain("malicious-site.evil") is not None
+    assert matcher.match_domain("cdn.Malicious-Site.evil") is not None
+    assert matcher.match_domain("site.evil") is None
+    assert matcher.match_domain("notmalicious-site.evil") is None
+
+    text = ("GET http://login.malicious-site.evil/x from 45.12.0.1 file=d41d8cd98f00b204e9800998ecf8427e "
+            "mail from phisher@bad.example via 2001:db8::7")
+    assert sorted(m.indicator_type for m in matcher.scan_text(text)) == ["domain", "email", "hash", "ip", "ip"]
+    assert matcher.scan_text("nothing to see at 10.0.0.1") == []
+
+    matcher.remove("domain", "malicious-site.evil")
+    assert matcher.match_domain("cdn.malicious-site.evil") is None
+
+
+def test_matcher_refreshes_incrementally(db_session):
+    """Test refresh() picks up new, updated and deleted indicators."""
+    db_session.add_all([_indicator("185.220.101.23"), _indicator("evil.test", "domain")])
+    db_session.commit()
+    matcher = IOCMatcher()
+    assert matcher.load(db_session) == 2
+
+    new = _indicator("89.248.165.0/24", "cidr", SeverityLevel.CRITICAL)
+    db_session.add(new)
+    db_session.commit()
+    assert matcher.refresh(db_session) == 1
+    assert matcher.match_ip("89.248.165.12").threat_level == SeverityLevel.CRITICAL
+
+    # Deactivated with last_seen bumped - applied incrementally
+    new.is_active = False
+    new.last_seen = datetime.utcnow() + timedelta(seconds=1)
+    db_session.commit()
+    matcher.refresh(db_session)
+    assert matcher.match_ip("89.248.165.12") is None
+
+    # Deleted outright - the active count gives it away, and it reloads
+    db_session.query(ThreatIndicator).filter(ThreatIndicator.value == "evil.test").delete()
+    db_session.commit()
+    matcher.refresh(db_session)
+    assert matcher.match_domain("www.evil.test") is None
+    assert matcher.match_ip("185.220.101.23") is not None
+
+
+def test_known_bad_ip_raises_score(client, auth_headers, db_session, monkeypatch):
+    """Test logs hitting an indicator are flagged, in both single and bulk ingest."""
+    db_session.add(_indicator("89.248.165.12", level=SeverityLevel.CRITICAL))
+    db_session.commit()
+    matcher = IOCMatcher()
+    matcher.load(db_session)
+    monkeypatch.setattr(logs_api.threat_detector, "ioc_matcher", matcher)
+
+    benign = {"event_type": "login_attempt", "severity": "low", "source_ip": "192.168.1.5"}
+    assert client.post("/api/logs/", json=benign, headers=auth_headers).json()["is_threat"] is False
+
+    hit = dict(benign, source_ip="89.248.165.12")
+    log = client.post("/api/logs/", json=hit, headers=auth_headers).json()
+    assert log["is_threat"] is True
+    assert log["threat_score"] == 0.95
+
+    client.post("/api/logs/bulk", json=[benign, dict(benign, raw_log="conn to 89.248.165.12:443")],
+                headers=auth_headers)
+    threats = client.get("/api/logs/?is_threat=true", headers=auth_headers).json()
+    assert threats["total"] == 2
+
+    # Batch and single-row scoring still agree
+    detector = ThreatDetector(ioc_matcher=matcher)
+    rows = [SecurityLog(event_type=EventType.LOGIN_ATTEMPT, severity=SeverityLevel.LOW, source_ip=ip)
+            for ip in ("89.248.165.12", "192.168.1.5")]
+    assert detector.predict_threat_batch(rows) == [detector.predict_threat(row) for row in rows]
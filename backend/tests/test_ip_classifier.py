@@ -0,0 +1,50 @@
+"""Tests for IP classification."""
+from datetime import datetime
+
+from app.db.models import SecurityLog, EventType, SeverityLevel
+from app.services.ip_classifier import IPClassifier
+from app.services.threat_detector import ThreatDetector
+
+
+def test_builtin_ranges():
+    """Test special-purpose ranges across both IP versions."""
+    classifier = IPClassifier(allow=[], deny=[])
+    assert classifier.classify("10.1.2.3") == "private"
+    assert classifier.classify("172.20.0.1") == "private"   # 172.17-31 too, not just 172.16
+    assert classifier.classify("172.32.0.1") == "public"
+    assert classifier.classify("192.168.1.1") == "private"
+    assert classifier.classify("127.0.0.1") == "loopback"
+    assert classifier.classify("169.254.10.10") == "link_local"
+    assert classifier.classify("100.100.0.1") == "cgnat"
+    assert classifier.classify("100.128.0.1") == "public"
+    assert classifier.classify("::1") == "loopback"
+    assert classifier.classify("fe80::1") == "link_local"
+    assert classifier.classify("fd12:3456::1") == "ula"
+    assert classifier.classify("::ffff:192.168.0.9") == "private"
+    assert classifier.classify("2001:4860::8888") == "public"
+    assert classifier.classify("garbage") == "invalid"
+
+
+def test_allow_and_deny_lists():
+    """Test configured ranges take precedence over the built-in ones."""
+    classifier = IPClassifier(allow=["203.0.113.0/24"], deny=["10.66.0.0/16", "198.51.100.7"])
+    assert classifier.classify("203.0.113.50") == "allow"
+    assert classifier.classify("10.66.1.1") == "deny"
+    assert classifier.classify("10.67.1.1") == "private"
+    assert classifier.suspicious_many(["203.0.113.50", "10.66.1.1", "198.51.100.7", "8.8.8.8", None]) == \
+        [False, True, True, True, False]
+    classifier.suspicious_many(["8.8.8.8"] * 10)
+    assert classifier.cache_info().hits >= 10
+
+
+def test_detector_uses_classifier():
+    """Test internal sources no longer get the external-IP bump."""
+    detector = ThreatDetector(ip_classifier=IPClassifier(allow=[], deny=[]))
+    internal = SecurityLog(event_type=EventType.POLICY_VIOLATION, severity=SeverityLevel.LOW,
+                           source_ip="172.25.3.4", timestamp=datetime.utcnow())
+    external = SecurityLog(event_type=EventType.POLICY_VIOLATION, severity=SeverityLevel.LOW,
+                           source_ip="172.32.3.4", timestamp=datetime.utcnow())
+    detector.trained = False  # heuristics only
+    assert detector.predict_threat(external)[2] > detector.predict_threat(internal)[2]
+    assert detector.predict_threat_batch([internal, external]) == \
+        [detector.predict_threat(internal), detector.predict_threat(external)]
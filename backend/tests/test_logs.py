@@ -94,3 +94,321 @@ def test_unauthorized_access(client, test_log_data):
     """Test accessing logs without authentication."""
     response = client.get("/api/logs/")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_bulk_create_logs(client, auth_headers, test_log_data):
+    """Test bulk ingestion reports ids and per-item validation errors."""
+    items = [
+        test_log_data,
+        {**test_log_data, "event_type": "not_a_real_type"},
+        {**test_log_data, "event_type": "malware_detected", "severity": "critical"},
+    ]
+    response = client.post("/api/logs/bulk", json=items, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 1
+    
+    results = data["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["id"] is not None
+    assert results[1]["id"] is None
+    assert results[1]["errors"][0]["loc"] == ["event_type"]
+    assert results[2]["id"] is not None
+    
+    # Inserted rows are readable and scored
+    log = client.get(f"/api/logs/{results[2]['id']}", headers=auth_headers).json()
+    assert log["event_type"] == "malware_detected"
+    assert log["is_threat"] is True
+
+
+def test_bulk_create_logs_failed_batch(client, auth_headers, test_log_data, monkeypatch):
+    """Test a batch that fails to store is reported per item while the others commit."""
+    from app.api.logs import ingest_service
+    monkeypatch.setattr(ingest_service, "batch_size", 2)
+    ingest_batch = ingest_service._ingest_batch
+    calls = []
+    
+    def failing_second_batch(db, logs):
+        calls.append(len(logs))
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+        return ingest_batch(db, logs)
+    
+    monkeypatch.setattr(ingest_service, "_ingest_batch", failing_second_batch)
+    response = client.post("/api/logs/bulk", json=[test_log_data] * 5, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["accepted"] == 3
+    assert data["rejected"] == 2
+    
+    results = data["results"]
+    assert [r["id"] is not None for r in results] == [True, True, False, False, True]
+    assert results[2]["errors"][0]["msg"].startswith("Not stored")
+    assert client.get("/api/logs/", headers=auth_headers).json()["total"] == 3
+
+
+def test_bulk_create_logs_too_many_items(client, auth_headers, test_log_data):
+    """Test bulk ingestion rejects oversized requests."""
+    from app.core.config import settings
+    items = [test_log_data] * (settings.INGEST_MAX_BULK_ITEMS + 1)
+    response = client.post("/api/logs/bulk", json=items, headers=auth_headers)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def test_stream_ingest_ndjson(client, auth_headers, test_log_data):
+    """Test NDJSON stream ingestion acknowledges good lines and reports bad ones."""
+    import json
+    lines = [json.dumps(test_log_data) for _ in range(5)]
+    lines.insert(2, "{not json")
+    lines.insert(4, "")
+    lines.append(json.dumps({**test_log_data, "severity": "apocalyptic"}))
+    body = "\n".join(lines)  # no trailing newline on the last line
+    
+    response = client.post(
+        "/api/logs/stream",
+        content=body.encode(),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["accepted"] == 5
+    assert data["rejected"] == 2
+    assert [e["line"] for e in data["errors"]] == [3, 8]
+    assert data["errors_truncated"] is False
+    
+    logs = client.get("/api/logs/", headers=auth_headers).json()
+    assert logs["total"] == 5
+
+
+def test_stream_ingestor_flushes_micro_batches(db_session, test_log_data):
+    """Test the stream reader flushes by size and splits lines across chunks."""
+    import json
+    from app.services.ingest_service import IngestService, StreamIngestor
+    from app.services.threat_detector import ThreatDetector
+    
+    service = IngestService(ThreatDetector(), batch_size=3)
+    ingestor = StreamIngestor(service, db_session, flush_interval=60, max_line_bytes=200)
+    body = ("\n".join(json.dumps(test_log_data) for _ in range(7)) + "\n").encode()
+    
+    inserted = []
+    for start in range(0, len(body), 17):  # deliberately awkward chunk size
+        inserted.extend(ingestor.feed(body[start:start + 17]))
+    assert len(inserted) == 6
+    assert ingestor.batches == 2
+    assert len(ingestor.pending) == 1
+    
+    inserted.extend(ingestor.finish())
+    assert len(inserted) == 7
+    
+    # Over-long lines are rejected without buffering them
+    ingestor.feed(b'{"event_type": "' + b"x" * 500)
+    ingestor.feed(b'x" }\n' + json.dumps(test_log_data).encode() + b"\n")
+    ingestor.finish()
+    assert ingestor.rejected == 1
+    assert ingestor.accepted == 8
+
+
+def test_stream_ingestor_rejects_long_line_in_one_chunk(db_session, test_log_data):
+    """Test the line-size limit holds for a complete line that arrives in a single chunk."""
+    import json
+    from app.services.ingest_service import IngestService, StreamIngestor
+    from app.services.threat_detector import ThreatDetector
+    
+    ingestor = StreamIngestor(IngestService(ThreatDetector()), db_session, flush_interval=60, max_line_bytes=200)
+    long_line = json.dumps({**test_log_data, "description": "x" * 300}).encode()
+    ingestor.feed(long_line + b"\n" + json.dumps(test_log_data).encode() + b"\n")
+    ingestor.finish()
+    assert ingestor.accepted == 1
+    assert ingestor.rejected == 1
+    assert ingestor.errors[0]["line"] == 1
+    assert "exceeds" in ingestor.errors[0]["errors"][0]["msg"]
+
+
+def test_stream_ingestor_reports_failed_batch(db_session, test_log_data, monkeypatch):
+    """Test a batch that fails to store is rolled back and reported per line, and the stream goes on."""
+    import json
+    from app.services.ingest_service import IngestService, StreamIngestor
+    from app.services.threat_detector import ThreatDetector
+    
+    service = IngestService(ThreatDetector(), batch_size=2)
+    ingest_batch = service._ingest_batch
+    calls = []
+    
+    def failing_first_batch(db, logs):
+        calls.append(len(logs))
+        if len(calls) == 1:
+            raise RuntimeError("database went away")
+        return ingest_batch(db, logs)
+    
+    monkeypatch.setattr(service, "_ingest_batch", failing_first_batch)
+    ingestor = StreamIngestor(service, db_session, flush_interval=60)
+    ingestor.feed(("\n".join(json.dumps(test_log_data) for _ in range(5)) + "\n").encode())
+    ingestor.finish()
+    
+    summary = ingestor.summary()
+    assert summary["accepted"] == 3
+    assert summary["rejected"] == 2
+    assert summary["batches"] == 2
+    assert [e["line"] for e in summary["errors"]] == [1, 2]
+    assert summary["errors"][0]["errors"][0]["msg"].startswith("Not stored")
+
+
+def test_stream_ingestor_flushes_idle_stream(db_session, test_log_data):
+    """Test pending events are written when the stream goes quiet, not when it resumes."""
+    import asyncio
+    import json
+    from app.services.ingest_service import IngestService, StreamIngestor
+    from app.services.threat_detector import ThreatDetector
+    
+    ingestor = StreamIngestor(IngestService(ThreatDetector()), db_session, flush_interval=0.05)
+    line = (json.dumps(test_log_data) + "\n").encode()
+    seen_before_resume = []
+    
+    async def body():
+        yield line * 2
+        await asyncio.sleep(0.5)  # idle connection
+        seen_before_resume.append(ingestor.accepted)
+        yield line
+    
+    async def run():
+        return [len(rows) async for rows in ingestor.run(body())]
+    
+    assert asyncio.run(run()) == [2, 1]
+    assert seen_before_resume == [2]
+    assert ingestor.batches == 2
+
+
+def test_cursor_pagination(client, auth_headers, test_log_data):
+    """Test walking all pages with next_cursor returns every log exactly once."""
+    # Bulk inserts share a timestamp, so this also exercises the id tie-break
+    items = [test_log_data] * 5 + [{**test_log_data, "severity": "high"}] * 2
+    client.post("/api/logs/bulk", json=items, headers=auth_headers)
+    
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/logs/?limit=2&severity=medium" + (f"&cursor={cursor}" if cursor else "")
+        data = client.get(url, headers=auth_headers).json()
+        seen.extend(log["id"] for log in data["logs"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_invalid_cursor(client, auth_headers):
+    """Test a malformed cursor is rejected."""
+    response = client.get("/api/logs/?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_total_modes(client, auth_headers, test_log_data):
+    """Test the estimate/none total modes and the total_exact flag."""
+    client.post("/api/logs/bulk", json=[test_log_data] * 3, headers=auth_headers)
+    
+    exact = client.get("/api/logs/", headers=auth_headers).json()
+    assert exact["total"] == 3
+    assert exact["total_exact"] is True
+    
+    none = client.get("/api/logs/?total_mode=none", headers=auth_headers).json()
+    assert none["total"] is None
+    assert none["total_exact"] is False
+    assert len(none["logs"]) == 3
+    
+    # First estimate computes and caches, later inserts update the cached count
+    first = client.get("/api/logs/?total_mode=estimate&severity=medium", headers=auth_headers).json()
+    assert first["total"] == 3
+    client.post("/api/logs/bulk", json=[test_log_data, {**test_log_data, "severity": "low"}], headers=auth_headers)
+    cached = client.get("/api/logs/?total_mode=estimate&severity=medium", headers=auth_headers).json()
+    assert cached["total"] == 4
+    assert cached["total_exact"] is False
+
+
+def test_count_cache_matching():
+    """Test cached counts follow inserts and deletes that match their filters."""
+    from datetime import datetime, timedelta
+    from app.services.count_service import LogCountCache
+    from app.db.models import EventType, SeverityLevel
+    
+    cache = LogCountCache(ttl=60)
+    now = datetime.utcnow()
+    filters = {"severity": "high", "event_type": None, "is_threat": True,
+               "start_date": now - timedelta(hours=1), "end_date": None}
+    cache.set(filters, 10)
+    
+    rows = [
+        {"severity": SeverityLevel.HIGH, "event_type": EventType.BRUTE_FORCE, "is_threat": True, "timestamp": now},
+        {"severity": SeverityLevel.LOW, "event_type": EventType.BRUTE_FORCE, "is_threat": True, "timestamp": now},
+        {"severity": SeverityLevel.HIGH, "event_type": EventType.BRUTE_FORCE, "is_threat": True,
+         "timestamp": now - timedelta(days=1)},
+    ]
+    cache.record_inserts(rows)
+    assert cache.get(filters) == 11
+    cache.record_delete(rows[0])
+    assert cache.get(filters) == 10
+
+
+def test_export_csv(client, auth_headers, test_log_data):
+    """Test CSV export streams every log, plain and gzipped."""
+    import csv
+    import gzip
+    import io
+    client.post("/api/logs/bulk", json=[test_log_data] * 3, headers=auth_headers)
+    
+    response = client.get("/api/logs/export/csv", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][0] == "ID"
+    assert len(rows) == 4
+    assert rows[1][2] == "failed_login"
+    
+    compressed = client.get("/api/logs/export/csv?compress=gzip", headers=auth_headers)
+    assert compressed.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(compressed.content).decode() == response.text
+
+
+def test_csv_stream_chunks():
+    """Test the CSV encoder emits one chunk per row chunk instead of one big body."""
+    from datetime import datetime
+    from app.db.models import EventType, SeverityLevel
+    from app.services.export_service import csv_stream
+    
+    row = (1, datetime(2026, 1, 1), EventType.BRUTE_FORCE, SeverityLevel.HIGH,
+           "203.0.113.1", None, "root", "desc", 0.9, True, False)
+    chunks = list(csv_stream(iter([[row] * 2, [row] * 2, [row]])))
+    assert len(chunks) == 4  # header + 3 row chunks
+    assert b"brute_force,high" in chunks[1]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_columnar(client, auth_headers, test_log_data, fmt):
+    """Test Parquet / Arrow IPC exports keep types and dictionary-encode categories."""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    import io
+    client.post("/api/logs/bulk", json=[test_log_data] * 3, headers=auth_headers)
+    
+    response = client.get(f"/api/logs/export?format={fmt}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    if fmt == "parquet":
+        table = pq.read_table(io.BytesIO(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    
+    assert table.num_rows == 3
+    assert pa.types.is_timestamp(table.schema.field("timestamp").type)
+    assert pa.types.is_dictionary(table.schema.field("event_type").type)
+    assert table.column("event_type").to_pylist() == ["failed_login"] * 3
+    assert table.column("is_threat").type == pa.bool_()
+
+
+def test_export_default_format_is_csv(client, auth_headers, test_log_data):
+    """Test /export without a format returns CSV."""
+    client.post("/api/logs/", json=test_log_data, headers=auth_headers)
+    response = client.get("/api/logs/export", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.startswith("ID,Timestamp")
@@ -0,0 +1,75 @@
+"""Tests for log retention and partition maintenance."""
+from datetime import datetime, timedelta
+
+from app.db.models import SecurityLog, Alert, EventType, SeverityLevel
+from app.services.partition_service import (
+    PartitionManager, period_start, period_end, partition_name, partition_start
+)
+from app.services.rollup_service import RollupService
+
+
+def test_retention_deletes_expired_logs_in_batches(client, auth_headers, db_session, session_factory, test_log_data):
+    """Test SQLite retention removes old rows and keeps rollups and alerts consistent."""
+    now = datetime.utcnow()
+    for days_ago in (1, 20, 40, 50):
+        db_session.add(SecurityLog(
+            timestamp=now - timedelta(days=days_ago), event_type=EventType.MALWARE_DETECTED,
+            severity=SeverityLevel.HIGH, is_threat=True, threat_score=0.9
+        ))
+    db_session.commit()
+    RollupService.rebuild(db_session)
+    old_log = db_session.query(SecurityLog).order_by(SecurityLog.timestamp).first()
+    client.post("/api/alerts/", json={"log_id": old_log.id, "title": "Old", "severity": "high"},
+                headers=auth_headers)
+
+    manager = PartitionManager(session_factory=session_factory, retention_days=30)
+    result = manager.maintain()
+    assert result["deleted_rows"] == 2
+    assert result["dropped"] == []
+
+    db_session.expire_all()
+    assert db_session.query(SecurityLog).count() == 2
+    assert db_session.query(Alert).one().log_id is None
+
+    stats = client.get("/api/analytics/statistics?days=90", headers=auth_headers).json()
+    assert stats["total_events"] == 2
+    assert stats["threat_by_type"] == {"malware_detected": 2}
+
+
+def test_partition_naming():
+    """Test partition periods and names round-trip."""
+    ts = datetime(2026, 10, 16, 13, 45)  # a Friday
+    assert period_start(ts, "day") == datetime(2026, 10, 16)
+    assert period_start(ts, "week") == datetime(2026, 10, 12)
+    assert period_end(datetime(2026, 10, 12), "week") == datetime(2026, 10, 19)
+    assert partition_name(datetime(2026, 10, 16)) == "security_logs_p20261016"
+    assert partition_start("security_logs_p20261016") == datetime(2026, 10, 16)
+    assert partition_start("security_logs_default") is None
+
+
+def test_ensure_partitions_reaches_back_for_backfills(monkeypatch):
+    """Test partitions are created from the oldest backdated row through the ones ahead."""
+    class RecordingSession:
+        def __init__(self):
+            self.statements = []
+        
+        def execute(self, statement, *args):
+            self.statements.append(str(statement))
+        
+        def commit(self):
+            pass
+    
+    manager = PartitionManager(interval="day", ahead=2)
+    monkeypatch.setattr(manager, "list_partitions", lambda db: [("security_logs_p20261015", datetime(2026, 10, 15))])
+    db = RecordingSession()
+    created = manager.ensure_partitions(db, now=datetime(2026, 10, 16, 9), oldest=datetime(2026, 10, 13, 23))
+    assert created == [
+        "security_logs_p20261013", "security_logs_p20261014",
+        "security_logs_p20261016", "security_logs_p20261017", "security_logs_p20261018"
+    ]
+    assert len(db.statements) == 5
+    
+    # Without a backfill only the current period and the ones ahead
+    assert manager.ensure_partitions(RecordingSession(), now=datetime(2026, 10, 16, 9)) == [
+        "security_logs_p20261016", "security_logs_p20261017", "security_logs_p20261018"
+    ]
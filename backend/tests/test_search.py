@@ -0,0 +1,59 @@
+"""Tests for full-text log search."""
+import pytest
+
+from app.db.search import to_fts5_query
+
+
+@pytest.fixture
+def searchable_logs(client, auth_headers):
+    logs = [
+        {"event_type": "failed_login", "severity": "medium", "description": "Failed password for admin",
+         "raw_log": "sshd[311]: Failed password for admin from 203.0.113.9 port 22"},
+        {"event_type": "failed_login", "severity": "high", "description": "Password spraying against admin accounts",
+         "raw_log": "admin admin admin password spraying detected"},
+        {"event_type": "malware_detected", "severity": "critical", "description": "Ransomware binary quarantined",
+         "raw_log": "av: quarantined /tmp/payload.bin"},
+    ]
+    client.post("/api/logs/bulk", json=logs, headers=auth_headers)
+    return logs
+
+
+def _search(client, headers, **params):
+    response = client.get("/api/logs/", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_ranks_and_combines_with_filters(client, auth_headers, searchable_logs):
+    """Test q= finds matches in description/raw_log, best match first, with filters."""
+    result = _search(client, auth_headers, q="admin password")
+    assert result["total"] == 2
+    assert result["logs"][0]["description"] == "Password spraying against admin accounts"
+
+    assert _search(client, auth_headers, q='"failed password"')["total"] == 1
+    assert _search(client, auth_headers, q='"password failed"')["total"] == 0
+    assert _search(client, auth_headers, q="admin -spraying")["total"] == 1
+    assert _search(client, auth_headers, q="ransomware OR sshd")["total"] == 2
+    assert _search(client, auth_headers, q="203.0.113.9")["total"] == 1
+    assert _search(client, auth_headers, q="password", severity="high")["total"] == 1
+
+    # Inserts are indexed as they happen
+    client.post("/api/logs/", json={"event_type": "malware_detected", "description": "Second ransomware hit"},
+                headers=auth_headers)
+    assert _search(client, auth_headers, q="ransomware")["total"] == 2
+
+
+def test_search_rejects_cursor_and_empty_queries(client, auth_headers, searchable_logs):
+    """Test q= can't be used with cursor paging or with only excluded terms."""
+    page = _search(client, auth_headers, limit=1)
+    response = client.get("/api/logs/", params={"q": "admin", "cursor": page["next_cursor"]}, headers=auth_headers)
+    assert response.status_code == 400
+    response = client.get("/api/logs/", params={"q": "-admin"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_fts5_query_translation():
+    """Test websearch-style input maps onto safe FTS5 syntax."""
+    assert to_fts5_query('admin "failed password"') == '("admin") AND ("failed password")'
+    assert to_fts5_query("a OR b -c") == '(("a" OR "b")) NOT "c"'
+    assert to_fts5_query('say "hi') == '("say") AND ("hi")'
@@ -0,0 +1,202 @@
+"""Tests for the streaming sketches and the endpoints built on them."""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app.core.response_cache import response_cache
+from app.db.models import LogSketch, SecurityLog, EventType, SeverityLevel
+from app.services.rollup_service import floor_hour
+from app.services.sketches import HeavyHitters, HyperLogLog, TDigest, dumps, loads
+from app.services.sketch_service import (
+    SketchStore, sketch_store, score_digest_name, TOP_SOURCE_IPS, DISTINCT_SOURCE_IPS, DISTINCT_USERNAMES
+)
+
+
+def _zipf_stream(rng, n, items):
+    weights = [1 / (rank + 1) for rank in range(items)]
+    return [f"10.{i // 256 % 256}.{i % 256}.1" for i in rng.choices(range(items), weights, k=n)]
+
+
+def test_hyperloglog_accuracy_and_merge():
+    """Test estimates stay within a few standard errors, and merging is a union."""
+    a, b = HyperLogLog(12), HyperLogLog(12)
+    for i in range(60000):
+        a.add(f"user{i}")
+    for i in range(40000, 100000):
+        b.add(f"user{i}")
+    assert abs(a.count() - 60000) / 60000 < 4 * a.relative_error
+    a.merge(b)
+    assert abs(a.count() - 100000) / 100000 < 4 * a.relative_error
+
+    small = HyperLogLog(8)
+    for name in ["alice", "bob", "carol", "bob"]:
+        small.add(name)
+    assert small.count() == 3
+    assert loads(dumps(a)).count() == a.count()
+
+
+def test_heavy_hitters_error_bound_and_merge():
+    """Test counts never overestimate, stay within the bound, and survive merging."""
+    rng = random.Random(3)
+    streams = [_zipf_stream(rng, 20000, 5000) for _ in range(3)]
+    truth = Counter(ip for stream in streams for ip in stream)
+
+    merged = HeavyHitters(capacity=64)
+    for stream in streams:
+        part = HeavyHitters(capacity=64)
+        for ip in stream:
+            part.add(ip)
+        merged.merge(loads(dumps(part)))
+
+    assert merged.total == 60000
+    assert 0 < merged.error_bound <= merged.total / 65
+    for ip, count in merged.counts.items():
+        assert truth[ip] - merged.error_bound <= count <= truth[ip]
+    # Everything above the bound is reported, heaviest first
+    assert [ip for ip, _ in merged.top(3)] == [ip for ip, _ in truth.most_common(3)]
+    assert all(ip in merged.counts for ip, count in truth.items() if count > merged.error_bound)
+
+
+def test_tdigest_quantiles_and_merge():
+    """Test tail percentiles of merged digests stay close to the exact ones."""
+    rng = random.Random(5)
+    values = [rng.betavariate(2, 8) for _ in range(100000)]
+    merged = TDigest(100)
+    for offset in range(4):
+        part = TDigest(100)
+        for value in values[offset::4]:
+            part.add(value)
+        merged.merge(loads(dumps(part)))
+
+    ordered = sorted(values)
+    assert merged.count == len(values)
+    assert len(merged.means) <= 100
+    for q, tolerance in ((0.5, 0.002), (0.9, 0.002), (0.99, 0.003)):
+        assert abs(merged.quantile(q) - ordered[int(q * len(values))]) < tolerance
+    assert abs(merged.cdf(ordered[25000]) - 0.25) < 0.005
+    assert abs(merged.mean() - sum(values) / len(values)) < 1e-9
+
+    small = TDigest()
+    for value in range(1, 101):
+        small.add(value)
+    assert (small.quantile(0), small.quantile(0.5), small.quantile(1)) == (1, 50.5, 100)
+    assert TDigest().quantile(0.5) is None
+
+
+def test_store_merges_workers_and_windows(db_session, session_factory):
+    """Test two processes' flushes combine, and windows pick hour or day rows."""
+    now = datetime.utcnow()
+    old = now - timedelta(days=3)
+    worker_a, worker_b = SketchStore(session_factory), SketchStore(session_factory)
+    worker_a.record([{"timestamp": now, "source_ip": "1.1.1.1", "username": u} for u in ("a", "b", "c")])
+    worker_a.record([{"timestamp": old, "source_ip": "9.9.9.9", "username": "z"}])
+    worker_b.record([{"timestamp": now, "source_ip": "1.1.1.1", "username": "a"},
+                     {"timestamp": now, "source_ip": "2.2.2.2", "username": None}])
+    assert worker_a.flush() > 0
+    worker_b.flush()
+    assert db_session.query(LogSketch).filter(LogSketch.granularity == "day").count() == 2 * 3
+
+    # worker_b hasn't flushed this one - visible to itself only
+    worker_b.record([{"timestamp": now, "source_ip": "2.2.2.2", "username": "d"}])
+
+    recent = worker_b.merged(db_session, now - timedelta(hours=1))
+    assert recent[TOP_SOURCE_IPS].top(2) == [("1.1.1.1", 4), ("2.2.2.2", 2)]
+    assert recent[TOP_SOURCE_IPS].distinct_count("1.1.1.1") == 3
+    assert recent[DISTINCT_SOURCE_IPS].count() == 2
+    assert recent[DISTINCT_USERNAMES].count() == 4
+
+    week = worker_a.merged(db_session, now - timedelta(days=7), [DISTINCT_SOURCE_IPS])
+    assert list(week) == [DISTINCT_SOURCE_IPS]
+    assert week[DISTINCT_SOURCE_IPS].count() == 3
+
+    # Score digests are per event type, and a prefix picks them all up
+    worker_a.record([{"timestamp": now, "event_type": t, "threat_score": s, "confidence_score": 0.5}
+                     for t, s in (("failed_login", 0.9), ("failed_login", 0.7), ("login_attempt", 0.1))])
+    worker_a.flush()
+    worker_a.record([{"timestamp": now, "event_type": "login_attempt", "threat_score": 0.3}])
+    digests = worker_a.merged(db_session, now - timedelta(hours=1), prefix="threat_score:")
+    assert {name: d.count for name, d in digests.items()} == {
+        score_digest_name("threat_score", "failed_login"): 2, score_digest_name("threat_score", "login_attempt"): 2
+    }
+    assert digests["threat_score:failed_login"].quantile(1) == 0.9
+
+    assert SketchStore(session_factory).rebuild(db_session) == 0
+    assert db_session.query(LogSketch).count() == 0
+
+
+def test_sketch_endpoints(client, auth_headers, db_session, test_log_data):
+    """Test /top-sources and /cardinality read the sketches, and the statistics panel stays exact."""
+    logs = [dict(test_log_data, source_ip="203.0.113.9", username=f"user{i % 4}") for i in range(6)]
+    logs += [dict(test_log_data, source_ip="198.51.100.7")] * 2
+    client.post("/api/logs/bulk", json=logs, headers=auth_headers)
+
+    top = client.get("/api/analytics/top-sources?hours=1&limit=1", headers=auth_headers).json()
+    assert top["total"] == 8
+    assert top["error_bound"] == 0
+    assert top["sources"] == [{"ip": "203.0.113.9", "count": 6, "max_count": 6, "distinct_users": 4}]
+
+    cardinality = client.get("/api/analytics/cardinality", headers=auth_headers).json()
+    assert cardinality["distinct_source_ips"]["estimate"] == 2
+    assert cardinality["distinct_usernames"]["estimate"] == 5  # user0-3 and testuser
+
+    # A log from the hour the window starts in, but before its start, is in the
+    # hour-aligned sketches and not in the statistics panel
+    early = floor_hour(datetime.utcnow() - timedelta(days=1))
+    db_session.add(SecurityLog(timestamp=early, event_type=EventType.FAILED_LOGIN,
+                               severity=SeverityLevel.LOW, source_ip="198.51.100.7"))
+    db_session.commit()
+    sketch_store.record([{"timestamp": early, "source_ip": "198.51.100.7"}])
+    response_cache.bump("logs")
+
+    top = client.get("/api/analytics/top-sources?hours=24", headers=auth_headers).json()
+    assert {s["ip"]: s["count"] for s in top["sources"]} == {"203.0.113.9": 6, "198.51.100.7": 3}
+    stats = client.get("/api/analytics/statistics?days=1", headers=auth_headers).json()
+    assert stats["top_source_ips"] == [{"ip": "203.0.113.9", "count": 6}, {"ip": "198.51.100.7", "count": 2}]
+
+
+def test_score_distribution_endpoint(client, auth_headers, test_log_data):
+    """Test /score-distribution percentiles, histogram and event type filter."""
+    logs = [dict(test_log_data, event_type="failed_login")] * 5 + [dict(test_log_data, event_type="login_attempt")] * 3
+    client.post("/api/logs/bulk", json=logs, headers=auth_headers)
+
+    result = client.get("/api/analytics/score-distribution?bins=4", headers=auth_headers).json()
+    threat = result["threat_score"]
+    assert threat["count"] == 8
+    assert threat["min"] <= threat["p50"] <= threat["p90"] <= threat["p99"] <= threat["max"]
+    assert [bucket["start"] for bucket in threat["histogram"]] == [0, 0.25, 0.5, 0.75]
+    assert sum(bucket["count"] for bucket in threat["histogram"]) == 8
+    assert result["confidence_score"]["count"] == 8
+    assert {name: entry["count"] for name, entry in result["threat_score_by_event_type"].items()} == {
+        "failed_login": 5, "login_attempt": 3
+    }
+
+    only = client.get("/api/analytics/score-distribution?event_type=login_attempt", headers=auth_headers).json()
+    assert only["event_type"] == "login_attempt"
+    assert only["threat_score"]["count"] == 3
+    assert "threat_score_by_event_type" not in only
+    assert client.get("/api/analytics/score-distribution?event_type=nope", headers=auth_headers).status_code == 422
+
+
+def test_rebuild_many_hours_commits_once_cursor_is_done(db_session, session_factory, monkeypatch):
+    """Test a rebuild spanning more than 48 hourly buckets doesn't commit while reading logs."""
+    start = datetime(2026, 1, 1)
+    for hour in range(72):
+        db_session.add(SecurityLog(
+            timestamp=start + timedelta(hours=hour), event_type=EventType.FAILED_LOGIN,
+            severity=SeverityLevel.LOW, source_ip=f"10.0.{hour}.1", username=f"user{hour % 5}",
+            threat_score=0.5
+        ))
+    db_session.commit()
+
+    commits = []
+    commit = db_session.commit
+    monkeypatch.setattr(db_session, "commit", lambda: commits.append(1) or commit())
+    assert SketchStore(session_factory).rebuild(db_session, chunk_size=10) == 72
+    # One after clearing the old sketches, one once every row has been read
+    assert len(commits) == 2
+
+    assert db_session.query(LogSketch).filter(
+        LogSketch.granularity == "hour", LogSketch.name == DISTINCT_SOURCE_IPS).count() == 72
+    merged = SketchStore(session_factory).merged(db_session, start)
+    assert abs(merged[DISTINCT_SOURCE_IPS].count() - 72) <= 3  # HyperLogLog estimate
+    assert merged[DISTINCT_USERNAMES].count() == 5
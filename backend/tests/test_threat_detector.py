@@ -83,3 +83,126 @@ def test_model_training():
     assert "accuracy" in results
     assert results["accuracy"] > 0.5  # Should achieve better than random
     assert results["samples"] == 500
+
+
+def _all_combination_logs():
+    """One log per event type / severity / IP class combination."""
+    logs = []
+    for event_type in EventType:
+        for severity in SeverityLevel:
+            for source_ip in ["203.0.113.1", "192.168.1.1", None]:
+                logs.append(SecurityLog(
+                    event_type=event_type,
+                    severity=severity,
+                    source_ip=source_ip,
+                    timestamp=datetime(2026, 1, 5, 14, 30)
+                ))
+    return logs
+
+
+def test_batch_prediction_matches_per_row_heuristics():
+    """Test batch scoring gives the same results as per-row scoring (heuristics)."""
+    detector = ThreatDetector()
+    detector.trained = False
+    logs = _all_combination_logs()
+    
+    assert detector.predict_threat_batch(logs) == [detector.predict_threat(log) for log in logs]
+    assert detector.predict_threat_batch([]) == []
+
+
+def test_batch_prediction_matches_per_row_model():
+    """Test batch scoring gives the same results as per-row scoring (ML model)."""
+    detector = ThreatDetector()
+    detector.train_model(num_samples=500)
+    logs = _all_combination_logs()
+    
+    batch = detector.predict_threat_batch(logs)
+    assert batch == [detector.predict_threat(log) for log in logs]
+    assert all(isinstance(is_threat, bool) for is_threat, _, _ in batch)
+
+
+def test_compiled_lookup_tables_match_encoders():
+    """Test precompiled category codes and scaling match the fitted sklearn objects."""
+    detector = ThreatDetector()
+    detector.train_model(num_samples=500)
+    
+    for event_type in EventType:
+        expected = detector.encoders['event_type'].transform([event_type.value])[0]
+        assert detector.category_codes['event_type'][event_type] == expected
+    for severity in SeverityLevel:
+        expected = detector.encoders['severity'].transform([severity.value])[0]
+        assert detector.category_codes['severity'][severity.value] == expected
+    
+    log = SecurityLog(
+        event_type=EventType.BRUTE_FORCE,
+        severity=SeverityLevel.HIGH,
+        threat_score=0.8,
+        timestamp=datetime(2026, 1, 7, 22, 0)
+    )
+    features = detector._extract_features(log)
+    scaled = detector.scaler.transform([[0.8, 22, 2]])[0]
+    assert features[2:5] == pytest.approx(list(scaled))
+
+
+def test_unknown_category_code():
+    """Test categories the encoders never saw map to the explicit unknown code."""
+    from app.services.threat_detector import UNKNOWN_CATEGORY
+    detector = ThreatDetector()
+    detector.train_model(num_samples=500)
+    assert UNKNOWN_CATEGORY not in detector.category_codes['event_type'].values()
+    
+    # An event type added after the model was trained
+    codes = detector.category_codes['event_type']
+    del codes[EventType.DATA_EXFILTRATION]  # str enum - also the value key
+    log = SecurityLog(
+        event_type=EventType.DATA_EXFILTRATION,
+        severity=SeverityLevel.HIGH,
+        source_ip="10.0.0.5",
+        timestamp=datetime(2026, 1, 7, 22, 0)
+    )
+    features = detector._extract_features(log)
+    assert features[0] == UNKNOWN_CATEGORY
+    assert detector._extract_feature_matrix([log])[0, 0] == UNKNOWN_CATEGORY
+    
+    result = detector.predict_threat(log)
+    assert result[2] == round(detector._predict_proba([features])[0][1], 3)
+    assert detector.predict_threat_batch([log]) == [result]
+
+
+def test_trained_model_scores_new_logs():
+    """Test a freshly trained model is used and flags obvious threats."""
+    detector = ThreatDetector()
+    detector.train_model(num_samples=2000)
+    assert detector.trained is True
+    
+    log = SecurityLog(
+        event_type=EventType.MALWARE_DETECTED,
+        severity=SeverityLevel.CRITICAL,
+        source_ip="203.0.113.1",
+        timestamp=datetime.utcnow()
+    )
+    is_threat, confidence, threat_score = detector.predict_threat(log)
+    assert is_threat is True
+    assert threat_score > 0.6
+
+
+def test_compiled_forest_matches_sklearn():
+    """Test the flattened forest gives bit-identical probabilities to sklearn."""
+    import numpy as np
+    from app.services.forest import CompiledForest
+    detector = ThreatDetector()
+    detector.train_model(num_samples=500)
+    assert detector.forest is not None
+    
+    rng = np.random.default_rng(1)
+    X = np.column_stack([
+        rng.integers(-1, 10, 300), rng.integers(-1, 4, 300), rng.normal(size=(300, 3)), rng.integers(0, 2, 300)
+    ]).astype(float)
+    X = np.vstack([X, detector._extract_feature_matrix(_all_combination_logs())])
+    # n_jobs=1 so sklearn adds the trees up in order too
+    detector.model.set_params(n_jobs=1)
+    forest = CompiledForest.from_sklearn(detector.model)
+    
+    assert np.array_equal(forest.predict_proba(X), detector.model.predict_proba(X))
+    assert np.array_equal(forest.predict_proba(X[0]), detector.model.predict_proba(X[:1]))
+    assert np.array_equal(forest.predict(X), detector.model.predict(X))